@@ -0,0 +1,333 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+ボーン作成オペレーターのベンチマーク
+
+合成したメッシュでボーンデータの抽出(_get_new_bones)と
+PAT_OT_Base.executeの時間を別々に計測し、結果をJSONに書き出します
+
+使い方:
+    blender --background --factory-startup --python benchmarks/bench_bone_creation.py -- \\
+        --output results.json [--repeat 3] [--tubes 16x16,64x32] [--strips 16,128] \\
+        [--compare baseline.json] [--threshold 1.25]
+
+--compareを指定すると、以前の結果と比べて中央値がthreshold倍より遅くなったケースがあるとき
+終了コード1で終了します
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import types
+
+import bpy
+import bmesh
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import petit_armature_tools  # noqa: E402
+from petit_armature_tools import pat_operator  # noqa: E402
+
+DEFAULT_TUBES = "16x16,64x32,256x64,1024x64"
+DEFAULT_STRIPS = "16,128,1024,4096"
+
+
+class OperatorProxy(object):
+    """
+    オペレーターを呼び出さずに、オペレーターのメソッドを個別に実行するための代理オブジェクト
+    プロパティは登録済みのオペレーターの既定値で初期化されます
+    """
+
+    def __init__(self, operator_class, **properties):
+        self._operator_class = operator_class
+        self.reports = []
+        pat_operator.PAT_OT_Base.__init__(self)
+
+        for prop in operator_class.bl_rna.properties:
+            if prop.identifier == 'rna_type':
+                continue
+            if getattr(prop, "is_array", False):
+                setattr(self, prop.identifier, tuple(prop.default_array))
+            else:
+                setattr(self, prop.identifier, prop.default)
+
+        for name, value in properties.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        value = getattr(self._operator_class, name)
+        if isinstance(value, types.FunctionType):
+            return types.MethodType(value, self)
+        return value
+
+    def report(self, report_type, message):
+        self.reports.append((sorted(report_type), message))
+
+
+def create_tube(loop_count, vertex_count, radius=0.1, height=0.05):
+    """
+    loop_count個のループ、ループごとにvertex_count個の頂点を持つ筒状のメッシュを作成します
+    :return: メッシュと、ループごとに1本ずつ選ぶ辺のインデックス
+    :rtype: (bpy.types.Mesh, list[int])
+    """
+
+    bm = bmesh.new()
+    rings = []
+    for i in range(loop_count):
+        ring = []
+        for j in range(vertex_count):
+            angle = 2.0 * math.pi * j / vertex_count
+            ring.append(bm.verts.new((radius * math.cos(angle), radius * math.sin(angle), height * i)))
+        rings.append(ring)
+
+    loop_edges = []
+    for ring in rings:
+        edges = [bm.edges.new((ring[j], ring[(j + 1) % vertex_count])) for j in range(vertex_count)]
+        loop_edges.append(edges[0])
+    for ring0, ring1 in zip(rings, rings[1:]):
+        for j in range(vertex_count):
+            k = (j + 1) % vertex_count
+            bm.faces.new((ring0[j], ring0[k], ring1[k], ring1[j]))
+
+    mesh = bpy.data.meshes.new("PAT_Bench_Tube")
+    bm.edges.index_update()
+    selection = [e.index for e in loop_edges]
+    bm.to_mesh(mesh)
+    bm.free()
+    return mesh, selection
+
+
+def create_strip(edge_count, width=0.05, length=0.02):
+    """
+    edge_count本の辺を持つ帯状のメッシュを作成します
+    :return: メッシュと、片側の縁に沿って順番に選ぶ辺のインデックス
+    :rtype: (bpy.types.Mesh, list[int])
+    """
+
+    bm = bmesh.new()
+    rail0 = [bm.verts.new((0.0, 0.0, length * i)) for i in range(edge_count + 1)]
+    rail1 = [bm.verts.new((width, 0.0, length * i)) for i in range(edge_count + 1)]
+    for i in range(edge_count):
+        bm.faces.new((rail0[i], rail1[i], rail1[i + 1], rail0[i + 1]))
+
+    bm.edges.ensure_lookup_table()
+    bm.edges.index_update()
+    selection = []
+    for i in range(edge_count):
+        for e in rail0[i].link_edges:
+            if e.other_vert(rail0[i]) == rail0[i + 1]:
+                selection.append(e.index)
+                break
+
+    mesh = bpy.data.meshes.new("PAT_Bench_Strip")
+    bm.to_mesh(mesh)
+    bm.free()
+    return mesh, selection
+
+
+def setup_edit_mesh(context, mesh, selection):
+    """
+    メッシュのオブジェクトを作成して編集モードに入り、辺を順番に選択します
+    """
+
+    mesh_object = bpy.data.objects.new(mesh.name, mesh)
+    if hasattr(context, "view_layer"):
+        context.collection.objects.link(mesh_object)
+        context.view_layer.objects.active = mesh_object
+        mesh_object.select_set(True)
+    else:
+        context.scene.objects.link(mesh_object)
+        context.scene.objects.active = mesh_object
+        mesh_object.select = True
+
+    bpy.ops.object.mode_set(mode='EDIT', toggle=False)
+    context.scene.tool_settings.mesh_select_mode = (False, True, False)
+    bpy.ops.mesh.select_all(action='DESELECT')
+
+    bm = bmesh.from_edit_mesh(mesh)
+    bm.edges.ensure_lookup_table()
+    bm.select_history.clear()
+    for index in selection:
+        edge = bm.edges[index]
+        edge.select = True
+        bm.select_history.add(edge)
+    bmesh.update_edit_mesh(mesh)
+    return mesh_object
+
+
+def cleanup(context):
+    if context.active_object and context.active_object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for armature in list(bpy.data.armatures):
+        bpy.data.armatures.remove(armature)
+
+
+def run_case(context, operator_class, create_mesh, params, repeat):
+    extract_times = []
+    build_times = []
+    bone_count = 0
+    vertex_count = 0
+    edge_count = 0
+
+    for _ in range(repeat):
+        cleanup(context)
+        context.scene.PAT_ToolSettings.start_number = 1
+        mesh, selection = create_mesh(*params)
+        vertex_count = len(mesh.vertices)
+        edge_count = len(mesh.edges)
+        mesh_object = setup_edit_mesh(context, mesh, selection)
+
+        proxy = OperatorProxy(operator_class)
+        proxy.pat_tool_settings = context.scene.PAT_ToolSettings
+        proxy.mesh_object = mesh_object
+        mesh_object.update_from_editmode()
+        proxy.matrix_world = mesh_object.matrix_world
+
+        start = time.perf_counter()
+        proxy.new_bones = proxy._get_new_bones(context)
+        extract_times.append(time.perf_counter() - start)
+
+        if not proxy.new_bones:
+            raise RuntimeError("{} created no bones for {}".format(operator_class.bl_idname, params))
+        bone_count = len(proxy.new_bones)
+        proxy.new_bone_names = proxy._get_new_bone_names()
+
+        start = time.perf_counter()
+        proxy._build_bones(context)
+        build_times.append(time.perf_counter() - start)
+
+    cleanup(context)
+
+    return {
+        "operator": operator_class.bl_idname,
+        "mesh": create_mesh.__name__,
+        "params": list(params),
+        "vertices": vertex_count,
+        "edges": edge_count,
+        "bones": bone_count,
+        "extract": summarize(extract_times),
+        "build": summarize(build_times),
+    }
+
+
+def summarize(times):
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "runs": len(times),
+    }
+
+
+def case_key(case):
+    return "{} {}{}".format(case["operator"], case["mesh"], tuple(case["params"]))
+
+
+def compare(results, baseline_path, threshold):
+    """
+    以前の結果と比較し、threshold倍より遅くなったケースの数を返します
+    """
+
+    with open(baseline_path, 'r') as f:
+        baseline = {case_key(case): case for case in json.load(f)["cases"]}
+
+    regressions = 0
+    for case in results["cases"]:
+        old_case = baseline.get(case_key(case))
+        if old_case is None:
+            continue
+        for phase in ("extract", "build"):
+            old = old_case[phase]["median"]
+            new = case[phase]["median"]
+            ratio = new / old if old > 0.0 else 1.0
+            mark = ""
+            if ratio > threshold:
+                mark = "  <-- regression"
+                regressions += 1
+            print("{:<70} {:<8} {:>10.4f}s -> {:>10.4f}s  x{:.2f}{}".format(
+                case_key(case), phase, old, new, ratio, mark))
+    return regressions
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Petit Armature Tools benchmark")
+    parser.add_argument("--output", default="bench_results.json", help="Path of the JSON result file")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per case")
+    parser.add_argument("--tubes", default=DEFAULT_TUBES, help="Tube sizes as LOOPSxVERTS,...")
+    parser.add_argument("--strips", default=DEFAULT_STRIPS, help="Strip sizes as EDGES,...")
+    parser.add_argument("--compare", default="", help="Baseline JSON result file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Allowed slowdown ratio")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    context = bpy.context
+
+    petit_armature_tools.register()
+
+    cases = []
+    try:
+        for size in filter(None, args.strips.split(",")):
+            params = (int(size),)
+            cases.append(run_case(context, pat_operator.PAT_OT_SelectedEdgeOrder, create_strip, params, args.repeat))
+            print(case_key(cases[-1]), cases[-1]["extract"]["median"], cases[-1]["build"]["median"])
+
+        for size in filter(None, args.tubes.split(",")):
+            params = tuple(int(value) for value in size.split("x"))
+            cases.append(run_case(context, pat_operator.PAT_OT_MidpointOfSelectedEdgeLoopOder, create_tube, params,
+                                  args.repeat))
+            print(case_key(cases[-1]), cases[-1]["extract"]["median"], cases[-1]["build"]["median"])
+    finally:
+        petit_armature_tools.unregister()
+
+    results = {
+        "addon_version": list(petit_armature_tools.bl_info["version"]),
+        "blender_version": list(bpy.app.version),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "date": datetime.datetime.now().isoformat(),
+        "cases": cases,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print("Results written to {}".format(args.output))
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print("{} regression(s) over x{:.2f}".format(regressions, args.threshold))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,12 +25,26 @@ import csv
 if "bpy" in locals():
     import importlib
     importlib.reload(utils)
+    importlib.reload(pat_bone_spec)
+    importlib.reload(pat_cache)
+    importlib.reload(pat_curve)
+    importlib.reload(pat_geometry)
+    importlib.reload(pat_mirror)
+    importlib.reload(pat_profiler)
+    importlib.reload(pat_topology)
     importlib.reload(pat_operator)
     importlib.reload(pat_preferences)
     importlib.reload(updater)
 else:
     import bpy
     from . import utils
+    from . import pat_bone_spec
+    from . import pat_cache
+    from . import pat_curve
+    from . import pat_geometry
+    from . import pat_mirror
+    from . import pat_profiler
+    from . import pat_topology
     from . import pat_operator
     from . import pat_preferences
     from . import updater
@@ -58,7 +72,12 @@ classes = (
     pat_operator.PAT_ToolSettings,
     pat_operator.PAT_OT_SelectedEdgeOrder,
     pat_operator.PAT_OT_MidpointOfSelectedEdgeLoopOder,
-    pat_operator.VIEW3D_PT_edit_petit_armature_tools
+    pat_operator.PAT_OT_HairCardIslands,
+    pat_operator.PAT_OT_ShortestPath,
+    pat_operator.PAT_OT_CurveChains,
+    pat_operator.PAT_OT_RefitBones,
+    pat_operator.VIEW3D_PT_edit_petit_armature_tools,
+    pat_operator.VIEW3D_PT_object_petit_armature_tools
 )
 
 
@@ -0,0 +1,620 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import numpy as np
+
+
+def concatenate_ranges(starts, lengths):
+    """
+    開始位置と長さで指定した複数の連番を、1つの配列につなげて返します
+    :param starts: 連番ごとの開始位置
+    :type starts: numpy.ndarray
+    :param lengths: 連番ごとの長さ
+    :type lengths: numpy.ndarray
+    :rtype: numpy.ndarray
+    """
+
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    output_starts = np.cumsum(lengths) - lengths
+    return np.repeat(starts - output_starts, lengths) + np.arange(total, dtype=np.int64)
+
+
+def get_chain_parents(chains):
+    """
+    チェーンの番号から、チェーンの中で1つ前のボーンを親とするインデックスを返します
+    :param chains: ボーンごとのチェーンの番号
+    :type chains: numpy.ndarray
+    :return: ボーンごとの親ボーンのインデックス。チェーンの根元は-1
+    :rtype: numpy.ndarray
+    """
+
+    chains = np.asarray(chains)
+    parents = np.arange(len(chains), dtype=np.int32) - 1
+    if len(chains):
+        parents[0] = -1
+        parents[1:][chains[1:] != chains[:-1]] = -1
+    return parents
+
+
+def get_chain_reference_vectors(axes, references, chain_starts):
+    """
+    チェーンの根元の基準ベクトルを、ボーンごとの軸に垂直な平面へ投影します
+    円形のループのように基準ベクトルが定まらない場合でも、チェーンの中でロールが揃います
+    :param axes: (ボーンの数, 3)のボーンごとの軸の配列
+    :type axes: numpy.ndarray
+    :param references: (ボーンの数, 3)のボーンごとの基準ベクトルの配列
+    :type references: numpy.ndarray
+    :param chain_starts: ボーンごとに、チェーンの根元かどうか
+    :type chain_starts: numpy.ndarray
+    :rtype: numpy.ndarray
+    """
+
+    roots = np.maximum.accumulate(np.where(chain_starts, np.arange(len(chain_starts)), 0))
+    root_references = references[roots]
+    projected = _normalize_rows(root_references - np.einsum('ij,ij->i', root_references, axes)[:, None] * axes)
+
+    # 根元の基準ベクトルが軸と平行な場合は、ボーンごとの基準ベクトルを使う
+    degenerate = ~np.any(projected, axis=1)
+    projected[degenerate] = references[degenerate]
+    return projected
+
+
+def _normalize_rows(vectors):
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 0.0)
+
+
+class BoneChainTopology(object):
+    """
+    ボーンの位置を除いた、関節の頂点インデックスとボーンのつながり方だけを保持します
+    同じトポロジーのメッシュであれば、頂点座標から同じ並びのボーンを作り直せます
+    """
+
+    ARRAY_NAMES = ('joint_offsets', 'joint_vertices', 'head_joints', 'tail_joints', 'chains')
+
+    def __init__(self, joint_offsets, joint_vertices, head_joints, tail_joints, chains=None):
+        """
+        :param joint_offsets: 関節ごとの頂点インデックスの範囲。長さは関節の数+1
+        :param joint_vertices: 全ての関節の頂点インデックスをつなげた配列
+        :param head_joints: ボーンごとのヘッドの関節のインデックス
+        :param tail_joints: ボーンごとのテールの関節のインデックス
+        :param chains: ボーンごとのチェーンの番号
+        """
+
+        self.joint_offsets = np.asarray(joint_offsets, dtype=np.int64)
+        self.joint_vertices = np.asarray(joint_vertices, dtype=np.int64)
+        self.head_joints = np.asarray(head_joints, dtype=np.int64)
+        self.tail_joints = np.asarray(tail_joints, dtype=np.int64)
+        self.chains = np.zeros(len(self.head_joints), dtype=np.int64) if chains is None \
+            else np.asarray(chains, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.head_joints)
+
+    @property
+    def joint_count(self):
+        return len(self.joint_offsets) - 1
+
+    @property
+    def head_vertices(self):
+        """
+        関節ごとに頂点が1つの場合の、ボーンごとのヘッドの頂点インデックス
+        """
+
+        return self.joint_vertices[self.joint_offsets[self.head_joints]]
+
+    @property
+    def tail_vertices(self):
+        return self.joint_vertices[self.joint_offsets[self.tail_joints]]
+
+    def to_arrays(self):
+        return [getattr(self, name) for name in self.ARRAY_NAMES]
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(*arrays)
+
+    @classmethod
+    def from_vertex_pairs(cls, head_vertices, tail_vertices, chains=None):
+        """
+        メッシュの頂点をヘッドとテールにするボーンのトポロジーを作成します。関節は頂点1つずつになります
+        :rtype: BoneChainTopology
+        """
+
+        head_vertices = np.asarray(head_vertices, dtype=np.int64)
+        tail_vertices = np.asarray(tail_vertices, dtype=np.int64)
+        joint_vertices, joints = np.unique(np.concatenate((head_vertices, tail_vertices)), return_inverse=True)
+        return cls(np.arange(len(joint_vertices) + 1), joint_vertices, joints[:len(head_vertices)],
+                   joints[len(head_vertices):], chains)
+
+    @classmethod
+    def from_index_lists(cls, joint_indexes, head_joints, tail_joints, chains=None):
+        """
+        関節ごとの頂点インデックスのリストから、ボーンのトポロジーを作成します
+        :param joint_indexes: 関節ごとの頂点インデックスのリスト
+        :type joint_indexes: list[list[int]]
+        :rtype: BoneChainTopology
+        """
+
+        joint_offsets = np.zeros(len(joint_indexes) + 1, dtype=np.int64)
+        np.cumsum([len(indexes) for indexes in joint_indexes], out=joint_offsets[1:])
+        joint_vertices = np.fromiter((index for indexes in joint_indexes for index in indexes), dtype=np.int64,
+                                     count=int(joint_offsets[-1]))
+        return cls(joint_offsets, joint_vertices, head_joints, tail_joints, chains)
+
+
+class BoneChainSpec(object):
+    """
+    作成するボーンのデータを、ボーンごとの辞書ではなく列ごとの配列で保持します
+    ウェイトを付ける頂点インデックスは、index_offsetsで区切ったCSR形式で保持します
+    座標はすべてメッシュのローカル座標です
+    """
+
+    def __init__(self, heads=None, tails=None, chains=None, index_offsets=None, indexes=None, normals=None,
+                 roll_vectors=None, parents=None, weights=None, stencils=None):
+        """
+        :param heads: (ボーンの数, 3)のヘッドの配列
+        :param tails: (ボーンの数, 3)のテールの配列
+        :param chains: ボーンごとのチェーンの番号。同じ番号のボーンは連続して並びます
+        :param index_offsets: ボーンごとの頂点インデックスの範囲。長さはボーンの数+1
+        :param indexes: 全てのボーンの頂点インデックスをつなげた配列
+        :param normals: (ボーンの数, 3)のメッシュの面の法線の配列。オフセットの向きに使います。無い場合はNone
+        :param roll_vectors: (ボーンの数, 3)のロールの基準ベクトルの配列。無い場合はnormalsを使います
+        :param parents: ボーンごとの親ボーンのインデックス。無い場合はチェーンから求めます
+        :param weights: indexesと同じ長さのウェイトの配列。無い場合は全て1として扱います
+        :param stencils: ヘッドとテールを頂点座標の重み付き和で表す(offsets, vertices, weights)のCSR
+            2i行目がボーンiのヘッド、2i+1行目がテールです。無い場合はNone
+        """
+
+        self.heads = np.zeros((0, 3)) if heads is None else np.asarray(heads, dtype=np.float64).reshape(-1, 3)
+        count = len(self.heads)
+        self.tails = np.zeros((0, 3)) if tails is None else np.asarray(tails, dtype=np.float64).reshape(-1, 3)
+        self.chains = np.zeros(count, dtype=np.int32) if chains is None else np.asarray(chains, dtype=np.int32)
+        self.index_offsets = np.zeros(count + 1, dtype=np.int64) if index_offsets is None \
+            else np.asarray(index_offsets, dtype=np.int64)
+        self.indexes = np.zeros(0, dtype=np.int32) if indexes is None else np.asarray(indexes, dtype=np.int32)
+        self.normals = None if normals is None else np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+        self.roll_vectors = None if roll_vectors is None \
+            else np.asarray(roll_vectors, dtype=np.float64).reshape(-1, 3)
+        self.parents = get_chain_parents(self.chains) if parents is None else np.asarray(parents, dtype=np.int32)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        self.stencils = None
+        if stencils is not None:
+            offsets, vertices, stencil_weights = stencils
+            self.stencils = (np.asarray(offsets, dtype=np.int64), np.asarray(vertices, dtype=np.int32),
+                             np.asarray(stencil_weights, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.heads)
+
+    @property
+    def chain_starts(self):
+        """
+        ボーンごとに、チェーンの根元かどうかを返します
+        :rtype: numpy.ndarray
+        """
+
+        starts = np.ones(len(self), dtype=bool)
+        starts[1:] = self.chains[1:] != self.chains[:-1]
+        return starts
+
+    @property
+    def chain_count(self):
+        return int(np.count_nonzero(self.chain_starts))
+
+    def get_indexes(self, bone):
+        """
+        ボーンのウェイトを付ける頂点インデックスを返します
+        :rtype: numpy.ndarray
+        """
+
+        return self.indexes[self.index_offsets[bone]:self.index_offsets[bone + 1]]
+
+    def get_weight_pairs(self):
+        """
+        ボーンと頂点インデックスの組を、ボーンごとのインデックスの数だけ並べて返します
+        :return: ボーンのインデックス、頂点インデックスとウェイトの配列
+        :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+
+        bone_ids = np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.index_offsets))
+        weights = np.ones(len(self.indexes)) if self.weights is None else self.weights
+        return bone_ids, self.indexes, weights
+
+    def get_chain_ranges(self):
+        """
+        チェーンごとに、ボーンのインデックスの範囲を返します
+        :return: チェーンごとの(開始, 終了)のリスト
+        :rtype: list[(int, int)]
+        """
+
+        starts = np.flatnonzero(self.chain_starts).tolist()
+        return list(zip(starts, starts[1:] + [len(self)]))
+
+    def get_stencil(self, bone, tail=False):
+        """
+        ボーンのヘッドまたはテールの位置を表す頂点インデックスとウェイトを返します
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+
+        offsets, vertices, weights = self.stencils
+        row = bone * 2 + (1 if tail else 0)
+        return vertices[offsets[row]:offsets[row + 1]], weights[offsets[row]:offsets[row + 1]]
+
+    @classmethod
+    def from_vertex_pairs(cls, coords, head_vertices, tail_vertices, chains=None, vertex_normals=None):
+        """
+        メッシュの頂点をヘッドとテールにするボーンのデータを作成します
+        :param coords: (頂点数, 3)の頂点座標の配列
+        :type coords: numpy.ndarray
+        :param head_vertices: ボーンごとのヘッドの頂点インデックス
+        :param tail_vertices: ボーンごとのテールの頂点インデックス
+        :param chains: ボーンごとのチェーンの番号
+        :param vertex_normals: (頂点数, 3)の頂点法線の配列。ボーンの法線は両端の頂点法線の平均になります
+        :rtype: BoneChainSpec
+        """
+
+        head_vertices = np.asarray(head_vertices, dtype=np.int32)
+        tail_vertices = np.asarray(tail_vertices, dtype=np.int32)
+        normals = None
+        if vertex_normals is not None:
+            normals = _normalize_rows((vertex_normals[head_vertices] + vertex_normals[tail_vertices]) / 2.0)
+
+        indexes = np.column_stack((head_vertices, tail_vertices)).ravel()
+        stencils = (np.arange(len(indexes) + 1, dtype=np.int64), indexes, np.ones(len(indexes)))
+        return cls(heads=coords[head_vertices], tails=coords[tail_vertices], chains=chains,
+                   index_offsets=np.arange(0, len(head_vertices) * 2 + 1, 2, dtype=np.int64),
+                   indexes=indexes, normals=normals, stencils=stencils)
+
+    @classmethod
+    def from_topology(cls, topology, joint_positions, joint_stencils=None):
+        """
+        ボーンのトポロジーと関節の位置から、ボーンのデータを作成します
+        :type topology: BoneChainTopology
+        :param joint_positions: (関節の数, 3)の関節の位置の配列
+        :type joint_positions: numpy.ndarray
+        :param joint_stencils: 関節ごとの位置を表す(offsets, vertices, weights)のCSR。無い場合は頂点の平均です
+        :rtype: BoneChainSpec
+        """
+
+        return cls.from_joints(joint_positions, topology.joint_offsets, topology.joint_vertices,
+                               topology.head_joints, topology.tail_joints, topology.chains, joint_stencils)
+
+    @classmethod
+    def from_joints(cls, joint_positions, joint_offsets, joint_vertices, head_joints, tail_joints, chains=None,
+                    joint_stencils=None):
+        """
+        ループの中心のような、頂点の集まりを関節とするボーンのデータを作成します
+        ボーンの頂点インデックスは、ヘッドとテールの関節の頂点をつなげたものになります
+        :param joint_positions: (関節の数, 3)の関節の位置の配列
+        :type joint_positions: numpy.ndarray
+        :param joint_offsets: 関節ごとの頂点インデックスの範囲。長さは関節の数+1
+        :type joint_offsets: numpy.ndarray
+        :param joint_vertices: 全ての関節の頂点インデックスをつなげた配列
+        :type joint_vertices: numpy.ndarray
+        :param head_joints: ボーンごとのヘッドの関節のインデックス
+        :param tail_joints: ボーンごとのテールの関節のインデックス
+        :param chains: ボーンごとのチェーンの番号
+        :param joint_stencils: 関節ごとの位置を表す(offsets, vertices, weights)のCSR。無い場合は頂点の平均です
+        :rtype: BoneChainSpec
+        """
+
+        joint_offsets = np.asarray(joint_offsets, dtype=np.int64)
+        head_joints = np.asarray(head_joints, dtype=np.int64)
+        tail_joints = np.asarray(tail_joints, dtype=np.int64)
+        joint_lengths = np.diff(joint_offsets)
+
+        # ヘッドとテールの関節の頂点の範囲を交互に並べ、まとめて取り出す
+        starts = np.column_stack((joint_offsets[head_joints], joint_offsets[tail_joints])).ravel()
+        lengths = np.column_stack((joint_lengths[head_joints], joint_lengths[tail_joints])).ravel()
+        index_offsets = np.zeros(len(head_joints) + 1, dtype=np.int64)
+        np.cumsum(lengths.reshape(-1, 2).sum(axis=1), out=index_offsets[1:])
+
+        if joint_stencils is None:
+            joint_stencils = (joint_offsets, joint_vertices,
+                              np.repeat(1.0 / np.maximum(joint_lengths, 1), joint_lengths))
+        rows = np.column_stack((head_joints, tail_joints)).ravel()
+
+        return cls(heads=joint_positions[head_joints], tails=joint_positions[tail_joints], chains=chains,
+                   index_offsets=index_offsets,
+                   indexes=np.asarray(joint_vertices)[concatenate_ranges(starts, lengths)],
+                   stencils=combine_stencils(joint_stencils, rows[:, None], np.ones((len(rows), 1))))
+
+
+def combine_stencils(stencils, rows, scales):
+    """
+    ステンシルの行を重み付きで足し合わせ、新しいステンシルを作成します
+    新しいステンシルのi行目は、rows[i, j]行目をscales[i, j]倍したものの和になります
+    :param stencils: (offsets, vertices, weights)のCSR
+    :param rows: (新しい行の数, 足し合わせる行の数)の行のインデックスの配列
+    :type rows: numpy.ndarray
+    :param scales: rowsと同じ形の倍率の配列
+    :type scales: numpy.ndarray
+    :return: 新しい(offsets, vertices, weights)のCSR。ウェイトが0の頂点は含みません
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    offsets, vertices, weights = stencils
+    offsets = np.asarray(offsets, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    row_lengths = np.diff(offsets)[rows.ravel()]
+    entries = concatenate_ranges(offsets[rows.ravel()], row_lengths)
+    entry_rows = np.repeat(np.repeat(np.arange(len(rows)), rows.shape[1]), row_lengths)
+    entry_weights = np.asarray(weights)[entries] * np.repeat(np.asarray(scales, dtype=np.float64).ravel(),
+                                                             row_lengths)
+
+    valid = entry_weights != 0.0
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(entry_rows[valid], minlength=len(rows)), out=new_offsets[1:])
+    return new_offsets, np.asarray(vertices)[entries[valid]], entry_weights[valid]
+
+
+def _get_resample_count(length, bone_count, bone_length):
+    if bone_length > 0.0:
+        return max(1, int(round(length / bone_length)))
+    return max(1, bone_count)
+
+
+def resample_bone_chains(spec, bone_count=0, bone_length=0.0):
+    """
+    チェーンごとに、ヘッドとテールをつないだ折れ線を弧長で等間隔に分割し直します
+    元のボーンの頂点は、区間が重なる新しいボーンへ重なった長さの割合のウェイトで割り当てます
+    長さが0のチェーンはそのまま残します
+    :param spec: 分割し直すボーンのデータ
+    :type spec: BoneChainSpec
+    :param bone_count: チェーンごとのボーンの数。bone_lengthが0のときに使います
+    :type bone_count: int
+    :param bone_length: 目標とするボーンの長さ。0より大きい場合はbone_countより優先します
+    :type bone_length: float
+    :rtype: BoneChainSpec
+    """
+
+    if len(spec) == 0:
+        return spec
+
+    _, old_indexes, old_weights = spec.get_weight_pairs()
+    old_lengths = np.diff(spec.index_offsets)
+
+    points_list = []
+    chains = []
+    source_bones = []
+    pair_old = []
+    pair_new = []
+    pair_weights = []
+    stencil_rows = []
+    stencil_scales = []
+    new_offset = 0
+    for start, end in spec.get_chain_ranges():
+        points = np.vstack((spec.heads[start:end], spec.tails[end - 1:end]))
+        arc = np.zeros(len(points))
+        np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1), out=arc[1:])
+        total = arc[-1]
+
+        if total <= 0.0:
+            # 長さが0のチェーンは分割する位置が決まらないため、元のボーンをそのまま残す
+            count = end - start
+            bones = np.arange(start, end)
+            if spec.stencils is not None:
+                rows = np.column_stack((bones * 2, bones * 2 + 1)).reshape(-1)
+                stencil_rows.append(np.column_stack((rows, rows)))
+                stencil_scales.append(np.tile([1.0, 0.0], (len(rows), 1)))
+            source_bones.append(bones)
+            pair_old.append(bones)
+            pair_new.append(new_offset + np.arange(count))
+            pair_weights.append(np.ones(count))
+            points_list.append(points)
+            chains.append(np.full(count, spec.chains[start], dtype=np.int32))
+            new_offset += count
+            continue
+
+        count = _get_resample_count(total, bone_count, bone_length)
+        samples = np.linspace(0.0, total, count + 1)
+        points = np.column_stack([np.interp(samples, arc, points[:, axis]) for axis in range(3)])
+
+        if spec.stencils is not None:
+            # 分割点ごとに、含まれる区間の両端の点のステンシルを線形補間する
+            segments = np.clip(np.searchsorted(arc, samples, 'right') - 1, 0, end - start - 1)
+            segment_lengths = arc[segments + 1] - arc[segments]
+            t = np.divide(samples - arc[segments], segment_lengths, out=np.zeros_like(samples),
+                          where=segment_lengths > 0.0)
+            point_rows = np.append(np.arange(start, end) * 2, (end - 1) * 2 + 1)
+            rows = np.column_stack((point_rows[segments], point_rows[segments + 1]))
+            scales = np.column_stack((1.0 - t, t))
+            stencil_rows.append(np.stack((rows[:-1], rows[1:]), axis=1).reshape(-1, 2))
+            stencil_scales.append(np.stack((scales[:-1], scales[1:]), axis=1).reshape(-1, 2))
+
+        # 新しいボーンごとに、中点を含む元のボーンを法線とロールの基準ベクトルの参照元にする
+        middles = (samples[:-1] + samples[1:]) / 2.0
+        source_bones.append(start + np.clip(np.searchsorted(arc, middles, 'right') - 1, 0, end - start - 1))
+
+        # 元のボーンと区間が重なる新しいボーンの組を列挙する
+        first = np.clip(np.searchsorted(samples, arc[:-1], 'right') - 1, 0, count - 1)
+        last = np.maximum(np.clip(np.searchsorted(samples, arc[1:], 'left') - 1, 0, count - 1), first)
+        old = np.repeat(np.arange(end - start), last - first + 1)
+        new = concatenate_ranges(first, last - first + 1)
+        overlaps = np.minimum(arc[old + 1], samples[new + 1]) - np.maximum(arc[old], samples[new])
+        bone_lengths = arc[old + 1] - arc[old]
+        weights = np.divide(overlaps, bone_lengths, out=np.ones_like(overlaps), where=bone_lengths > 0.0)
+        valid = weights > 1e-6
+
+        pair_old.append(start + old[valid])
+        pair_new.append(new_offset + new[valid])
+        pair_weights.append(weights[valid])
+        points_list.append(points)
+        chains.append(np.full(count, spec.chains[start], dtype=np.int32))
+        new_offset += count
+
+    source_bones = np.concatenate(source_bones)
+    pair_old = np.concatenate(pair_old)
+    pair_new = np.concatenate(pair_new)
+    pair_weights = np.concatenate(pair_weights)
+
+    # 組ごとに元のボーンの頂点を展開し、新しいボーンの順に並べてCSRにする
+    entries = concatenate_ranges(spec.index_offsets[pair_old], old_lengths[pair_old])
+    entry_bones = np.repeat(pair_new, old_lengths[pair_old])
+    entry_weights = old_weights[entries] * np.repeat(pair_weights, old_lengths[pair_old])
+    order = np.argsort(entry_bones, kind='stable')
+    index_offsets = np.zeros(new_offset + 1, dtype=np.int64)
+    np.cumsum(np.bincount(entry_bones, minlength=new_offset), out=index_offsets[1:])
+
+    heads = np.concatenate([points[:-1] for points in points_list])
+    tails = np.concatenate([points[1:] for points in points_list])
+    stencils = None
+    if spec.stencils is not None:
+        stencils = combine_stencils(spec.stencils, np.concatenate(stencil_rows), np.concatenate(stencil_scales))
+    return BoneChainSpec(heads=heads, tails=tails, chains=np.concatenate(chains), index_offsets=index_offsets,
+                         indexes=old_indexes[entries[order]], weights=entry_weights[order],
+                         normals=None if spec.normals is None else spec.normals[source_bones],
+                         roll_vectors=None if spec.roll_vectors is None else spec.roll_vectors[source_bones],
+                         stencils=stencils)
+
+
+def get_simplified_points(points, tolerance):
+    """
+    Ramer–Douglas–Peucker法で、折れ線の形を保つ点のインデックスを返します
+    :param points: (点の数, 3)の折れ線の点の配列
+    :type points: numpy.ndarray
+    :param tolerance: 取り除いた点と、簡略化した線分との距離の許容値
+    :type tolerance: float
+    :return: 残す点のインデックス。両端の点は常に含まれます
+    :rtype: numpy.ndarray
+    """
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        # 線分から最も離れた点を探す
+        start = points[first]
+        segment = points[last] - start
+        vectors = points[first + 1:last] - start
+        length_squared = segment.dot(segment)
+        if length_squared > 0.0:
+            t = np.clip(vectors.dot(segment) / length_squared, 0.0, 1.0)
+            vectors = vectors - t[:, None] * segment
+        distances = np.einsum('ij,ij->i', vectors, vectors)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance * tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return np.flatnonzero(keep)
+
+
+def simplify_bone_chains(spec, tolerance):
+    """
+    チェーンごとに、まっすぐな部分のボーンをまとめて1本のボーンにします
+    まとめたボーンは元のボーンの頂点インデックスをすべて引き継ぎます
+    :param spec: 簡略化するボーンのデータ
+    :type spec: BoneChainSpec
+    :param tolerance: 取り除いた関節と、まとめたボーンとの距離の許容値
+    :type tolerance: float
+    :rtype: BoneChainSpec
+    """
+
+    if len(spec) == 0:
+        return spec
+
+    bone_starts = []
+    for start, end in spec.get_chain_ranges():
+        points = np.vstack((spec.heads[start:end], spec.tails[end - 1:end]))
+        bone_starts.append(start + get_simplified_points(points, tolerance)[:-1])
+    bone_starts = np.concatenate(bone_starts)
+    bone_ends = np.append(bone_starts[1:], len(spec))
+
+    # チェーンとボーンは連続して並んでいるため、頂点インデックスの配列はそのまま使える
+    normals = None
+    if spec.normals is not None:
+        normals = _normalize_rows(np.add.reduceat(spec.normals, bone_starts, axis=0))
+    roll_vectors = None
+    if spec.roll_vectors is not None:
+        roll_vectors = _normalize_rows(np.add.reduceat(spec.roll_vectors, bone_starts, axis=0))
+    stencils = None
+    if spec.stencils is not None:
+        rows = np.column_stack((bone_starts * 2, (bone_ends - 1) * 2 + 1)).reshape(-1, 1)
+        stencils = combine_stencils(spec.stencils, rows, np.ones(rows.shape))
+
+    return BoneChainSpec(heads=spec.heads[bone_starts], tails=spec.tails[bone_ends - 1],
+                         chains=spec.chains[bone_starts], index_offsets=spec.index_offsets[np.append(bone_starts, -1)],
+                         indexes=spec.indexes, weights=spec.weights, normals=normals, roll_vectors=roll_vectors,
+                         stencils=stencils)
+
+
+def mirror_bone_chains(spec, chains, mirror_vertices):
+    """
+    指定したチェーンをX軸で鏡映したボーンを、元のボーンの後ろにまとめて加えます
+    鏡映したボーンの頂点インデックスとステンシルは、鏡映した側の頂点に置き換え、ウェイトはそのまま使います
+    :param spec: 鏡映するボーンのデータ
+    :type spec: BoneChainSpec
+    :param chains: 鏡映するチェーンの番号
+    :type chains: numpy.ndarray
+    :param mirror_vertices: 頂点インデックスから鏡映した側の頂点インデックスへの配列
+    :type mirror_vertices: numpy.ndarray
+    :return: 鏡映したボーンを加えたボーンデータと、加えたボーンごとの元のボーンのインデックス
+    :rtype: (BoneChainSpec, numpy.ndarray)
+    """
+
+    bones = np.flatnonzero(np.isin(spec.chains, chains))
+    if len(bones) == 0:
+        return spec, bones
+
+    count = len(spec)
+    flip = np.array([-1.0, 1.0, 1.0])
+    mirror_vertices = np.asarray(mirror_vertices, dtype=np.int64)
+
+    lengths = np.diff(spec.index_offsets)[bones]
+    entries = concatenate_ranges(spec.index_offsets[bones], lengths)
+    index_offsets = np.concatenate((spec.index_offsets, spec.index_offsets[-1] + np.cumsum(lengths)))
+    indexes = np.concatenate((spec.indexes, mirror_vertices[spec.indexes[entries]]))
+    weights = None if spec.weights is None else np.concatenate((spec.weights, spec.weights[entries]))
+
+    # チェーンは丸ごと鏡映するため、親ボーンも必ず鏡映したボーンの中にある
+    new_positions = np.full(count, -1, dtype=np.int64)
+    new_positions[bones] = count + np.arange(len(bones))
+    source_parents = spec.parents[bones]
+    parents = np.concatenate((spec.parents, np.where(source_parents >= 0, new_positions[source_parents], -1)))
+
+    stencils = None
+    if spec.stencils is not None:
+        rows = np.column_stack((bones * 2, bones * 2 + 1)).reshape(-1, 1)
+        offsets, vertices, stencil_weights = combine_stencils(spec.stencils, rows, np.ones(rows.shape))
+        stencils = (np.concatenate((spec.stencils[0], spec.stencils[0][-1] + offsets[1:])),
+                    np.concatenate((spec.stencils[1], mirror_vertices[vertices])),
+                    np.concatenate((spec.stencils[2], stencil_weights)))
+
+    # 鏡映したチェーンには、元のどのチェーンとも重ならない番号を付ける
+    mirrored = BoneChainSpec(
+        heads=np.concatenate((spec.heads, spec.heads[bones] * flip)),
+        tails=np.concatenate((spec.tails, spec.tails[bones] * flip)),
+        chains=np.concatenate((spec.chains, spec.chains[bones] + int(spec.chains.max()) + 1)),
+        index_offsets=index_offsets, indexes=indexes, weights=weights,
+        normals=None if spec.normals is None else np.concatenate((spec.normals, spec.normals[bones] * flip)),
+        roll_vectors=None if spec.roll_vectors is None
+        else np.concatenate((spec.roll_vectors, spec.roll_vectors[bones] * flip)),
+        parents=parents, stencils=stencils)
+    return mirrored, bones
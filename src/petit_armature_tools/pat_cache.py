@@ -0,0 +1,292 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import collections
+import hashlib
+import os
+import tempfile
+
+import bpy
+import numpy as np
+
+from . import pat_bone_spec
+
+# 環境変数でキャッシュを有効にします。"1"で既定のフォルダ、それ以外はキャッシュのフォルダのパスです
+ENV_VAR = "PAT_TOPOLOGY_CACHE"
+# ファイルの形式を変更したときは番号を上げ、古いファイルを読み込まないようにします
+CACHE_VERSION = 1
+DEFAULT_MAX_ENTRIES = 256
+MEMORY_ENTRIES = 16
+
+_caches = {}
+
+
+def get_default_cache_path():
+    return os.path.join(tempfile.gettempdir(), "petit_armature_tools", "topology_cache")
+
+
+def _get_addon_preferences(context):
+    addons = context.user_preferences.addons if bpy.app.version < (2, 80) else context.preferences.addons
+    addon = addons.get(__package__)
+    return addon.preferences if addon else None
+
+
+def get_topology_fingerprint(vertex_count, edges):
+    """
+    頂点数と辺の頂点インデックスの配列から、メッシュのトポロジーの指紋を計算します
+    形状が違っても、頂点と辺のつながりが同じメッシュは同じ指紋になります
+    :param vertex_count: 頂点数
+    :type vertex_count: int
+    :param edges: (辺の数, 2)の頂点インデックスの配列
+    :type edges: numpy.ndarray
+    :rtype: str
+    """
+
+    sha1 = hashlib.sha1()
+    sha1.update(np.array([CACHE_VERSION, vertex_count, len(edges)], dtype=np.int64).tobytes())
+    sha1.update(np.ascontiguousarray(edges, dtype=np.int32).tobytes())
+    return sha1.hexdigest()
+
+
+def get_geometry_fingerprint(coords, matrix):
+    """
+    頂点座標とオブジェクトの行列から、トポロジーを求めるときに使った形状の指紋を計算します
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param matrix: オブジェクトのワールド行列
+    :type matrix: mathutils.Matrix
+    :rtype: str
+    """
+
+    sha1 = hashlib.sha1()
+    sha1.update(np.ascontiguousarray(coords, dtype=np.float32).tobytes())
+    sha1.update(np.array(matrix, dtype=np.float64).tobytes())
+    return sha1.hexdigest()
+
+
+def get_cache_key(fingerprint, name, arrays, options):
+    """
+    トポロジーの指紋に、オペレーターの名前、選択した要素の配列と設定を加えたキャッシュのキーを計算します
+    :param fingerprint: get_topology_fingerprintが返した指紋
+    :type fingerprint: str
+    :param name: オペレーターの名前
+    :type name: str
+    :param arrays: 選択した要素のインデックスなどの配列のリスト
+    :type arrays: list[numpy.ndarray]
+    :param options: 結果に影響する設定の値のリスト
+    :type options: list
+    :rtype: str
+    """
+
+    sha1 = hashlib.sha1()
+    sha1.update(fingerprint.encode("utf-8"))
+    sha1.update(name.encode("utf-8"))
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=np.int64)
+        sha1.update(np.int64(len(array)).tobytes())
+        sha1.update(array.tobytes())
+    sha1.update(repr(options).encode("utf-8"))
+    return sha1.hexdigest()
+
+
+class TopologyCache(object):
+    """
+    ボーンのトポロジーを、キーごとに1つの.npyファイルへ保存するキャッシュ
+    ファイルはメモリマップで読み込み、最近使ったものはメモリにも残します
+    ファイルの数がmax_entriesを超えたときは、最も長く使われていないファイルから削除します
+    directoryがNoneの場合は、ファイルに保存せずメモリにだけ保持します
+    """
+
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._memory = collections.OrderedDict()
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def get(self, key):
+        """
+        :return: キャッシュしたトポロジー。無い場合はNone
+        :rtype: pat_bone_spec.BoneChainTopology | None
+        """
+
+        topology = self._memory.get(key)
+        if topology is not None:
+            self._memory.move_to_end(key)
+            return topology
+        if self.directory is None:
+            return None
+
+        path = self._get_path(key)
+        try:
+            data = np.load(path, mmap_mode='r')
+            topology = self._unpack(data)
+            # ファイルの更新日時を、最後に使った日時として使う
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        if topology is None:
+            return None
+
+        self._remember(key, topology)
+        return topology
+
+    def put(self, key, topology):
+        """
+        :type topology: pat_bone_spec.BoneChainTopology
+        :return: ファイルに書き込めなかった場合はエラーのメッセージ、それ以外はNone
+        :rtype: str | None
+        """
+
+        self._remember(key, topology)
+        if self.directory is None:
+            return None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+
+            # 書き込み途中のファイルを読まないように、別名で書いてから置き換える
+            path = self._get_path(key)
+            temp_path = "{}.{}.tmp.npy".format(path[:-4], os.getpid())
+            np.save(temp_path, self._pack(topology))
+            os.replace(temp_path, path)
+            self._evict()
+        except (IOError, OSError) as e:
+            return "Failed to write the topology cache: {}".format(e)
+        return None
+
+    def clear(self):
+        self._memory.clear()
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _remember(self, key, topology):
+        self._memory[key] = topology
+        self._memory.move_to_end(key)
+        while len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy") and ".tmp." not in name:
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _pack(topology):
+        # [バージョン, 配列の数, 配列ごとの長さ..., 配列をつなげたデータ...]の1つのint64の配列にする
+        arrays = topology.to_arrays()
+        header = [CACHE_VERSION, len(arrays)] + [len(array) for array in arrays]
+        return np.concatenate([np.array(header, dtype=np.int64)] + [np.asarray(array, dtype=np.int64)
+                                                                    for array in arrays])
+
+    @staticmethod
+    def _unpack(data):
+        if len(data) < 2 or int(data[0]) != CACHE_VERSION:
+            return None
+        array_count = int(data[1])
+        lengths = [int(length) for length in data[2:2 + array_count]]
+        offset = 2 + array_count
+        arrays = []
+        for length in lengths:
+            arrays.append(np.array(data[offset:offset + length]))
+            offset += length
+        return pat_bone_spec.BoneChainTopology.from_arrays(arrays)
+
+
+# リドゥパネルで設定を変えたときに抽出をやり直さないよう、直前のトポロジーを設定に関係なくメモリに保持します
+redo_cache = TopologyCache(None)
+# 直前にinvokeで開始した実行の番号
+_redo_session = 0
+
+
+def start_redo_session():
+    """
+    新しい実行を開始し、前回の実行のトポロジーをリドゥのキャッシュから破棄します
+    :return: この実行の番号。オペレーターのプロパティに保存し、リドゥのときに同じ実行かを確かめます
+    :rtype: int
+    """
+
+    global _redo_session
+    _redo_session += 1
+    redo_cache.clear()
+    return _redo_session
+
+
+def is_redo_session(session):
+    """
+    オペレーターに保存した実行の番号が、直前にinvokeで開始した実行のものかを返します
+    :type session: int
+    :rtype: bool
+    """
+
+    return session > 0 and session == _redo_session
+
+
+def get_topology_cache(context):
+    """
+    アドオンの設定と環境変数から、トポロジーのキャッシュを返します
+    :return: キャッシュが無効な場合はNone
+    :rtype: TopologyCache | None
+    """
+
+    enabled = False
+    directory = ''
+    max_entries = DEFAULT_MAX_ENTRIES
+
+    preferences = _get_addon_preferences(context)
+    if preferences:
+        enabled = preferences.use_topology_cache
+        directory = bpy.path.abspath(preferences.topology_cache_path)
+        max_entries = preferences.topology_cache_size
+
+    env_value = os.environ.get(ENV_VAR, '')
+    if env_value and env_value.lower() not in ('0', 'false', 'off'):
+        enabled = True
+        if env_value.lower() not in ('1', 'true', 'on'):
+            directory = env_value
+
+    if not enabled:
+        return None
+
+    directory = directory or get_default_cache_path()
+    cache = _caches.get(directory)
+    if cache is None:
+        cache = _caches[directory] = TopologyCache(directory, max_entries)
+    cache.max_entries = max_entries
+    return cache
@@ -0,0 +1,307 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+import numpy as np
+
+# スプラインの区間ごとに、曲がり具合を調べるために評価する点の間隔の数
+SEGMENT_RESOLUTION = 16
+
+
+def evaluate_bezier_segments(starts, start_handles, end_handles, ends, resolution=SEGMENT_RESOLUTION):
+    """
+    3次ベジェ曲線の区間を、全ての区間でまとめて等間隔のパラメーターで評価します
+    :param starts: (区間の数, 3)の始点の配列
+    :param start_handles: (区間の数, 3)の始点の右ハンドルの配列
+    :param end_handles: (区間の数, 3)の終点の左ハンドルの配列
+    :param ends: (区間の数, 3)の終点の配列
+    :param resolution: 区間ごとの評価する点の間隔の数
+    :type resolution: int
+    :return: (区間の数, resolution + 1, 3)の点の配列
+    :rtype: numpy.ndarray
+    """
+
+    t = np.linspace(0.0, 1.0, resolution + 1)[np.newaxis, :, np.newaxis]
+    s = 1.0 - t
+    return (s * s * s * starts[:, np.newaxis] + 3.0 * s * s * t * start_handles[:, np.newaxis] +
+            3.0 * s * t * t * end_handles[:, np.newaxis] + t * t * t * ends[:, np.newaxis])
+
+
+def _get_nurbs_knots(count, order, cyclic, use_endpoint):
+    if cyclic:
+        # 周期的なスプラインは、先頭のorder - 1個の点を末尾に加えた点の一様なノットを使う
+        return np.arange(count + order - 1 + order, dtype=np.float64)
+    if use_endpoint:
+        return np.concatenate((np.zeros(order), np.arange(1, count - order + 1),
+                               np.full(order, count - order + 1))).astype(np.float64)
+    return np.arange(count + order, dtype=np.float64)
+
+
+def _get_bspline_basis(knots, order, params):
+    """
+    Cox-de Boorの漸化式で、全てのパラメーターのBスプラインの基底関数をまとめて計算します
+    :return: (パラメーターの数, 基底関数の数)の配列
+    :rtype: numpy.ndarray
+    """
+
+    count = len(knots) - order
+    u = params[:, np.newaxis]
+    basis = ((knots[:-1] <= u) & (u < knots[1:])).astype(np.float64)
+
+    # 定義域の終端は、最後の区間に含める
+    at_end = params >= knots[count]
+    basis[at_end] = 0.0
+    basis[at_end, count - 1] = 1.0
+
+    for k in range(2, order + 1):
+        size = len(knots) - k
+        left_denominators = knots[k - 1:k - 1 + size] - knots[:size]
+        right_denominators = knots[k:k + size] - knots[1:1 + size]
+        left = np.divide(u - knots[:size], left_denominators, out=np.zeros((len(params), size)),
+                         where=left_denominators > 0.0)
+        right = np.divide(knots[k:k + size] - u, right_denominators, out=np.zeros((len(params), size)),
+                          where=right_denominators > 0.0)
+        basis = left * basis[:, :size] + right * basis[:, 1:size + 1]
+    return basis[:, :count]
+
+
+def evaluate_nurbs_spline(points, weights, tilts, order, cyclic=False, use_endpoint=False,
+                          resolution=SEGMENT_RESOLUTION):
+    """
+    NURBSのスプラインを、ノットの区間ごとに等間隔のパラメーターで評価します
+    :param points: (点の数, 3)の制御点の配列
+    :param weights: 制御点ごとのウェイト
+    :param tilts: 制御点ごとの傾き(ラジアン)
+    :param order: 次数 + 1。点の数より大きい場合は点の数にします
+    :param cyclic: 閉じたスプラインかどうか
+    :param use_endpoint: 両端の制御点を通るかどうか
+    :param resolution: 区間ごとの評価する点の間隔の数
+    :return: (区間の数, resolution + 1, 3)の点の配列と、(区間の数, resolution + 1)の傾きの配列
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+
+    count = len(points)
+    order = max(2, min(order, count))
+    if cyclic:
+        wrap = np.arange(count + order - 1) % count
+        points = points[wrap]
+        weights = weights[wrap]
+        tilts = tilts[wrap]
+        use_endpoint = False
+
+    knots = _get_nurbs_knots(count, order, cyclic, use_endpoint)
+    start = knots[order - 1]
+    span_count = int(round(knots[len(points)] - start))
+    params = start + (np.arange(span_count)[:, np.newaxis] +
+                      np.linspace(0.0, 1.0, resolution + 1)[np.newaxis, :]).ravel()
+
+    weighted = _get_bspline_basis(knots, order, params) * weights[np.newaxis, :]
+    denominators = weighted.sum(axis=1)
+    denominators[denominators == 0.0] = 1.0
+    coords = weighted.dot(points) / denominators[:, np.newaxis]
+    point_tilts = weighted.dot(tilts) / denominators
+    return coords.reshape(span_count, resolution + 1, 3), point_tilts.reshape(span_count, resolution + 1)
+
+
+def get_adaptive_samples(segment_points, segment_tilts, max_angle):
+    """
+    区間ごとに、曲がった角度に応じた数の点を弧長で等間隔に取り出します
+    まっすぐな区間は1つ、曲がった区間は折れ線の曲がる角度がmax_angle以下になるように分割します
+    :param segment_points: (区間の数, 評価した点の数, 3)の点の配列
+    :type segment_points: numpy.ndarray
+    :param segment_tilts: (区間の数, 評価した点の数)の傾きの配列
+    :type segment_tilts: numpy.ndarray
+    :param max_angle: 1つのボーンで曲がる角度の上限(ラジアン)
+    :type max_angle: float
+    :return: 区間ごとの点の数と、各区間の始点側から並べた点と傾きの配列。区間の終点は含みません
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    segment_count, point_count = segment_points.shape[:2]
+    vectors = np.diff(segment_points, axis=1)
+    lengths = np.linalg.norm(vectors, axis=2)
+    directions = np.divide(vectors, lengths[:, :, np.newaxis], out=np.zeros_like(vectors),
+                           where=lengths[:, :, np.newaxis] > 0.0)
+
+    # 隣り合う折れ線の向きの角度を合計し、区間ごとの分割数を決める
+    cosines = np.clip(np.einsum('ijk,ijk->ij', directions[:, :-1], directions[:, 1:]), -1.0, 1.0)
+    valid = (lengths[:, :-1] > 0.0) & (lengths[:, 1:] > 0.0)
+    turns = np.where(valid, np.arccos(cosines), 0.0).sum(axis=1)
+    counts = np.clip(np.ceil(turns / max(max_angle, 1e-6)), 1, point_count - 1).astype(np.int64)
+
+    # 区間ごとの弧長の割合に区間の番号の2倍を足し、全ての区間を1回の補間で処理する
+    arc = np.zeros((segment_count, point_count))
+    np.cumsum(lengths, axis=1, out=arc[:, 1:])
+    totals = arc[:, -1:]
+    fractions = np.divide(arc, totals, out=np.tile(np.linspace(0.0, 1.0, point_count), (segment_count, 1)),
+                          where=totals > 0.0)
+    xp = (np.arange(segment_count)[:, np.newaxis] * 2.0 + fractions).ravel()
+
+    segment_ids = np.repeat(np.arange(segment_count), counts)
+    local = np.arange(len(segment_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+    x = segment_ids * 2.0 + local / counts[segment_ids]
+
+    points = np.column_stack([np.interp(x, xp, segment_points[:, :, axis].ravel()) for axis in range(3)])
+    tilts = np.interp(x, xp, segment_tilts.ravel())
+    return counts, points, tilts
+
+
+def get_spline_chains(segment_points, segment_tilts, spline_offsets, max_angle):
+    """
+    全てのスプラインの区間から、スプラインごとに1本のチェーンになるボーンの両端をまとめて求めます
+    :param segment_points: (区間の数, 評価した点の数, 3)の点の配列。スプラインの順に並べます
+    :param segment_tilts: (区間の数, 評価した点の数)の傾きの配列
+    :param spline_offsets: スプラインごとの区間の範囲。長さはスプラインの数+1
+    :param max_angle: 1つのボーンで曲がる角度の上限(ラジアン)
+    :return: ヘッド、テール、ヘッドの傾き、テールの傾きとチェーンの番号の配列
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    spline_offsets = np.asarray(spline_offsets, dtype=np.int64)
+    counts, points, tilts = get_adaptive_samples(segment_points, segment_tilts, max_angle)
+
+    # スプラインの最後の区間の終点を、スプラインの点の末尾に加える
+    last_segments = spline_offsets[1:] - 1
+    insert_positions = np.cumsum(counts)[last_segments]
+    points = np.insert(points, insert_positions, segment_points[last_segments, -1], axis=0)
+    tilts = np.insert(tilts, insert_positions, segment_tilts[last_segments, -1])
+
+    spline_point_counts = np.add.reduceat(counts, spline_offsets[:-1]) + 1
+    point_offsets = np.zeros(len(spline_point_counts) + 1, dtype=np.int64)
+    np.cumsum(spline_point_counts, out=point_offsets[1:])
+    is_head = np.ones(len(points), dtype=bool)
+    is_head[point_offsets[1:] - 1] = False
+    heads = np.flatnonzero(is_head)
+
+    chains = np.repeat(np.arange(len(spline_point_counts)), spline_point_counts - 1)
+    return points[heads], points[heads + 1], tilts[heads], tilts[heads + 1], chains
+
+
+def get_tilt_normals(heads, tails, tilts):
+    """
+    ワールドの上方向をボーンに垂直にした向きを、ボーンの軸の周りに傾きの分だけ回転します
+    ボーンが上下を向いている場合は、Y軸を基準にします
+    :param tilts: ボーンごとの傾き(ラジアン)
+    :return: (ボーンの数, 3)のロールの基準ベクトルの配列
+    :rtype: numpy.ndarray
+    """
+
+    axes = tails - heads
+    lengths = np.linalg.norm(axes, axis=1)
+    axes = np.divide(axes, lengths[:, np.newaxis], out=np.zeros_like(axes), where=lengths[:, np.newaxis] > 0.0)
+
+    ups = np.zeros_like(axes)
+    vertical = np.abs(axes[:, 2]) > 0.999
+    ups[:, 2] = np.where(vertical, 0.0, 1.0)
+    ups[:, 1] = np.where(vertical, 1.0, 0.0)
+    normals = ups - np.einsum('ij,ij->i', ups, axes)[:, np.newaxis] * axes
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, np.newaxis]
+
+    cos = np.cos(tilts)[:, np.newaxis]
+    sin = np.sin(tilts)[:, np.newaxis]
+    return normals * cos + np.cross(axes, normals) * sin
+
+
+def get_curve_segments(curve_objects, resolution=SEGMENT_RESOLUTION):
+    """
+    カーブオブジェクトの全てのスプラインを、ワールド座標の区間に分けて評価します
+    ベジェとポリのスプラインは、全てのスプラインの区間をまとめて1回で評価します
+    :type curve_objects: list[bpy.types.Object]
+    :return: (区間の数, resolution + 1, 3)の点の配列、(区間の数, resolution + 1)の傾きの配列と、
+        スプラインごとの区間の範囲
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    bezier_parts = []
+    bezier_count = 0
+    nurbs_points = []
+    nurbs_tilts = []
+    nurbs_count = 0
+    spline_parts = []
+    for curve_object in curve_objects:
+        matrix = np.array(curve_object.matrix_world, dtype=np.float64)
+        for spline in curve_object.data.splines:
+            if spline.type == 'BEZIER':
+                count = len(spline.bezier_points)
+                arrays = []
+                for name in ("co", "handle_left", "handle_right"):
+                    array = np.empty(count * 3, dtype=np.float32)
+                    spline.bezier_points.foreach_get(name, array)
+                    arrays.append(array.reshape(-1, 3).dot(matrix[:3, :3].T) + matrix[:3, 3])
+                coords, handles_left, handles_right = arrays
+                tilts = np.empty(count, dtype=np.float32)
+                spline.bezier_points.foreach_get("tilt", tilts)
+            else:
+                count = len(spline.points)
+                points = np.empty(count * 4, dtype=np.float32)
+                spline.points.foreach_get("co", points)
+                points = points.reshape(-1, 4)
+                coords = points[:, :3].dot(matrix[:3, :3].T) + matrix[:3, 3]
+                tilts = np.empty(count, dtype=np.float32)
+                spline.points.foreach_get("tilt", tilts)
+
+            if count < 2:
+                continue
+
+            if spline.type == 'NURBS':
+                segments, segment_tilts = evaluate_nurbs_spline(
+                    coords, points[:, 3].astype(np.float64), tilts.astype(np.float64), spline.order_u,
+                    spline.use_cyclic_u, spline.use_endpoint_u, resolution)
+                nurbs_points.append(segments)
+                nurbs_tilts.append(segment_tilts)
+                spline_parts.append((False, nurbs_count, len(segments)))
+                nurbs_count += len(segments)
+                continue
+
+            # ポリのスプラインは、ハンドルを辺の3等分点に置いたベジェとして扱う
+            starts = np.arange(count if spline.use_cyclic_u else count - 1)
+            ends = (starts + 1) % count
+            if spline.type == 'BEZIER':
+                start_handles = handles_right[starts]
+                end_handles = handles_left[ends]
+            else:
+                start_handles = coords[starts] + (coords[ends] - coords[starts]) / 3.0
+                end_handles = coords[starts] + (coords[ends] - coords[starts]) * (2.0 / 3.0)
+            bezier_parts.append((coords[starts], start_handles, end_handles, coords[ends],
+                                 tilts[starts], tilts[ends]))
+            spline_parts.append((True, bezier_count, len(starts)))
+            bezier_count += len(starts)
+
+    if not spline_parts:
+        return np.zeros((0, resolution + 1, 3)), np.zeros((0, resolution + 1)), np.zeros(1, dtype=np.int64)
+
+    points = []
+    tilts = []
+    if bezier_parts:
+        columns = [np.concatenate(column).astype(np.float64) for column in zip(*bezier_parts)]
+        points.append(evaluate_bezier_segments(columns[0], columns[1], columns[2], columns[3], resolution))
+        t = np.linspace(0.0, 1.0, resolution + 1)[np.newaxis, :]
+        tilts.append(columns[4][:, np.newaxis] * (1.0 - t) + columns[5][:, np.newaxis] * t)
+    points += nurbs_points
+    tilts += nurbs_tilts
+    points = np.concatenate(points)
+    tilts = np.concatenate(tilts)
+
+    # ベジェとNURBSの区間を、元のスプラインの順に並べ直す
+    order = np.concatenate([np.arange(start, start + count) + (0 if is_bezier else bezier_count)
+                            for is_bezier, start, count in spline_parts])
+    spline_offsets = np.zeros(len(spline_parts) + 1, dtype=np.int64)
+    np.cumsum([count for _, _, count in spline_parts], out=spline_offsets[1:])
+    return points[order], tilts[order], spline_offsets
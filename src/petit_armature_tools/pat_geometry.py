@@ -0,0 +1,793 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import concurrent.futures
+import heapq
+import os
+
+import numpy as np
+
+
+def get_vertex_coordinates(mesh):
+    """
+    メッシュの頂点座標をまとめて読み込みます
+    :param mesh: 頂点座標を読み込むメッシュ
+    :type mesh: bpy.types.Mesh
+    :return: (頂点数, 3)の頂点座標の配列
+    :rtype: numpy.ndarray
+    """
+
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+    return coords.reshape(-1, 3)
+
+
+def get_vertex_normals(mesh):
+    """
+    メッシュの頂点法線をまとめて読み込みます
+    :type mesh: bpy.types.Mesh
+    :return: (頂点数, 3)の頂点法線の配列
+    :rtype: numpy.ndarray
+    """
+
+    normals = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("normal", normals)
+    return normals.reshape(-1, 3)
+
+
+def get_edge_vertices(mesh):
+    """
+    メッシュの辺の頂点インデックスをまとめて読み込みます
+    :type mesh: bpy.types.Mesh
+    :return: (辺の数, 2)の頂点インデックスの配列
+    :rtype: numpy.ndarray
+    """
+
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edges)
+    return edges.reshape(-1, 2)
+
+
+def get_edge_selection(mesh):
+    """
+    メッシュの辺の選択状態をまとめて読み込みます
+    :type mesh: bpy.types.Mesh
+    :return: 辺ごとの選択状態の配列
+    :rtype: numpy.ndarray
+    """
+
+    selected = np.empty(len(mesh.edges), dtype=bool)
+    mesh.edges.foreach_get("select", selected)
+    return selected
+
+
+def get_vertex_selection(mesh):
+    """
+    メッシュの頂点の選択状態をまとめて読み込みます
+    :type mesh: bpy.types.Mesh
+    :return: 頂点ごとの選択状態の配列
+    :rtype: numpy.ndarray
+    """
+
+    selected = np.empty(len(mesh.vertices), dtype=bool)
+    mesh.vertices.foreach_get("select", selected)
+    return selected
+
+
+def get_face_selection(mesh):
+    """
+    メッシュの面の選択状態をまとめて読み込みます
+    :type mesh: bpy.types.Mesh
+    :return: 面ごとの選択状態の配列
+    :rtype: numpy.ndarray
+    """
+
+    selected = np.empty(len(mesh.polygons), dtype=bool)
+    mesh.polygons.foreach_get("select", selected)
+    return selected
+
+
+def get_stencil_positions(coords, offsets, vertices, weights):
+    """
+    頂点座標の重み付き和で表した位置を、まとめて計算します
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param offsets: 位置ごとの頂点インデックスの範囲。長さは位置の数+1
+    :type offsets: numpy.ndarray
+    :param vertices: 全ての位置の頂点インデックスをつなげた配列
+    :type vertices: numpy.ndarray
+    :param weights: verticesと同じ長さのウェイトの配列
+    :type weights: numpy.ndarray
+    :return: (位置の数, 3)の位置の配列
+    :rtype: numpy.ndarray
+    """
+
+    count = len(offsets) - 1
+    row_ids = np.repeat(np.arange(count), np.diff(offsets))
+    weighted = coords[vertices].astype(np.float64) * np.asarray(weights, dtype=np.float64)[:, np.newaxis]
+
+    positions = np.empty((count, 3), dtype=np.float64)
+    for axis in range(3):
+        positions[:, axis] = np.bincount(row_ids, weights=weighted[:, axis], minlength=count)
+    return positions
+
+
+def get_loop_center_stencils(coords, loop_edge_verts, loop_offsets, mode='MEDIAN'):
+    """
+    ループごとの中心を、頂点座標の重み付き和として表します
+    'EDGE_LENGTH'のウェイトは現在の辺の長さで決まり、その後に頂点を動かしても変わりません
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param loop_edge_verts: 全ループの辺の頂点インデックスを連結した(辺の数, 2)の配列
+    :type loop_edge_verts: numpy.ndarray
+    :param loop_offsets: ループごとの辺の開始位置を表す(ループの数 + 1)の配列
+    :type loop_offsets: numpy.ndarray
+    :param mode: 'MEDIAN'は頂点の中央値、'EDGE_LENGTH'は辺の長さで重み付けした中心
+    :type mode: str
+    :return: ループごとの(offsets, vertices, weights)のCSR
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    loop_count = len(loop_offsets) - 1
+    loop_ids = np.repeat(np.arange(loop_count), np.diff(loop_offsets))
+
+    # 閉じたループでは同じ頂点が2回現れるため、ループごとに重複を取り除く
+    vertex_count = len(coords)
+    keys = np.unique(np.repeat(loop_ids, 2) * vertex_count + loop_edge_verts.ravel())
+    counts = np.bincount(keys // vertex_count, minlength=loop_count).astype(np.float64)
+    weights = 1.0 / counts[keys // vertex_count]
+
+    if mode == 'EDGE_LENGTH':
+        v0 = coords[loop_edge_verts[:, 0]].astype(np.float64)
+        v1 = coords[loop_edge_verts[:, 1]].astype(np.float64)
+        lengths = np.linalg.norm(v1 - v0, axis=1)
+        total_lengths = np.bincount(loop_ids, weights=lengths, minlength=loop_count)
+
+        # 辺の中点の重み付き平均は、両端の頂点へ長さの半分ずつ割り当てたものと同じになる
+        # 長さが0のループは中央値のままにする
+        valid = total_lengths > 0.0
+        median = ~valid[keys // vertex_count]
+        edge_valid = valid[loop_ids]
+        edge_weights = lengths[edge_valid] / total_lengths[loop_ids[edge_valid]] / 2.0
+        keys, inverse = np.unique(np.concatenate((keys[median], np.repeat(loop_ids[edge_valid], 2) * vertex_count +
+                                                  loop_edge_verts[edge_valid].ravel())), return_inverse=True)
+        weights = np.bincount(inverse, weights=np.concatenate((weights[median], np.repeat(edge_weights, 2))))
+
+    offsets = np.zeros(loop_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // vertex_count, minlength=loop_count), out=offsets[1:])
+    return offsets, (keys % vertex_count).astype(np.int32), weights
+
+
+def get_loop_centers(coords, loop_edge_verts, loop_offsets, mode='MEDIAN'):
+    """
+    ループごとの中心をまとめて計算します
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param loop_edge_verts: 全ループの辺の頂点インデックスを連結した(辺の数, 2)の配列
+    :type loop_edge_verts: numpy.ndarray
+    :param loop_offsets: ループごとの辺の開始位置を表す(ループの数 + 1)の配列
+    :type loop_offsets: numpy.ndarray
+    :param mode: 'MEDIAN'は頂点の中央値、'EDGE_LENGTH'は辺の長さで重み付けした中心
+    :type mode: str
+    :return: (ループの数, 3)のループの中心の配列
+    :rtype: numpy.ndarray
+    """
+
+    return get_stencil_positions(coords, *get_loop_center_stencils(coords, loop_edge_verts, loop_offsets, mode))
+
+
+def get_joint_means(coords, joint_offsets, joint_vertices):
+    """
+    関節ごとに、関節の頂点座標の平均をまとめて計算します
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param joint_offsets: 関節ごとの頂点インデックスの範囲。長さは関節の数+1
+    :type joint_offsets: numpy.ndarray
+    :param joint_vertices: 全ての関節の頂点インデックスをつなげた配列
+    :type joint_vertices: numpy.ndarray
+    :return: (関節の数, 3)の関節の位置の配列
+    :rtype: numpy.ndarray
+    """
+
+    joint_count = len(joint_offsets) - 1
+    labels = np.repeat(np.arange(joint_count), np.diff(joint_offsets))
+    counts = np.maximum(np.diff(joint_offsets), 1).astype(np.float64)
+    points = np.asarray(coords, dtype=np.float64)[joint_vertices]
+    means = np.empty((joint_count, 3), dtype=np.float64)
+    for axis in range(3):
+        means[:, axis] = np.bincount(labels, weights=points[:, axis], minlength=joint_count) / counts
+    return means
+
+
+def normalize_weights(bone_ids, vertex_indices, weights):
+    """
+    ボーンごとのウェイトの表から重複を取り除き、頂点ごとにウェイトの合計が1になるよう正規化します
+    同じボーンと頂点の組み合わせが複数ある場合は、大きい方のウェイトを使います
+    :param bone_ids: ウェイトごとのボーンの番号
+    :type bone_ids: numpy.ndarray
+    :param vertex_indices: ウェイトごとの頂点インデックス
+    :type vertex_indices: numpy.ndarray
+    :param weights: ウェイトの値
+    :type weights: numpy.ndarray
+    :return: ボーンの番号順に並んだ、ボーンの番号、頂点インデックス、正規化したウェイト
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    bone_ids = np.asarray(bone_ids, dtype=np.int64)
+    vertex_indices = np.asarray(vertex_indices, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) == 0:
+        return bone_ids, vertex_indices, weights
+
+    stride = int(vertex_indices.max()) + 1
+    keys = bone_ids * stride + vertex_indices
+    order = np.lexsort((weights, keys))
+    keys = keys[order]
+    weights = weights[order]
+
+    # 重複したキーの最後(最大のウェイト)を残す
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[1:] != keys[:-1]
+    keys = keys[last]
+    weights = np.clip(weights[last], 0.0, 1.0)
+
+    bone_ids = keys // stride
+    vertex_indices = keys % stride
+
+    totals = np.bincount(vertex_indices, weights=weights, minlength=stride)
+    valid = totals[vertex_indices] > 0.0
+    weights[valid] /= totals[vertex_indices[valid]]
+
+    return bone_ids, vertex_indices, weights
+
+
+def write_vertex_group_weights(vertex_groups, bone_ids, vertex_indices, weights, decimals=3):
+    """
+    正規化したウェイトを頂点グループへまとめて書き込みます
+    頂点グループごとに、同じウェイトの頂点を1回のaddで書き込みます
+    addの呼び出し回数を抑えるため、ウェイトはdecimalsの桁数に丸めます
+    丸めると0になるウェイトは書き込まず、頂点ごとの合計が丸めた後もちょうど1になるように最大剰余法で丸めます
+    :param vertex_groups: ボーンの番号順に並んだ頂点グループのリスト
+    :type vertex_groups: list[bpy.types.VertexGroup]
+    :param bone_ids: normalize_weightsが返したボーンの番号
+    :type bone_ids: numpy.ndarray
+    :param vertex_indices: normalize_weightsが返した頂点インデックス
+    :type vertex_indices: numpy.ndarray
+    :param weights: normalize_weightsが返したウェイト
+    :type weights: numpy.ndarray
+    :param decimals: ウェイトを丸める小数点以下の桁数
+    :type decimals: int
+    """
+
+    bone_ids, vertex_indices, units = quantize_weights(bone_ids, vertex_indices, weights, decimals)
+    if len(units) == 0:
+        return
+
+    # ボーンの番号とウェイトの値でまとめる
+    order = np.lexsort((units, bone_ids))
+    bone_ids = bone_ids[order]
+    vertex_indices = vertex_indices[order]
+    units = units[order]
+
+    scale = 10 ** decimals
+    split = np.flatnonzero((bone_ids[1:] != bone_ids[:-1]) | (units[1:] != units[:-1])) + 1
+    starts = np.concatenate(([0], split))
+    ends = np.concatenate((split, [len(bone_ids)]))
+    for start, end in zip(starts, ends):
+        vertex_groups[bone_ids[start]].add(vertex_indices[start:end].tolist(), float(units[start]) / scale,
+                                           'REPLACE')
+
+
+def quantize_weights(bone_ids, vertex_indices, weights, decimals=3):
+    """
+    ウェイトをdecimalsの桁数の整数の単位に丸めます
+    丸めると0になる組を除いて正規化し直し、頂点ごとの単位の合計が10 ** decimalsになるように
+    端数の大きい組から1単位ずつ足します
+    :return: 0の組を除いたボーンの番号、頂点インデックスと、ウェイトを10 ** decimals倍した整数
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    bone_ids = np.asarray(bone_ids, dtype=np.int64)
+    vertex_indices = np.asarray(vertex_indices, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    scale = 10 ** decimals
+
+    keep = np.round(weights * scale) > 0.0
+    bone_ids = bone_ids[keep]
+    vertex_indices = vertex_indices[keep]
+    weights = weights[keep]
+    if len(weights) == 0:
+        return bone_ids, vertex_indices, np.zeros(0, dtype=np.int64)
+
+    totals = np.bincount(vertex_indices, weights=weights)
+    scaled = weights / totals[vertex_indices] * scale
+    units = np.floor(scaled).astype(np.int64)
+
+    # 頂点ごとに足りない単位の数だけ、端数の大きい組に1単位ずつ足す
+    missing = scale - np.bincount(vertex_indices, weights=units).astype(np.int64)
+    order = np.lexsort((units - scaled, vertex_indices))
+    sorted_vertices = vertex_indices[order]
+    ranks = np.arange(len(order)) - np.searchsorted(sorted_vertices, sorted_vertices, side='left')
+    units[order[ranks < missing[sorted_vertices]]] += 1
+
+    valid = units > 0
+    return bone_ids[valid], vertex_indices[valid], units[valid]
+
+
+def get_nearest_bone_weights(coords, heads, tails, bone_count=2, falloff=2.0, min_weight=0.001,
+                             chunk_elements=1 << 22):
+    """
+    頂点ごとに最も近いボーンの線分をbone_count本探し、距離に応じたウェイトを計算します
+    メモリの使用量を抑えるため、頂点はchunk_elements / ボーンの数ずつ処理します
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param heads: (ボーンの数, 3)のボーンのヘッドの配列
+    :type heads: numpy.ndarray
+    :param tails: (ボーンの数, 3)のボーンのテールの配列
+    :type tails: numpy.ndarray
+    :param bone_count: 1つの頂点にウェイトを付けるボーンの最大数
+    :type bone_count: int
+    :param falloff: 距離に対するウェイトの減衰の指数
+    :type falloff: float
+    :param min_weight: これより小さいウェイトは取り除きます
+    :type min_weight: float
+    :param chunk_elements: 一度に計算する頂点とボーンの組み合わせの数
+    :type chunk_elements: int
+    :return: ボーンの番号、頂点インデックス、正規化したウェイト
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    heads = np.asarray(heads, dtype=np.float64).reshape(-1, 3)
+    tails = np.asarray(tails, dtype=np.float64).reshape(-1, 3)
+    total_bones = len(heads)
+    vertex_count = len(coords)
+    bone_count = max(1, min(bone_count, total_bones))
+    if total_bones == 0 or vertex_count == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float64)
+
+    directions = tails - heads
+    direction_lengths = np.einsum('ij,ij->i', directions, directions)
+    direction_lengths[direction_lengths == 0.0] = 1.0
+    head_dot_direction = np.einsum('ij,ij->i', heads, directions)
+    head_lengths = np.einsum('ij,ij->i', heads, heads)
+
+    chunk_size = max(1, chunk_elements // total_bones)
+    all_bone_ids = []
+    all_vertex_indices = []
+    all_weights = []
+    for start in range(0, vertex_count, chunk_size):
+        points = np.asarray(coords[start:start + chunk_size], dtype=np.float64)
+        point_dot_direction = points.dot(directions.T)
+
+        # 線分上の最も近い点のパラメーター
+        t = np.clip((point_dot_direction - head_dot_direction) / direction_lengths, 0.0, 1.0)
+
+        # |p - (a + t d)|^2 を内積だけで展開して計算する
+        distances = np.einsum('ij,ij->i', points, points)[:, np.newaxis]
+        distances = distances - 2.0 * (points.dot(heads.T) + t * point_dot_direction)
+        distances += head_lengths + 2.0 * t * head_dot_direction + t * t * direction_lengths
+        np.maximum(distances, 0.0, out=distances)
+
+        rows = np.arange(len(points))[:, np.newaxis]
+        if bone_count < total_bones:
+            nearest = np.argpartition(distances, bone_count - 1, axis=1)[:, :bone_count]
+        else:
+            nearest = np.broadcast_to(np.arange(total_bones), distances.shape)
+        nearest_distances = np.sqrt(distances[rows, nearest])
+
+        weights = 1.0 / (nearest_distances ** falloff + 1e-12)
+        weights /= weights.sum(axis=1)[:, np.newaxis]
+
+        # 小さなウェイトを取り除いて正規化し直す
+        weights[weights < min_weight] = 0.0
+        weights /= weights.sum(axis=1)[:, np.newaxis]
+        keep = weights > 0.0
+
+        all_bone_ids.append(nearest[keep])
+        all_vertex_indices.append(np.broadcast_to(rows + start, nearest.shape)[keep])
+        all_weights.append(weights[keep])
+
+    return (np.concatenate(all_bone_ids).astype(np.int64), np.concatenate(all_vertex_indices).astype(np.int64),
+            np.concatenate(all_weights))
+
+
+def get_vertex_adjacency(vertex_count, edges):
+    """
+    辺の頂点インデックスから、頂点ごとの隣接頂点をCSR形式でまとめて作成します
+    :param vertex_count: 頂点数
+    :type vertex_count: int
+    :param edges: (辺の数, 2)の頂点インデックスの配列
+    :type edges: numpy.ndarray
+    :return: 頂点ごとの隣接頂点の範囲を表す(頂点数 + 1)の配列と、隣接頂点のインデックスの配列
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    sources = np.concatenate((edges[:, 0], edges[:, 1]))
+    targets = np.concatenate((edges[:, 1], edges[:, 0]))
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=vertex_count), out=offsets[1:])
+    return offsets, targets[np.argsort(sources, kind='stable')]
+
+
+def _run_steps(steps):
+    try:
+        while True:
+            next(steps)
+    except StopIteration as e:
+        return e.value
+
+
+def get_shortest_path(coords, adjacency_offsets, adjacency_vertices, start, end):
+    """
+    二分ヒープを使ったダイクストラ法で、辺の長さの合計が最短になる頂点の経路を求めます
+    終点に到達した時点で探索を終了するため、たどるのは終点より近い頂点だけです
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param adjacency_offsets: get_vertex_adjacencyが返した隣接頂点の範囲の配列
+    :type adjacency_offsets: numpy.ndarray
+    :param adjacency_vertices: get_vertex_adjacencyが返した隣接頂点のインデックスの配列
+    :type adjacency_vertices: numpy.ndarray
+    :param start: 始点の頂点インデックス
+    :type start: int
+    :param end: 終点の頂点インデックス
+    :type end: int
+    :return: 始点から終点までの頂点インデックスのリスト。つながっていない場合は空のリスト
+    :rtype: list[int]
+    """
+
+    return _run_steps(iter_shortest_path(coords, adjacency_offsets, adjacency_vertices, start, end))
+
+
+def iter_shortest_path(coords, adjacency_offsets, adjacency_vertices, start, end, batch_size=4096):
+    """
+    get_shortest_pathを少しずつ進めるジェネレーター
+    batch_size個の頂点をたどるごとに、たどった頂点の割合を進み具合として返します
+    終了したときのStopIterationの値が頂点インデックスのリストになります
+    """
+
+    # 辺の長さはまとめて計算し、探索中はリストとして参照する
+    sources = np.repeat(np.arange(len(adjacency_offsets) - 1), np.diff(adjacency_offsets))
+    coords = np.asarray(coords, dtype=np.float64)
+    lengths = np.linalg.norm(coords[adjacency_vertices] - coords[sources], axis=1).tolist()
+    offsets = adjacency_offsets.tolist()
+    neighbors = adjacency_vertices.tolist()
+
+    distances = {start: 0.0}
+    previous = {}
+    visited = set()
+    heap = [(0.0, start)]
+    vertex_count = max(len(offsets) - 1, 1)
+    yield 0.0
+    while heap:
+        distance, vertex = heapq.heappop(heap)
+        if vertex == end:
+            break
+        if vertex in visited:
+            continue
+        visited.add(vertex)
+        if len(visited) % batch_size == 0:
+            yield len(visited) / vertex_count
+
+        for i in range(offsets[vertex], offsets[vertex + 1]):
+            neighbor = neighbors[i]
+            new_distance = distance + lengths[i]
+            if neighbor not in visited and new_distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_distance
+                previous[neighbor] = vertex
+                heapq.heappush(heap, (new_distance, neighbor))
+    else:
+        return []
+
+    path = [end]
+    while path[-1] != start:
+        path.append(previous[path[-1]])
+    path.reverse()
+    return path
+
+
+def get_nearest_neighbor_order(points, start=0):
+    """
+    開始点から、まだたどっていない最も近い点を順にたどった順番を返します
+    :param points: (点の数, 3)の座標の配列
+    :type points: numpy.ndarray
+    :param start: 開始点のインデックス
+    :type start: int
+    :return: たどった点のインデックスの配列
+    :rtype: numpy.ndarray
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    count = len(points)
+    order = np.empty(count, dtype=np.int64)
+    visited = np.zeros(count, dtype=bool)
+    current = start
+    for i in range(count):
+        order[i] = current
+        visited[current] = True
+        if i == count - 1:
+            break
+        distances = np.einsum('ij,ij->i', points - points[current], points - points[current])
+        distances[visited] = np.inf
+        current = int(np.argmin(distances))
+    return order
+
+
+def get_connected_components(vertex_count, edges):
+    """
+    辺の配列からUnion-Findで連結成分を求め、頂点ごとの成分の番号を返します
+    根をつなぐ処理と経路の圧縮を、全ての辺に対してまとめて繰り返します
+    :param vertex_count: 頂点数
+    :type vertex_count: int
+    :param edges: (辺の数, 2)の頂点インデックスの配列
+    :type edges: numpy.ndarray
+    :return: 0から始まる連続した成分の番号の配列と、成分の数
+    :rtype: (numpy.ndarray, int)
+    """
+
+    parent = np.arange(vertex_count, dtype=np.int64)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if len(edges):
+        v0 = edges[:, 0]
+        v1 = edges[:, 1]
+        while True:
+            root0 = parent[v0]
+            root1 = parent[v1]
+            different = root0 != root1
+            if not different.any():
+                break
+
+            # 大きい方の根を小さい方の根につなぐ
+            low = np.minimum(root0[different], root1[different])
+            high = np.maximum(root0[different], root1[different])
+            np.minimum.at(parent, high, low)
+
+            # 全ての頂点が根を直接指すまで経路を圧縮する
+            while True:
+                grand_parent = parent[parent]
+                if np.array_equal(grand_parent, parent):
+                    break
+                parent = grand_parent
+
+    _, labels = np.unique(parent, return_inverse=True)
+    return labels.reshape(-1), int(labels.max()) + 1 if vertex_count else 0
+
+
+def get_principal_axes(coords, labels, count):
+    """
+    成分ごとの頂点座標の主成分の軸を、まとめて計算します
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param labels: 頂点ごとの成分の番号
+    :type labels: numpy.ndarray
+    :param count: 成分の数
+    :type count: int
+    :return: (成分の数, 3)の中心と、(成分の数, 3, 3)の固有ベクトルの配列
+             固有ベクトルは列ごとに、固有値の小さい順に並びます
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+
+    coords = np.asarray(coords, dtype=np.float64)
+    counts = np.maximum(np.bincount(labels, minlength=count), 1).astype(np.float64)
+    centers = np.empty((count, 3), dtype=np.float64)
+    for axis in range(3):
+        centers[:, axis] = np.bincount(labels, weights=coords[:, axis], minlength=count) / counts
+
+    local = coords - centers[labels]
+    covariances = np.empty((count, 3, 3), dtype=np.float64)
+    for i in range(3):
+        for j in range(i, 3):
+            value = np.bincount(labels, weights=local[:, i] * local[:, j], minlength=count) / counts
+            covariances[:, i, j] = value
+            covariances[:, j, i] = value
+
+    _, vectors = np.linalg.eigh(covariances)
+    return centers, vectors
+
+
+def get_loop_frames(coords, loop_offsets, loop_vertices):
+    """
+    全てのループの頂点に平面をまとめて当てはめ、ループの軸と平面内の基準ベクトルを計算します
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param loop_offsets: ループごとの頂点インデックスの範囲。長さはループの数+1
+    :type loop_offsets: numpy.ndarray
+    :param loop_vertices: 全てのループの頂点インデックスをつなげた配列
+    :type loop_vertices: numpy.ndarray
+    :return: (ループの数, 3)の平面の法線(ループの軸)と、平面内で最も広がる方向の配列
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+
+    loop_count = len(loop_offsets) - 1
+    labels = np.repeat(np.arange(loop_count), np.diff(loop_offsets))
+    _, vectors = get_principal_axes(coords[loop_vertices], labels, loop_count)
+    return vectors[:, :, 0], vectors[:, :, 2]
+
+
+def get_bone_rolls(heads, tails, align_vectors):
+    """
+    ボーンのZ軸が基準ベクトルの向きになるロールを、EditBone.align_rollと同じ計算でまとめて求めます
+    :param heads: (ボーンの数, 3)のヘッドの配列
+    :type heads: numpy.ndarray
+    :param tails: (ボーンの数, 3)のテールの配列
+    :type tails: numpy.ndarray
+    :param align_vectors: (ボーンの数, 3)の基準ベクトルの配列
+    :type align_vectors: numpy.ndarray
+    :return: ボーンごとのロール(ラジアン)
+    :rtype: numpy.ndarray
+    """
+
+    directions = np.asarray(tails, dtype=np.float64) - np.asarray(heads, dtype=np.float64)
+    lengths = np.linalg.norm(directions, axis=1, keepdims=True)
+    directions = np.divide(directions, lengths, out=np.zeros_like(directions), where=lengths > 0.0)
+    x, y, z = directions[:, 0], directions[:, 1], directions[:, 2]
+
+    # ロールが0のときのZ軸(BlenderのBKE_vec_roll_to_mat3と同じ)。-Y方向を向くボーンは(0, 0, 1)になる
+    theta = 1.0 + y
+    safe = theta > 1e-6
+    theta = np.where(safe, theta, 1.0)
+    zero_roll_z = np.column_stack((np.where(safe, -x * z / theta, 0.0), np.where(safe, -z, 0.0),
+                                   np.where(safe, 1.0 - z * z / theta, 1.0)))
+
+    # 基準ベクトルをボーンに垂直な平面へ投影し、Y軸まわりの角度を求める
+    align_vectors = np.asarray(align_vectors, dtype=np.float64)
+    projected = align_vectors - np.einsum('ij,ij->i', align_vectors, directions)[:, None] * directions
+    cos = np.einsum('ij,ij->i', zero_roll_z, projected)
+    sin = np.einsum('ij,ij->i', np.cross(zero_roll_z, projected), directions)
+    return np.arctan2(sin, cos)
+
+
+def _get_hair_card_rows(coords, edges, labels, island_axes, island_centers, cross_threshold):
+    """
+    島ごとに、カードを横切る辺でつながる頂点を1つの列として求め、カードの長さ方向に並べます
+    get_hair_card_chainsから、島のまとまりごとに呼び出されます
+    """
+
+    # このまとまりの頂点だけを、ローカルなインデックスで扱う
+    vertices = np.unique(edges)
+    local_edges = np.searchsorted(vertices, edges)
+    vertex_labels = labels[vertices]
+    local_coords = np.asarray(coords[vertices], dtype=np.float64)
+
+    # 島の長さ方向の軸に対して、横向きの辺を列の辺とする
+    directions = local_coords[local_edges[:, 1]] - local_coords[local_edges[:, 0]]
+    lengths = np.linalg.norm(directions, axis=1)
+    lengths[lengths == 0.0] = 1.0
+    cosines = np.abs(np.einsum('ij,ij->i', directions, island_axes[vertex_labels[local_edges[:, 0]]])) / lengths
+    row_labels, row_count = get_connected_components(len(vertices), local_edges[cosines < cross_threshold])
+
+    row_counts = np.bincount(row_labels, minlength=row_count).astype(np.float64)
+    row_centers = np.empty((row_count, 3), dtype=np.float64)
+    for axis in range(3):
+        row_centers[:, axis] = np.bincount(row_labels, weights=local_coords[:, axis], minlength=row_count) / row_counts
+
+    row_islands = np.empty(row_count, dtype=np.int64)
+    row_islands[row_labels] = vertex_labels
+    row_params = np.einsum('ij,ij->i', row_centers - island_centers[row_islands], island_axes[row_islands])
+
+    # 島ごとに、長さ方向の位置の順に列を並べる
+    row_order = np.lexsort((row_params, row_islands))
+    row_rank = np.empty(row_count, dtype=np.int64)
+    row_rank[row_order] = np.arange(row_count)
+
+    vertex_order = np.argsort(row_rank[row_labels], kind='stable')
+    row_vertices = vertices[vertex_order]
+    row_sizes = np.bincount(row_rank[row_labels], minlength=row_count)
+
+    return row_islands[row_order], row_sizes, row_vertices, row_centers[row_order]
+
+
+def get_hair_card_chains(coords, edges, selected=None, cross_threshold=0.5, workers=None):
+    """
+    メッシュの島ごとにヘアカードの列を求め、島ごとに1本のチェーンとして返します
+    引数と戻り値はiter_hair_card_chainsと同じです
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    return _run_steps(iter_hair_card_chains(coords, edges, selected, cross_threshold, workers))
+
+
+def iter_hair_card_chains(coords, edges, selected=None, cross_threshold=0.5, workers=None):
+    """
+    get_hair_card_chainsを少しずつ進めるジェネレーター。島のまとまりを1つ処理するごとに進み具合を返します
+    島はUnion-Findで求め、島の長さ方向は頂点座標の主成分から求めます
+    島のまとまりごとの計算はスレッドプールで並列に処理します
+    :param coords: (頂点数, 3)の頂点座標の配列
+    :type coords: numpy.ndarray
+    :param edges: (辺の数, 2)の頂点インデックスの配列
+    :type edges: numpy.ndarray
+    :param selected: 頂点ごとの選択状態。指定した場合は、選択した頂点を含む島だけを使います
+    :type selected: numpy.ndarray | None
+    :param cross_threshold: 長さ方向とのなす角の余弦がこれより小さい辺を、カードを横切る辺とします
+    :type cross_threshold: float
+    :param workers: スレッドの数。Noneの場合はCPUの数
+    :type workers: int | None
+    :return: StopIterationの値として、チェーンごとの列の開始位置、列ごとの頂点の開始位置、列の頂点インデックス、
+        (列の数, 3)の列の中心
+    :rtype: collections.Iterator[float]
+    """
+
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    labels, island_count = get_connected_components(len(coords), edges)
+    yield 0.1
+    island_centers, island_vectors = get_principal_axes(coords, labels, island_count)
+    yield 0.2
+    island_axes = island_vectors[:, :, 2]
+
+    # 選択した頂点を含む島の辺だけを使う
+    use_island = np.ones(island_count, dtype=bool)
+    if selected is not None and np.any(selected):
+        use_island[:] = False
+        use_island[labels[np.asarray(selected, dtype=bool)]] = True
+    edge_islands = labels[edges[:, 0]]
+    edge_order = np.argsort(edge_islands, kind='stable')
+    edge_order = edge_order[use_island[edge_islands[edge_order]]]
+    sorted_islands = edge_islands[edge_order]
+
+    # 島のまとまりごとにスレッドへ分ける
+    workers = workers or os.cpu_count() or 1
+    islands = np.unique(sorted_islands)
+    batches = [batch for batch in np.array_split(islands, max(1, min(len(islands), workers * 4))) if len(batch)]
+
+    def process(batch):
+        start = np.searchsorted(sorted_islands, batch[0], side='left')
+        end = np.searchsorted(sorted_islands, batch[-1], side='right')
+        return _get_hair_card_rows(coords, edges[edge_order[start:end]], labels, island_axes, island_centers,
+                                   cross_threshold)
+
+    results = []
+    if workers > 1 and len(batches) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process, batch) for batch in batches]
+            for future in futures:
+                results.append(future.result())
+                yield 0.2 + 0.8 * len(results) / len(batches)
+    else:
+        for batch in batches:
+            results.append(process(batch))
+            yield 0.2 + 0.8 * len(results) / len(batches)
+
+    row_islands = np.concatenate([result[0] for result in results]) if results else np.empty(0, dtype=np.int64)
+    row_sizes = np.concatenate([result[1] for result in results]) if results else np.empty(0, dtype=np.int64)
+    row_vertices = np.concatenate([result[2] for result in results]) if results else np.empty(0, dtype=np.int64)
+    row_centers = np.concatenate([result[3] for result in results]) if results else np.empty((0, 3))
+
+    # 列が2つ以上ある島だけをチェーンにする
+    island_change = np.flatnonzero(np.diff(row_islands)) + 1 if len(row_islands) else np.empty(0, dtype=np.int64)
+    chain_starts = np.concatenate(([0], island_change)) if len(row_islands) else np.empty(0, dtype=np.int64)
+    chain_offsets = np.append(chain_starts, len(row_islands)).astype(np.int64)
+    row_offsets = np.zeros(len(row_sizes) + 1, dtype=np.int64)
+    np.cumsum(row_sizes, out=row_offsets[1:])
+
+    keep = np.diff(chain_offsets) >= 2
+    if not keep.all():
+        keep_rows = np.repeat(keep, np.diff(chain_offsets))
+        keep_vertices = np.repeat(keep_rows, row_sizes)
+        row_vertices = row_vertices[keep_vertices]
+        row_centers = row_centers[keep_rows]
+        row_sizes = row_sizes[keep_rows]
+        row_offsets = np.zeros(len(row_sizes) + 1, dtype=np.int64)
+        np.cumsum(row_sizes, out=row_offsets[1:])
+        chain_sizes = np.diff(chain_offsets)[keep]
+        chain_offsets = np.zeros(len(chain_sizes) + 1, dtype=np.int64)
+        np.cumsum(chain_sizes, out=chain_offsets[1:])
+
+    return chain_offsets, row_offsets, row_vertices, row_centers
@@ -0,0 +1,112 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import collections
+import hashlib
+
+import mathutils
+import numpy as np
+
+# KDツリーを保持するメッシュの数
+MAX_ENTRIES = 4
+
+_mirror_maps = collections.OrderedDict()
+
+
+class MirrorMap(object):
+    """
+    メッシュの頂点のKDツリーと、X軸で鏡映した位置にある頂点の対応を保持します
+    対応は必要になった頂点だけ求めます
+    最近傍の対応は左右で一致するとは限らないため、頂点ごとに探します
+    """
+
+    def __init__(self, coords):
+        """
+        :param coords: (頂点数, 3)のメッシュのローカル座標の配列
+        :type coords: numpy.ndarray
+        """
+
+        self.coords = coords
+        self.tree = mathutils.kdtree.KDTree(len(coords))
+        for index, co in enumerate(coords.tolist()):
+            self.tree.insert(co, index)
+        self.tree.balance()
+        # まだ求めていない頂点は-1
+        self.mirror_vertices = np.full(len(coords), -1, dtype=np.int64)
+        self.distances = np.zeros(len(coords))
+
+    def get_mirror_vertices(self, vertices):
+        """
+        頂点ごとに、X座標を反転した位置に最も近い頂点と、その位置からの距離を返します
+        :param vertices: 頂点インデックスの配列
+        :type vertices: numpy.ndarray
+        :return: 鏡映した側の頂点インデックスと距離の配列
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+
+        vertices = np.asarray(vertices, dtype=np.int64)
+        unknown = np.unique(vertices[self.mirror_vertices[vertices] < 0])
+        if len(unknown):
+            mirror_vertices = self.mirror_vertices
+            distances = self.distances
+            find = self.tree.find
+            mirrored = self.coords[unknown] * np.array([-1.0, 1.0, 1.0], dtype=np.float32)
+            for index, co in zip(unknown.tolist(), mirrored.tolist()):
+                _, found, distance = find(co)
+                mirror_vertices[index] = found
+                distances[index] = distance
+        return self.mirror_vertices[vertices], self.distances[vertices]
+
+
+def get_mirror_map(mesh, coords=None):
+    """
+    メッシュのMirrorMapを返します。頂点座標が変わっていなければ、前回作成したKDツリーを再利用します
+    :type mesh: bpy.types.Mesh
+    :param coords: 読み込み済みの頂点座標。無い場合はメッシュから読み込みます
+    :rtype: MirrorMap
+    """
+
+    if coords is None:
+        coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", coords)
+        coords = coords.reshape(-1, 3)
+    coords = np.ascontiguousarray(coords, dtype=np.float32)
+
+    key = mesh.as_pointer()
+    fingerprint = hashlib.sha1(coords.tobytes()).hexdigest()
+    entry = _mirror_maps.get(key)
+    if entry is None or entry[0] != fingerprint:
+        entry = (fingerprint, MirrorMap(coords))
+    _mirror_maps[key] = entry
+    _mirror_maps.move_to_end(key)
+    while len(_mirror_maps) > MAX_ENTRIES:
+        _mirror_maps.popitem(last=False)
+    return entry[1]
+
+
+def get_mirror_name(name, side):
+    """
+    ボーンの名前に、左右を表す.Lまたは.Rを付けます
+    :param side: 'L'、'R'、または中心線上のチェーンの''
+    :type side: str
+    :rtype: str
+    """
+
+    return "{}.{}".format(name, side) if side else name
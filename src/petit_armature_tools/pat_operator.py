@@ -20,11 +20,20 @@
 
 import bpy
 import bmesh
-import copy
 import math
+import time
+
 import mathutils
+import numpy as np
 
 from .utils.bl_anotations import make_annotations
+from . import pat_bone_spec
+from . import pat_cache
+from . import pat_curve
+from . import pat_geometry
+from . import pat_mirror
+from . import pat_profiler
+from . import pat_topology
 
 
 def create_name(base_name, separator='.', prefix='', suffix='', start_number=1, count=0, zero_padding=3):
@@ -60,50 +69,175 @@ def create_name(base_name, separator='.', prefix='', suffix='', start_number=1,
     return bone_name_prefix + str(start_number + count).rjust(zero_padding, '0') + bone_name_suffix
 
 
-# def target_armature_poll(self, context):
-#     """
-#
-#     :param self:
-#     :type self:
-#     :param context:
-#     :type context: bpy_types.Object
-#     :return:
-#     :rtype:
-#     """
-#     print("poll:",type(self))
-#     print("poll:",type(context))
-#     return context.type == 'ARMATURE' and context.is_visible(bpy.context.scene) if bpy.app.version < (2, 80)\
-#         else context.type == 'ARMATURE' and context.visible_get()
-#
-#
-# def target_armature_update(self, context):
-#     """
-#
-#     :param self:
-#     :type self:
-#     :param context:
-#     :type context:
-#     """
-#     print("update:",type(self))
-#     print("update:",type(context))
-#     self.target_bone = ''
+def create_chain_name(base_name, separator='.', chain_start_number=1, chain_count=0, chain_zero_padding=2):
+    """
+    複数チェーンのボーン名に使う、チェーンの番号を付けた基本形を作成します
+    :param base_name: 名前の基本形
+    :type base_name: str
+    :param separator: 名前と数字を区切る文字
+    :type separator: str
+    :param chain_start_number: チェーンの開始番号
+    :type chain_start_number: int
+    :param chain_count: カウントアップした後のチェーンの数値
+    :type chain_count: int
+    :param chain_zero_padding: ゼロ埋めする際のチェーンの数字の桁数
+    :type chain_zero_padding: int
+    :return: チェーンの番号を付けた名前の基本形
+    :rtype: str
+    """
+
+    return base_name + separator + str(chain_start_number + chain_count).rjust(chain_zero_padding, '0')
+
+
+def mul_matrix(matrix, vector):
+    """
+    Blenderのバージョンに合わせて、行列と行列またはベクトルの積を計算します
+    :type matrix: mathutils.Matrix
+    :type vector: mathutils.Matrix | mathutils.Vector
+    :rtype: mathutils.Matrix | mathutils.Vector
+    """
+
+    return matrix * vector if bpy.app.version < (2, 80) else matrix @ vector
+
+
+def set_active_object(context, obj):
+    """
+    Blenderのバージョンに合わせて、オブジェクトを選択してアクティブにします
+    :type context: bpy.types.Context
+    :type obj: bpy.types.Object
+    """
+
+    if hasattr(context, "view_layer"):
+        obj.select_set(True)
+        context.view_layer.objects.active = obj
+    else:
+        obj.select = True
+        context.scene.objects.active = obj
+
+
+def run_steps(steps):
+    """
+    進み具合を返すジェネレーターを最後まで進め、その戻り値を返します
+    :type steps: collections.Iterator[float]
+    """
+
+    try:
+        while True:
+            next(steps)
+    except StopIteration as e:
+        return e.value
+
+
+def set_bone_stencil(bone, mesh_name, offset, head, tail):
+    """
+    ボーンのヘッドとテールを求めた頂点とウェイトを、再フィットのためにカスタムプロパティへ保存します
+    :type bone: bpy.types.EditBone
+    :param mesh_name: ボーンを作成したメッシュのオブジェクトの名前
+    :type mesh_name: str
+    :param offset: メッシュの座標でのオフセット
+    :type offset: list[float]
+    :param head: ヘッドの(頂点インデックスのリスト, ウェイトのリスト)
+    :param tail: テールの(頂点インデックスのリスト, ウェイトのリスト)
+    """
+
+    bone["pat_mesh"] = mesh_name
+    bone["pat_offset"] = offset
+    bone["pat_head_vertices"], bone["pat_head_weights"] = head
+    bone["pat_tail_vertices"], bone["pat_tail_weights"] = tail
+
+
+def get_bone_stencil(bone):
+    """
+    set_bone_stencilで保存した値を返します
+    :type bone: bpy.types.Bone
+    :return: (メッシュの名前, オフセット, ヘッドの頂点, ヘッドのウェイト, テールの頂点, テールのウェイト)。無い場合はNone
+    :rtype: tuple | None
+    """
+
+    try:
+        return (bone["pat_mesh"], list(bone["pat_offset"]),
+                list(bone["pat_head_vertices"]), list(bone["pat_head_weights"]),
+                list(bone["pat_tail_vertices"]), list(bone["pat_tail_weights"]))
+    except KeyError:
+        return None
+
+
+LOOP_CENTER_MODE_ITEMS = (
+    ('MEDIAN', "Median", "Median point of the loop vertices"),
+    ('EDGE_LENGTH', "Edge Length", "Center of the loop edges weighted by edge length"),
+)
+
+LOOP_SELECTION_MODE_ITEMS = (
+    ('HISTORY', "Selection Order", "One edge of every loop, in the order they were selected"),
+    ('RING', "Edge Ring", "One edge ring, or the two end loops, of a quad strip"),
+)
+
+EDGE_ORDER_MODE_ITEMS = (
+    ('HISTORY', "Selection Order", "Order the edges in the order they were selected"),
+    ('CURSOR', "Nearest to 3D Cursor",
+     "Split the selected edges into paths starting at the end nearest to the 3D cursor"),
+    ('LOWEST', "Lowest", "Split the selected edges into paths starting at the lowest end"),
+)
+
+CHAIN_ROOT_ITEMS = (
+    ('CURSOR', "Nearest to 3D Cursor", "Start each chain at the loop nearest to the 3D cursor"),
+    ('LOWEST', "Lowest", "Start each chain at the lowest loop"),
+)
+
+RESAMPLE_MODE_ITEMS = (
+    ('NONE', "None", "Create one bone per selected edge or loop gap"),
+    ('COUNT', "Bone Count", "Resample each chain to a fixed number of evenly spaced bones"),
+    ('LENGTH', "Bone Length", "Resample each chain to bones of about the same length"),
+    ('SIMPLIFY', "Simplify", "Merge bones where the chain is straight within the tolerance"),
+)
+
+WEIGHT_MODE_ITEMS = (
+    ('SELECTED', "Selected Vertices", "Weight only the vertices the bones were created from"),
+    ('NEAREST', "Nearest Bones", "Weight every vertex to its nearest bones"),
+)
+
+
+def target_armature_poll(self, obj):
+    """
+    ボーンを追加するアーマチュアとして選択できるオブジェクトかどうかを返します
+    :param self:
+    :type self: PAT_ToolSettings
+    :param obj:
+    :type obj: bpy.types.Object
+    :rtype: bool
+    """
+
+    return obj.type == 'ARMATURE' and obj.is_visible(bpy.context.scene) if bpy.app.version < (2, 80) \
+        else obj.type == 'ARMATURE' and obj.visible_get()
+
+
+def target_armature_update(self, context):
+    """
+    アーマチュアが変更されたとき、親ボーンの指定を解除します
+    :param self:
+    :type self: PAT_ToolSettings
+    :param context:
+    :type context: bpy.types.Context
+    """
+
+    self.target_bone = ''
 
 
 @make_annotations
 class PAT_ToolSettings(bpy.types.PropertyGroup):
-    # target_armature = bpy.props.PointerProperty(
-    #     name="Target Armature",
-    #     description="",
-    #     type=bpy.types.Object,
-    #     poll=target_armature_poll,
-    #     update=target_armature_update,
-    #     options={'HIDDEN'}
-    # )
-    # target_bone = bpy.props.StringProperty(
-    #     name="Target Bone",
-    #     description="",
-    #     options={'HIDDEN'}
-    # )
+    target_armature = bpy.props.PointerProperty(
+        name="Target Armature",
+        description="Existing armature to add the created bones to",
+        type=bpy.types.Object,
+        poll=target_armature_poll,
+        update=target_armature_update,
+        options={'HIDDEN'}
+    )
+    target_bone = bpy.props.StringProperty(
+        name="Target Bone",
+        description="Bone of the target armature to parent the created bones to",
+        options={'HIDDEN'}
+    )
     display_edge_oder = bpy.props.BoolProperty(
         name="Selected Edge Loop Oder Settings",
         description="Display Settings of Selected Edge Oder",
@@ -116,6 +250,33 @@ class PAT_ToolSettings(bpy.types.PropertyGroup):
         default=False,
         options={'HIDDEN'}
     )
+    display_hair_card_islands = bpy.props.BoolProperty(
+        name="Hair Card Islands Settings",
+        description="Display Settings of Hair Card Islands",
+        default=False,
+        options={'HIDDEN'}
+    )
+    display_shortest_path = bpy.props.BoolProperty(
+        name="Shortest Path Settings",
+        description="Display Settings of Shortest Path",
+        default=False,
+        options={'HIDDEN'}
+    )
+    display_curve_chains = bpy.props.BoolProperty(
+        name="Curve Chains Settings",
+        description="Display Settings of Curve Chains",
+        default=False,
+        options={'HIDDEN'}
+    )
+    curve_max_angle = bpy.props.FloatProperty(
+        name="Max Angle",
+        description="Maximum angle the curve may turn within one bone. Straight spans get a single bone",
+        default=math.radians(15.0),
+        min=math.radians(0.5),
+        max=math.radians(90.0),
+        subtype='ANGLE',
+        options={'HIDDEN'}
+    )
     edge_offset = bpy.props.FloatProperty(
         name="Offset",
         description="Offset value",
@@ -135,12 +296,41 @@ class PAT_ToolSettings(bpy.types.PropertyGroup):
         default=True,
         options={'HIDDEN'}
     )
+    weight_mode = bpy.props.EnumProperty(
+        name="Weight Mode",
+        description="How to assign the auto bone weights",
+        items=WEIGHT_MODE_ITEMS,
+        default='SELECTED',
+        options={'HIDDEN'}
+    )
+    weight_bone_count = bpy.props.IntProperty(
+        name="Bones per Vertex",
+        description="Maximum number of nearest bones weighted to each vertex",
+        default=2,
+        min=1,
+        max=8,
+        options={'HIDDEN'}
+    )
+    weight_falloff = bpy.props.FloatProperty(
+        name="Falloff",
+        description="Exponent of the weight falloff by distance to the bone",
+        default=2.0,
+        min=0.0,
+        max=8.0,
+        options={'HIDDEN'}
+    )
     use_auto_increment = bpy.props.BoolProperty(
         name="Auto Increment",
         description="Enable auto increment of start number",
         default=True,
         options={'HIDDEN'}
     )
+    use_modal = bpy.props.BoolProperty(
+        name="Modal",
+        description="Extract the bones over several timer steps, showing progress and allowing Esc to cancel",
+        default=False,
+        options={'HIDDEN'}
+    )
     use_offset = bpy.props.BoolProperty(
         name="Offset",
         description="Enable Bone location offset",
@@ -185,12 +375,83 @@ class PAT_ToolSettings(bpy.types.PropertyGroup):
         min=1,
         options={'HIDDEN'}
     )
+    use_multi_chain = bpy.props.BoolProperty(
+        name="Multiple Chains",
+        description="Create a separate chain for every disconnected path or group of loops",
+        default=False,
+        options={'HIDDEN'}
+    )
+    chain_root = bpy.props.EnumProperty(
+        name="Chain Root",
+        description="Where each chain of edge loops starts",
+        items=CHAIN_ROOT_ITEMS,
+        default='LOWEST',
+        options={'HIDDEN'}
+    )
+    chain_start_number = bpy.props.IntProperty(
+        name="Chain Start Number",
+        description="Starting number of chains in bone names",
+        default=1,
+        min=0,
+        options={'HIDDEN'}
+    )
+    chain_zero_padding = bpy.props.IntProperty(
+        name="Chain Zero-padding",
+        description="Zero-padding of chain digits in bone names",
+        default=2,
+        min=1,
+        options={'HIDDEN'}
+    )
     # is_reverse = bpy.props.BoolProperty(
     #     name="Reverse",
     #     description="Change the bone order to the reverse order",
     #     default=False,
     #     options={'HIDDEN'}
     # )
+    resample_mode = bpy.props.EnumProperty(
+        name="Resample",
+        description="How to resample each chain along its length before creating the bones",
+        items=RESAMPLE_MODE_ITEMS,
+        default='NONE',
+        options={'HIDDEN'}
+    )
+    resample_bone_count = bpy.props.IntProperty(
+        name="Bones per Chain",
+        description="Number of bones in each resampled chain",
+        default=4,
+        min=1,
+        options={'HIDDEN'}
+    )
+    resample_bone_length = bpy.props.FloatProperty(
+        name="Bone Length",
+        description="Target length of the resampled bones",
+        default=0.1,
+        min=0.0001,
+        unit='LENGTH',
+        options={'HIDDEN'}
+    )
+    simplify_tolerance = bpy.props.FloatProperty(
+        name="Tolerance",
+        description="Maximum distance of a removed joint from the simplified chain",
+        default=0.01,
+        min=0.0,
+        unit='LENGTH',
+        options={'HIDDEN'}
+    )
+    use_x_mirror = bpy.props.BoolProperty(
+        name="X-Mirror",
+        description="Also create the chains mirrored across the local X axis, named with .L and .R",
+        default=False,
+        options={'HIDDEN'}
+    )
+    mirror_tolerance = bpy.props.FloatProperty(
+        name="Mirror Tolerance",
+        description="Maximum distance of a vertex from the mirrored position of its counterpart",
+        default=0.001,
+        min=0.0,
+        unit='LENGTH',
+        options={'HIDDEN'}
+    )
     is_parent = bpy.props.BoolProperty(
         name="Parent",
         description="Set the previously created bone as the parent",
@@ -203,21 +464,58 @@ class PAT_ToolSettings(bpy.types.PropertyGroup):
         default=True,
         options={'HIDDEN'}
     )
+    loop_center_mode = bpy.props.EnumProperty(
+        name="Loop Center",
+        description="How to calculate the center of each edge loop",
+        items=LOOP_CENTER_MODE_ITEMS,
+        default='MEDIAN',
+        options={'HIDDEN'}
+    )
+    loop_selection_mode = bpy.props.EnumProperty(
+        name="Loop Selection",
+        description="How the edge loops to create the bones from are selected",
+        items=LOOP_SELECTION_MODE_ITEMS,
+        default='HISTORY',
+        options={'HIDDEN'}
+    )
+    loop_stride = bpy.props.IntProperty(
+        name="Stride",
+        description="Create a joint at every n-th loop of the edge ring. The end loops are always used",
+        default=1,
+        min=1,
+        options={'HIDDEN'}
+    )
+    edge_order_mode = bpy.props.EnumProperty(
+        name="Edge Order",
+        description="How to order the selected edges",
+        items=EDGE_ORDER_MODE_ITEMS,
+        default='HISTORY',
+        options={'HIDDEN'}
+    )
 
 
 @make_annotations
 class PAT_OT_Base:
-    use_offset = bpy.props.BoolProperty(
-        name="Offset",
-        description="Enable Bone location offset",
-        default=False,
+    # ボーンのトポロジーに影響する、キャッシュのキーに含めるプロパティの名前
+    topology_options = ()
+    # 作成するボーンデータが一つも無いときのメッセージ
+    no_bones_message = "No bones were found"
+    # モーダルで実行するとき、1回のタイマーイベントで処理する時間(秒)
+    MODAL_TIME_STEP = 0.05
+    # メッシュからボーンを作成し、ウェイト、オフセット、X軸ミラーとモーダルでの実行を使うかどうか
+    # 使うオペレーターはPAT_OT_MeshBaseを継承し、そちらで設定のプロパティも定義します
+    uses_mesh = False
+
+    target_armature = bpy.props.StringProperty(
+        name="Target Armature",
+        description="Existing armature to add the created bones to",
+        default="",
         options={'HIDDEN'}
     )
-    offset = bpy.props.FloatProperty(
-        name="Offset",
-        description="Offset value",
-        default=0.0,
-        unit='LENGTH',
+    target_bone = bpy.props.StringProperty(
+        name="Target Bone",
+        description="Bone of the target armature to parent the created bones to",
+        default="",
         options={'HIDDEN'}
     )
     use_auto_bone_roll = bpy.props.BoolProperty(
@@ -226,10 +524,40 @@ class PAT_OT_Base:
         default=True,
         options={'HIDDEN'}
     )
-    use_auto_bone_weight = bpy.props.BoolProperty(
-        name="Auto Bone Weight",
-        description="Enable Auto bone weights",
-        default=True,
+    use_multi_chain = bpy.props.BoolProperty(
+        name="Multiple Chains",
+        description="Create a separate chain for every disconnected path or group of loops",
+        default=False,
+        options={'HIDDEN'}
+    )
+    resample_mode = bpy.props.EnumProperty(
+        name="Resample",
+        description="How to resample each chain along its length before creating the bones",
+        items=RESAMPLE_MODE_ITEMS,
+        default='NONE',
+        options={'HIDDEN'}
+    )
+    resample_bone_count = bpy.props.IntProperty(
+        name="Bones per Chain",
+        description="Number of bones in each resampled chain",
+        default=4,
+        min=1,
+        options={'HIDDEN'}
+    )
+    resample_bone_length = bpy.props.FloatProperty(
+        name="Bone Length",
+        description="Target length of the resampled bones",
+        default=0.1,
+        min=0.0001,
+        unit='LENGTH',
+        options={'HIDDEN'}
+    )
+    simplify_tolerance = bpy.props.FloatProperty(
+        name="Tolerance",
+        description="Maximum distance of a removed joint from the simplified chain",
+        default=0.01,
+        min=0.0,
+        unit='LENGTH',
         options={'HIDDEN'}
     )
     is_parent = bpy.props.BoolProperty(
@@ -244,6 +572,12 @@ class PAT_OT_Base:
         default=True,
         options={'HIDDEN'}
     )
+    redo_session = bpy.props.IntProperty(
+        name="Redo Session",
+        description="Number of the run started by invoke, used to tell a redo from a new run",
+        default=0,
+        options={'HIDDEN', 'SKIP_SAVE'}
+    )
 
     def _get_distance(self, vector0, vector1):
         distance = math.sqrt((vector0[0] - vector1[0]) ** 2 +
@@ -255,8 +589,14 @@ class PAT_OT_Base:
         self.pat_tool_settings = None
         self.mesh_object = None
         self.matrix_world = None
-        self.new_bones = []
+        self.new_bones = pat_bone_spec.BoneChainSpec()
         self.new_bone_names = []
+        self.profiler = pat_profiler.OperatorProfiler()
+        self._steps = None
+        self._timer = None
+        self._selection_state = None
+        self._extract_time = 0.0
+        self._is_redo = False
 
     @classmethod
     def poll(cls, context):
@@ -268,371 +608,1459 @@ class PAT_OT_Base:
         return False
 
     def invoke(self, context, event):
+        # 新しく実行するときは、前回の結果をリドゥ以外で使わないように破棄する
+        self.redo_session = pat_cache.start_redo_session()
+        self._setup(context)
+
+    def _setup(self, context):
         self.pat_tool_settings = context.scene.PAT_ToolSettings  # type: PAT_ToolSettings
+        self.profiler = pat_profiler.get_profiler(context, self.bl_idname)
+        self.profiler.start()
+        self._setup_source(context)
+
+    def _setup_source(self, context):
+        """
+        ボーンを作成する元のオブジェクトと、その座標を変換する行列を設定します
+        """
+
         self.mesh_object = context.active_object
-        self.mesh_object.update_from_editmode()
+        with self.profiler.guard(), self.profiler.phase("update_from_editmode"):
+            self.mesh_object.update_from_editmode()
         self.matrix_world = self.mesh_object.matrix_world
 
-    def execute(self, context):
-        bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-        bpy.ops.object.add(type='ARMATURE', enter_editmode=True)
-
-        armature_object = context.active_object  # type: bpy.types.Object
-        armature_object.name = 'PAT_Armature'
-        armature_object.matrix_world = self.matrix_world
-        armature_object.data.name = 'PAT_Armature'
-
-        create_bones = []
-        create_bones_append = create_bones.append
-        parentBone = None
-        normals = mathutils.Vector((0, 0, 0))
-        for i, (bone_name, new_bone) in enumerate(zip(self.new_bone_names, self.new_bones)):
-            bone = armature_object.data.edit_bones.new(bone_name)  # type: bpy.types.EditBone
-            bone.head = new_bone['head']
-            bone.tail = new_bone['tail']
-
-            if self.use_auto_bone_roll:
-                bone.align_roll(new_bone['normal'])
-                bone.roll = math.radians(round(math.degrees(bone.roll), 0))
-
-            create_bones_append(bone)
-
-            if self.use_auto_bone_weight:
-                try:
-                    vertex_groups = self.mesh_object.vertex_groups[bone_name]
-                    self.report({'ERROR'}, "The vertex group has already been created")
-                except KeyError:
-                    vertex_groups = self.mesh_object.vertex_groups.new(name=bone_name)
-
-                vertex_groups.add(new_bone['indexes'], 1.0, 'ADD')
-
-            if self.use_offset:
-                normals += new_bone['normal']
-
-            if self.is_parent:
-                if parentBone:
-                    bone.parent = parentBone
-                    bone.use_connect = self.use_connect
-                parentBone = bone
+    def _get_root_score_function(self, context, mode):
+        """
+        チェーンの根元を決めるためのスコアを返す関数を作成します。スコアが小さいほど根元になります
+        :param mode: 'CURSOR'は3Dカーソルに近い位置、'LOWEST'はワールド座標で低い位置
+        :type mode: str
+        :return: メッシュのローカル座標を受け取り、スコアを返す関数
+        :rtype: (mathutils.Vector) -> float
+        """
+
+        matrix = self.matrix_world
+        if mode == 'CURSOR':
+            cursor_location = context.scene.cursor_location if bpy.app.version < (2, 80) \
+                else context.scene.cursor.location
+            root_location = mul_matrix(matrix.inverted(), cursor_location)
+            return lambda co: (co - root_location).length
+        return lambda co: mul_matrix(matrix, co).z
 
-        for bone in create_bones:
-            bone.select = True
+    def _get_new_bones(self, context):
+        """
+        ボーンのトポロジーを求め、現在の頂点座標からボーンデータを作成します
+        トポロジーのキャッシュが有効な場合、同じトポロジーと選択のメッシュでは辺をたどる処理を省きます
+        :rtype: pat_bone_spec.BoneChainSpec | None
+        """
+
+        return run_steps(self._iter_new_bones(context))
+
+    def _iter_new_bones(self, context):
+        """
+        _get_new_bonesを少しずつ進めるジェネレーター。進み具合を0から1の値で返します
+        終了したときのStopIterationの値がボーンデータになります
+        """
+
+        # 大きなメッシュでは指紋の計算にも時間がかかるため、先に一度制御を返す
+        yield 0.0
+        mesh = self.mesh_object.data
+        fingerprint = pat_cache.get_topology_fingerprint(len(mesh.vertices), pat_geometry.get_edge_vertices(mesh))
+        key = pat_cache.get_cache_key(fingerprint, self.bl_idname, self._get_selection_arrays(),
+                                      self._get_topology_options(context))
+
+        # リドゥでは同じメッシュと選択で呼ばれるため、まずメモリのキャッシュを探す
+        cache = pat_cache.get_topology_cache(context)
+        topology = pat_cache.redo_cache.get(key) if self._is_redo else None
+        source = "redo"
+        if topology is None and cache:
+            topology = cache.get(key)
+            source = "hit"
+        if topology is None:
+            source = "miss"
+        self.profiler.extra["topology_cache"] = source
+
+        if topology is None:
+            topology = yield from self._iter_bone_topology(context)
+            if not topology:
+                return None
+            if cache:
+                error = cache.put(key, topology)
+                if error:
+                    self.report({'WARNING'}, error)
+        pat_cache.redo_cache.put(key, topology)
+
+        return self._get_bones_from_topology(topology)
+
+    def _get_selection_arrays(self):
+        """
+        キャッシュのキーに使う、選択した辺のインデックスと選択履歴の順の辺のインデックスを返します
+        :rtype: list[numpy.ndarray]
+        """
 
-        if self.use_offset:
-            normal = (normals / len(self.new_bones)).normalized()
-            normal = normal * self.offset
-            for bone in create_bones:
-                if bone.use_connect:
-                    bone.tail += normal
-                else:
-                    bone.translate(normal)
+        bm = bmesh.from_edit_mesh(self.mesh_object.data)
+        history = [e.index for e in bm.select_history if isinstance(e, bmesh.types.BMEdge)]
+        return [np.flatnonzero(pat_geometry.get_edge_selection(self.mesh_object.data)), np.array(history)]
+
+    def _get_topology_options(self, context):
+        options = [getattr(self, name) for name in self.topology_options]
+        # 3Dカーソルを根元にする場合は、カーソルの位置でも並び順が変わる
+        if 'CURSOR' in options:
+            cursor_location = context.scene.cursor_location if bpy.app.version < (2, 80) \
+                else context.scene.cursor.location
+            options.append(tuple(round(value, 6) for value in cursor_location))
+        # 根元や経路を頂点座標から決める場合は、形状とオブジェクトの位置が違うと結果も変わる
+        if self._topology_uses_positions():
+            options.append(pat_cache.get_geometry_fingerprint(
+                pat_geometry.get_vertex_coordinates(self.mesh_object.data), self.matrix_world))
+        return options
+
+    def _topology_uses_positions(self):
+        """
+        トポロジーを求めるときに頂点座標を使うかどうかを返します。座標を使わないオペレーターで上書きします
+        :rtype: bool
+        """
 
-        bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+        return True
 
-        if not self.use_auto_bone_roll:
-            bpy.ops.object.mode_set(mode='EDIT', toggle=False)
-            bpy.ops.armature.roll_clear(roll=0)
-
-        if self.use_auto_bone_weight:
-            bpy.ops.object.mode_set(mode='POSE', toggle=False)
-            if hasattr(context, "view_layer"):
-                armature_object.select_set(True)
-                context.view_layer.objects.active = self.mesh_object
-                context.view_layer.objects.active.select_set(True)
-            else:
-                armature_object.select = True
-                context.scene.objects.active = self.mesh_object
-                context.scene.objects.active.select = True
+    def _get_bone_topology(self, context):
+        """
+        選択からボーンのトポロジーを求めます。オペレーターごとに上書きします
+        :return: ボーンを作成できない場合はNone
+        :rtype: pat_bone_spec.BoneChainTopology | None
+        """
 
-            try:
-                modifiers = self.mesh_object.modifiers['PAT_Armature']
-            except KeyError:
-                modifiers = self.mesh_object.modifiers.new(name='PAT_Armature', type='ARMATURE')
-            modifiers.object = armature_object
-
-            bpy.ops.object.mode_set(mode='WEIGHT_PAINT', toggle=False)
-            bpy.ops.object.vertex_group_normalize_all(group_select_mode='BONE_SELECT', lock_active=False)
-
-        # if self.pat_tool_settings.target_armature:
-        #     # print(pat_tool_settings.target_armature)
-        #     if hasattr(context, "view_layer"):
-        #         context.view_layer.objects.active = self.pat_tool_settings.target_armature
-        #         context.view_layer.objects.active.select_set(True)
-        #     else:
-        #         context.scene.objects.active = self.pat_tool_settings.target_armature
-        #         context.scene.objects.active.select = True
-        #     bpy.ops.object.join()
-        #     self.active.modifiers["Armature"].object = self.pat_tool_settings.target_armature
-        #     bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-
-        bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-
-        armature_object.data.show_names = True
-        if bpy.app.version < (2, 80):
-            armature_object.show_x_ray = True
-        else:
-            armature_object.show_in_front = True
+        return None
 
+    def _iter_bone_topology(self, context):
+        """
+        _get_bone_topologyを少しずつ進めるジェネレーター。分割して処理できるオペレーターで上書きします
+        """
 
-@make_annotations
-class PAT_OT_SelectedEdgeOrder(PAT_OT_Base, bpy.types.Operator):
-    bl_idname = "armature.pat_selected_edge_order"
-    bl_label = "Create Bone:Selected Edge Order"
-    bl_description = "Creates bones from selected edge order"
-    bl_options = {'REGISTER', 'UNDO'}
+        topology = self._get_bone_topology(context)
+        yield 1.0
+        return topology
 
-    def _get_new_bones(self, context):
-        return self._get_select_edge_location(context)
+    def _get_bones_from_topology(self, topology):
+        """
+        ボーンのトポロジーと現在の頂点座標から、ボーンデータを作成します。オペレーターごとに上書きします
+        :type topology: pat_bone_spec.BoneChainTopology
+        :rtype: pat_bone_spec.BoneChainSpec
+        """
+
+        return pat_bone_spec.BoneChainSpec()
 
     def _get_new_bone_names(self):
         length = len(self.new_bones)
-        if length > 0:
-            return [create_name(self.pat_tool_settings.bone_name_base, self.pat_tool_settings.bone_name_junction,
-                                self.pat_tool_settings.bone_name_prefix, self.pat_tool_settings.bone_name_suffix,
-                                self.pat_tool_settings.start_number, i, self.pat_tool_settings.zero_padding)
+        if length == 0:
+            return ['']
+
+        settings = self.pat_tool_settings
+        if not self.use_multi_chain:
+            return [create_name(settings.bone_name_base, settings.bone_name_junction,
+                                settings.bone_name_prefix, settings.bone_name_suffix,
+                                settings.start_number, i, settings.zero_padding)
                     for i in range(length)]
+
+        # チェーンごとに番号を付け、ボーンの番号はチェーンごとに開始番号から数える
+        names = []
+        chain_count = -1
+        count = 0
+        for is_chain_root in self.new_bones.chain_starts.tolist():
+            if is_chain_root:
+                chain_count += 1
+                count = 0
+            base_name = create_chain_name(settings.bone_name_base, settings.bone_name_junction,
+                                          settings.chain_start_number, chain_count, settings.chain_zero_padding)
+            names.append(create_name(base_name, settings.bone_name_junction,
+                                     settings.bone_name_prefix, settings.bone_name_suffix,
+                                     settings.start_number, count, settings.zero_padding))
+            count += 1
+        return names
+
+    def _get_chain_count(self):
+        return self.new_bones.chain_count
+
+    def _increment_start_number(self):
+        """
+        自動インクリメントが有効なとき、次に作成するボーンの開始番号を進めます
+        複数チェーンの場合はチェーンの開始番号を進めます
+        """
+
+        if not self.pat_tool_settings.use_auto_increment:
+            return
+        if self.use_multi_chain:
+            self.pat_tool_settings.chain_start_number += self._get_chain_count()
         else:
-            return ['']
+            self.pat_tool_settings.start_number += len(self.new_bones)
 
-    def _get_select_edge_location(self, context):
-        bm = bmesh.new()
-        bm = bmesh.from_edit_mesh(self.mesh_object.data)
-        if bpy.app.version[0] >= 2 and bpy.app.version[1] >= 73:
-            bm.verts.ensure_lookup_table()
-            bm.edges.ensure_lookup_table()
-            bm.faces.ensure_lookup_table()
+    def _resample_bones(self):
+        """
+        リサンプルが有効なとき、チェーンごとにボーンを等間隔に分割し直すか、まっすぐな部分のボーンをまとめます
+        """
 
-        selected_edges = []
-        new_bones = []
-        head = None
-        tail = None
+        if not self.new_bones or self.resample_mode == 'NONE':
+            return
+        with self.profiler.phase("resample"):
+            if self.resample_mode == 'SIMPLIFY':
+                bone_count = len(self.new_bones)
+                self.new_bones = pat_bone_spec.simplify_bone_chains(self.new_bones, self.simplify_tolerance)
+                self.report({'INFO'}, "Simplification removed {} bones".format(bone_count - len(self.new_bones)))
+            elif self.resample_mode == 'LENGTH':
+                self.new_bones = pat_bone_spec.resample_bone_chains(self.new_bones,
+                                                                    bone_length=self.resample_bone_length)
+            else:
+                self.new_bones = pat_bone_spec.resample_bone_chains(self.new_bones,
+                                                                    bone_count=self.resample_bone_count)
 
-        for i, e in enumerate(bm.select_history):  # type: (int, bmesh.types.BMEdge)
-            if isinstance(e, bmesh.types.BMEdge) and e.select:
-                selected_edges.append(e)
-                v0 = e.verts[0]
-                v1 = e.verts[1]
-                if head:
-                    if self._get_distance(head.co, v0.co) > self._get_distance(head.co, v1.co):
-                        v0, v1 = v1, v0
-                    if not self.use_connect:
-                        head = v0
-                    tail = v1
-                else:
-                    if len(bm.select_history) > 1:
-                        v2 = bm.select_history[i + 1].verts[0]
-                        v3 = bm.select_history[i + 1].verts[1]
+    def _cancel(self, message):
+        self.report({'ERROR'}, message)
+        self._stop_profiler()
+        return {'FINISHED'}
 
-                        if self._get_distance(v0.co, v2.co) < self._get_distance(v1.co, v2.co):
-                            v0, v1 = v1, v0
-                    head = v0
-                    tail = v1
+    def _stop_profiler(self):
+        """
+        計測を終了し、ログを書き込めなかった場合は警告を表示します
+        """
 
-                normal = (head.normal + tail.normal) / 2
-                new_bones.append({"indexes": (copy.copy(head.index), copy.copy(tail.index)), "head": copy.copy(head.co),
-                                  "tail": copy.copy(tail.co), "normal": copy.copy(normal.normalized())})
-                head = tail
+        self.profiler.stop()
+        if self.profiler.log_error:
+            self.report({'WARNING'}, self.profiler.log_error)
 
-        for edge in selected_edges:
-            edge.select = True
-        self.mesh_object.update_from_editmode()
+    def _extract(self, context):
+        """
+        ボーンデータを抽出してボーンを作成します
+        モーダルが有効な場合は、タイマーイベントごとに少しずつ抽出するモーダル処理を開始します
+        """
 
-        return new_bones
+        if self.uses_mesh and self.use_modal:
+            return self._start_modal(context)
+        return self._extract_and_create(context)
 
-    def __init__(self):
-        super(PAT_OT_SelectedEdgeOrder, self).__init__()
+    def _extract_and_create(self, context):
+        """
+        ボーンデータを一度に抽出してボーンを作成します。例外で終了した場合も計測は終了します
+        """
 
-    def invoke(self, context, event):
-        super(PAT_OT_SelectedEdgeOrder, self).invoke(context, event)
+        with self.profiler.guard():
+            with self.profiler.phase("extract"):
+                self.new_bones = self._get_new_bones(context)
+            return self._create_bones(context)
 
-        # 辺が一つも無い場合は終了
-        if len(self.mesh_object.data.edges) < 1:
-            self.report({'ERROR'}, "This mesh does not have edges")
-            return {'FINISHED'}
+    def _create_bones(self, context):
+        """
+        抽出したボーンデータを確認して名前を決め、ボーンを作成します
+        """
 
-        self.new_bones = self._get_new_bones(context)
+        self._resample_bones()
 
         # 作成するボーンデータが一つも無い場合は終了
         if not self.new_bones:
-            self.report({'ERROR'}, "Select at least one edge")
-            return {'FINISHED'}
+            return self._cancel(self.no_bones_message)
 
         self.new_bone_names = self._get_new_bone_names()
 
-        # 開始番号にボーンの数を足す
-        if self.pat_tool_settings.use_auto_increment:
-            self.pat_tool_settings.start_number += len(self.new_bones)
+        # 開始番号にボーンまたはチェーンの数を足す
+        self._increment_start_number()
+
+        # 鏡映したチェーンは元のチェーンと同じ番号の名前にするため、名前を決めてから加える
+        if self.uses_mesh and self.use_x_mirror:
+            self._mirror_bones()
 
         # ボーンネームが空の場合は終了
         for bone_name in self.new_bone_names:
             if bone_name == '':
-                self.report({'ERROR'}, "No blank names are allowed")
-                return {'FINISHED'}
+                return self._cancel("No blank names are allowed")
 
         # オートウェイトが有効で、作成するボーンと同名の頂点グループがある場合は終了
-        if self.use_auto_bone_weight:
+        if self.uses_mesh and self.use_auto_bone_weight:
             for vg in self.mesh_object.vertex_groups:  # type: bpy.types.VertexGroup
                 if vg.name in self.new_bone_names:
-                    self.report({'ERROR'}, "The vertex group has already been created")
-                    return {'FINISHED'}
+                    return self._cancel("The vertex group has already been created")
 
-        return self.execute(context)
-
-    def execute(self, context):
-        super(PAT_OT_SelectedEdgeOrder, self).execute(context)
+        self._build_bones(context)
         return {'FINISHED'}
 
-
-@make_annotations
-class PAT_OT_MidpointOfSelectedEdgeLoopOder(PAT_OT_Base, bpy.types.Operator):
-    bl_idname = "armature.pat_midpoint_of_selected_edge_loop_order"
-    bl_label = "Create Bone:Midpoint of selected Edge Loop Oder"
-    bl_description = "Creates bones at the midpoint of selected edge loop order"
-    bl_options = {'REGISTER', 'UNDO'}
-
-    def _get_new_bones(self, context):
-        return self._get_select_edge_loops_location(context)
-
-    def _get_new_bone_names(self):
-        length = len(self.new_bones)
-        if length > 0:
-            return [create_name(self.pat_tool_settings.bone_name_base, self.pat_tool_settings.bone_name_junction,
-                                self.pat_tool_settings.bone_name_prefix, self.pat_tool_settings.bone_name_suffix,
-                                self.pat_tool_settings.start_number, i, self.pat_tool_settings.zero_padding)
-                    for i in range(length)]
+    def _mirror_bones(self):
+        """
+        片側のチェーンをX軸の反対側へ鏡映したチェーンを加え、両側のボーンの名前に.Lと.Rを付けます
+        中心線上にあるチェーンや、中心線をまたぐチェーンは鏡映せず、名前も変えません
+        """
+
+        new_bones = self.new_bones
+        with self.profiler.phase("mirror"):
+            tolerance = self.mirror_tolerance
+            chain_starts = np.flatnonzero(new_bones.chain_starts)
+            min_x = np.minimum.reduceat(np.minimum(new_bones.heads[:, 0], new_bones.tails[:, 0]), chain_starts)
+            max_x = np.maximum.reduceat(np.maximum(new_bones.heads[:, 0], new_bones.tails[:, 0]), chain_starts)
+            is_left = min_x >= -tolerance
+            is_right = max_x <= tolerance
+            is_side = is_left != is_right
+            chains = new_bones.chains[chain_starts[is_side]]
+
+            # 鏡映するチェーンの頂点だけ、KDツリーで反対側の頂点を探す
+            vertices = new_bones.indexes[np.isin(np.repeat(new_bones.chains, np.diff(new_bones.index_offsets)),
+                                                 chains)]
+            if new_bones.stencils is not None:
+                stencil_bones = np.repeat(np.arange(len(new_bones)), 2)
+                row_lengths = np.diff(new_bones.stencils[0])
+                stencil_chains = np.repeat(new_bones.chains[stencil_bones], row_lengths)
+                vertices = np.concatenate((vertices, new_bones.stencils[1][np.isin(stencil_chains, chains)]))
+            vertices = np.unique(vertices)
+
+            mesh = self.mesh_object.data
+            mirror_map = pat_mirror.get_mirror_map(mesh)
+            mirror_vertices, distances = mirror_map.get_mirror_vertices(vertices)
+            # 許容値の中に対応する頂点が無い場合も、最も近い頂点を使ってボーンは作成する
+            vertex_map = np.arange(len(mesh.vertices), dtype=np.int64)
+            vertex_map[vertices] = mirror_vertices
+            asymmetric_count = int(np.count_nonzero(distances > tolerance))
+
+            self.new_bones, source_bones = pat_bone_spec.mirror_bone_chains(new_bones, chains, vertex_map)
+
+        if asymmetric_count:
+            self.report({'WARNING'}, "{} vertices have no mirrored vertex within the tolerance".format(
+                asymmetric_count))
+
+        # 元のチェーンの名前に側を付け、鏡映したボーンには反対側の名前を付ける
+        chain_sides = np.where(is_side, np.where(is_left, 'L', 'R'), '')
+        bone_sides = chain_sides[np.cumsum(new_bones.chain_starts) - 1].tolist()
+        names = [pat_mirror.get_mirror_name(name, side) for name, side in zip(self.new_bone_names, bone_sides)]
+        opposite = {'L': 'R', 'R': 'L'}
+        names += [pat_mirror.get_mirror_name(self.new_bone_names[bone], opposite[bone_sides[bone]])
+                  for bone in source_bones.tolist()]
+        self.new_bone_names = names
+
+    def _start_modal(self, context):
+        """
+        抽出のジェネレーターをタイマーイベントごとに進め、ウィンドウマネージャーに進み具合を表示します
+        """
+
+        # ジェネレーターは後のタイマーイベントでも進めるため、invokeのコンテキストではなく、
+        # その時点のコンテキストを参照するbpy.contextを渡す
+        self._steps = self._iter_new_bones(bpy.context)
+        self._selection_state = self._get_selection_state()
+        self._extract_time = 0.0
+
+        window_manager = context.window_manager
+        self._timer = window_manager.event_timer_add(0.01, window=context.window)
+        window_manager.progress_begin(0, 100)
+        window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def _stop_modal(self, context):
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self._timer)
+        window_manager.progress_end()
+        self._timer = None
+        self._steps = None
+        self.profiler.record("extract", self._extract_time)
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._stop_modal(context)
+            self._restore_selection_state(self._selection_state)
+            self._stop_profiler()
+            self.report({'INFO'}, "Bone creation was cancelled")
+            return {'CANCELLED'}
+
+        # 視点の操作だけを通し、抽出が終わるまでメッシュを変更する操作は受け付けない
+        if event.type in {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'TRACKPADPAN', 'TRACKPADZOOM'}:
+            return {'PASS_THROUGH'}
+        if event.type != 'TIMER':
+            return {'RUNNING_MODAL'}
+
+        # ボーンの作成は、抽出が全て終わってから1回だけ行う
+        start = time.perf_counter()
+        progress = 0.0
+        try:
+            while time.perf_counter() - start < self.MODAL_TIME_STEP:
+                progress = next(self._steps)
+        except StopIteration as e:
+            self._extract_time += time.perf_counter() - start
+            self._stop_modal(context)
+            self.new_bones = e.value
+            with self.profiler.guard():
+                return self._create_bones(context)
+        except Exception:
+            self._stop_modal(context)
+            self.profiler.stop()
+            raise
+
+        self._extract_time += time.perf_counter() - start
+        context.window_manager.progress_update(int(progress * 100))
+        return {'RUNNING_MODAL'}
+
+    def _get_selection_state(self):
+        """
+        キャンセルしたときに元に戻すため、頂点、辺と面の選択と選択履歴を保存します
+        invokeでupdate_from_editmodeを呼んだ後のメッシュから読み込みます
+        """
+
+        mesh = self.mesh_object.data
+        bm = bmesh.from_edit_mesh(mesh)
+        history = []
+        for element in bm.select_history:
+            if isinstance(element, bmesh.types.BMVert):
+                history.append(('VERT', element.index))
+            elif isinstance(element, bmesh.types.BMEdge):
+                history.append(('EDGE', element.index))
+            else:
+                history.append(('FACE', element.index))
+        return (pat_geometry.get_vertex_selection(mesh), pat_geometry.get_edge_selection(mesh),
+                pat_geometry.get_face_selection(mesh), history)
+
+    def _restore_selection_state(self, state):
+        vert_selection, edge_selection, face_selection, history = state
+        mesh = self.mesh_object.data
+        bm = bmesh.from_edit_mesh(mesh)
+        elements = {'VERT': bm.verts, 'EDGE': bm.edges, 'FACE': bm.faces}
+        for element_type, selection in (('VERT', vert_selection), ('EDGE', edge_selection),
+                                        ('FACE', face_selection)):
+            sequence = elements[element_type]
+            if hasattr(sequence, "ensure_lookup_table"):
+                sequence.ensure_lookup_table()
+            for element, selected in zip(sequence, selection.tolist()):
+                element.select = selected
+
+        bm.select_history.clear()
+        for element_type, index in history:
+            bm.select_history.add(elements[element_type][index])
+        bmesh.update_edit_mesh(mesh)
+
+    def _write_bone_weights(self):
+        """
+        全てのボーンのウェイトを表にまとめて正規化し、頂点グループへ一度に書き込みます
+        """
+
+        if self.weight_mode == 'NEAREST':
+            coords = pat_geometry.get_vertex_coordinates(self.mesh_object.data)
+            bone_ids, vertex_indices, weights = pat_geometry.get_nearest_bone_weights(
+                coords, self.new_bones.heads, self.new_bones.tails, self.weight_bone_count, self.weight_falloff)
         else:
-            return ['']
-
-    def _get_select_edge_loops_location(self, context):
-        bm = bmesh.new()
-        bm = bmesh.from_edit_mesh(self.mesh_object.data)
-        if bpy.app.version[0] >= 2 and bpy.app.version[1] >= 73:
-            bm.verts.ensure_lookup_table()
-            bm.edges.ensure_lookup_table()
-            bm.faces.ensure_lookup_table()
-
-        current_cursor = copy.copy(context.scene.cursor_location) if bpy.app.version < (2, 80) \
-            else copy.copy(context.scene.cursor.location)
-
-        select_history = []
-        select_history_append = select_history.append
-        for history_edge in bm.select_history:
-            if isinstance(history_edge, bmesh.types.BMEdge):
-                select_history_append(history_edge)
+            bone_ids, vertex_indices, weights = self.new_bones.get_weight_pairs()
 
-        # 選択した辺が2つ以上無い場合は終了
-        if len(select_history) < 2:
-            return
-
-        bpy.ops.mesh.select_all(action='DESELECT')
-        self.mesh_object.update_from_editmode()
+        bone_ids, vertex_indices, weights = pat_geometry.normalize_weights(bone_ids, vertex_indices, weights)
 
-        # ローカルビューが有効になっている場合、一時的に解除
-        current_local = False
-        if context.space_data.local_view:
-            # Disable local view
-            bpy.ops.view3d.localview()
-            current_local = True
-
-        selected_edges = []
-        new_bones = []
-        head = None
-        tail = None
-        head_indexes = []
-        tail_indexes = []
+        vertex_groups = []
+        for bone_name in self.new_bone_names:
+            try:
+                vertex_group = self.mesh_object.vertex_groups[bone_name]
+                self.report({'ERROR'}, "The vertex group has already been created")
+            except KeyError:
+                vertex_group = self.mesh_object.vertex_groups.new(name=bone_name)
+            vertex_groups.append(vertex_group)
+
+        pat_geometry.write_vertex_group_weights(vertex_groups, bone_ids, vertex_indices, weights)
+
+    def _get_offset(self):
+        """
+        ボーンの法線の平均の向きへ、全てのボーンをずらす量をメッシュの座標で返します
+        :rtype: numpy.ndarray
+        """
+
+        offset = np.zeros(3)
+        if self.uses_mesh and self.use_offset and self.new_bones.normals is not None:
+            normal = self.new_bones.normals.mean(axis=0)
+            length = np.linalg.norm(normal)
+            if length > 0.0:
+                offset = normal / length * self.offset
+        return offset
+
+    def _get_bone_locations(self, armature_object=None):
+        """
+        ボーンのヘッド、テールとロールの基準となるベクトルを、アーマチュアの座標で計算します
+        新しいアーマチュアはワールド座標で作成するため、transform_applyは必要ありません
+        :param armature_object: ボーンを追加する既存のアーマチュア。Noneの場合はワールド座標で計算します
+        :type armature_object: bpy.types.Object | None
+        :return: (ボーンの数, 3)のヘッド、テールの配列と、ロールの基準ベクトルの配列。ロールを自動で設定しない場合はNone
+        :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray | None)
+        """
+
+        matrix = self.matrix_world
+        if armature_object:
+            matrix = mul_matrix(armature_object.matrix_world.inverted(), matrix)
+        matrix = np.array(matrix, dtype=np.float64)
+        matrix3 = matrix[:3, :3]
+
+        new_bones = self.new_bones
+        offset = self._get_offset()
+
+        # 全てのボーンの座標をまとめて変換する
+        heads = (new_bones.heads + offset).dot(matrix3.T) + matrix[:3, 3]
+        tails = (new_bones.tails + offset).dot(matrix3.T) + matrix[:3, 3]
+        align_vectors = None
+        if self.use_auto_bone_roll and new_bones.roll_vectors is not None:
+            align_vectors = new_bones.roll_vectors.dot(matrix3.T)
+        elif self.use_auto_bone_roll and new_bones.normals is not None:
+            # 法線は逆行列の転置で変換し、拡大縮小が軸ごとに異なる場合も面に垂直なままにする
+            align_vectors = new_bones.normals.dot(np.linalg.inv(matrix3))
+        return heads, tails, align_vectors
+
+    def _create_armature_object(self, context):
+        """
+        オペレーターを使わずに、アーマチュアのデータとオブジェクトを作成します
+        :rtype: bpy.types.Object
+        """
+
+        armature = bpy.data.armatures.new('PAT_Armature')
+        armature_object = bpy.data.objects.new('PAT_Armature', armature)
+        if hasattr(context, "view_layer"):
+            collection = context.collection or context.scene.collection
+            collection.objects.link(armature_object)
+        else:
+            context.scene.objects.link(armature_object)
 
-        mwi = self.matrix_world.inverted()
-        for i, e in enumerate(select_history):
-            e.select = True
-            bpy.ops.mesh.loop_multi_select(ring=False)
-            self.mesh_object.update_from_editmode()
+        armature.show_names = True
+        if bpy.app.version < (2, 80):
+            armature_object.show_x_ray = True
+        else:
+            armature_object.show_in_front = True
+        return armature_object
+
+    def _get_target_armature(self):
+        """
+        ボーンを追加する既存のアーマチュアを返します
+        :rtype: bpy.types.Object | None
+        """
+
+        if not self.target_armature:
+            return None
+        target = bpy.data.objects.get(self.target_armature)
+        if target is None or target.type != 'ARMATURE':
+            return None
+        return target
+
+    def _get_armature_modifier(self, armature_object, is_target):
+        """
+        メッシュのアーマチュアモディファイアーを返します
+        既存のアーマチュアに追加する場合は、そのアーマチュアを使うモディファイアーを再利用します
+        :rtype: bpy.types.ArmatureModifier
+        """
+
+        if is_target:
+            for modifier in self.mesh_object.modifiers:
+                if modifier.type == 'ARMATURE' and modifier.object == armature_object:
+                    return modifier
+            return self.mesh_object.modifiers.new(name='PAT_Armature', type='ARMATURE')
+
+        try:
+            return self.mesh_object.modifiers['PAT_Armature']
+        except KeyError:
+            return self.mesh_object.modifiers.new(name='PAT_Armature', type='ARMATURE')
 
-            # すでに選択した辺と同じ辺のときは終了
-            if e in selected_edges:
-                return
+    def execute(self, context):
+        # リドゥパネルで設定を変えると、invokeを通らずに新しいインスタンスのexecuteが呼ばれる
+        # トポロジーはリドゥのキャッシュから取り出し、頂点座標からボーンを作成する処理だけをやり直す
+        # スクリプトからinvokeを通さずに呼ばれた場合は、直前の実行の番号を持たないためリドゥとして扱わない
+        if self.pat_tool_settings is None:
+            self._is_redo = pat_cache.is_redo_session(self.redo_session)
+            self._setup(context)
+            return self._extract_and_create(context)
+
+        self._build_bones(context)
+        return {'FINISHED'}
 
-            select_loop_edges = [s_e for s_e in bm.edges if s_e.select]
-            selected_edges += select_loop_edges
+    def _build_bones(self, context):
+        """
+        名前を決めたボーンデータからボーンを作成し、ウェイトとアーマチュアモディファイアーを設定します
+        """
 
-            if i > 0:
-                tail_indexes = [v.index for s_e in select_loop_edges for v in s_e.verts]
+        profiler = self.profiler
+        target_armature = self._get_target_armature()
 
-                bpy.ops.view3d.snap_cursor_to_selected()
-                local_cursor_location = mwi * context.scene.cursor_location if bpy.app.version < (2, 80)\
-                    else mwi @ context.scene.cursor.location
+        with profiler.phase("bone_locations"):
+            heads, tails, align_vectors = self._get_bone_locations(target_armature)
 
-                tail = copy.copy(local_cursor_location)
+        with profiler.phase("create_armature"):
+            bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+            if target_armature:
+                armature_object = target_armature
+            else:
+                armature_object = self._create_armature_object(context)
+            set_active_object(context, armature_object)
 
-                new_bones.append({"indexes": tuple(head_indexes + tail_indexes), "head": head, "tail": tail})
-                head = tail
-                head_indexes = tail_indexes
+        with profiler.phase("create_bones"):
+            # ボーンの作成は1回の編集モードでまとめて行う
+            bpy.ops.object.mode_set(mode='EDIT', toggle=False)
+            edit_bones = armature_object.data.edit_bones
+            parentBone = edit_bones.get(self.target_bone) if target_armature and self.target_bone else None
+            if target_armature:
+                for bone in edit_bones:
+                    bone.select = False
+                    bone.select_head = False
+                    bone.select_tail = False
+
+            rootBone = parentBone
+            if align_vectors is not None:
+                # 全てのボーンのロールをまとめて計算し、1度単位に丸める
+                rolls = np.radians(np.round(np.degrees(pat_geometry.get_bone_rolls(heads, tails, align_vectors))))
+                rolls = rolls.tolist()
             else:
-                head_indexes = [v.index for s_e in select_loop_edges for v in s_e.verts]
+                rolls = [0.0] * len(self.new_bones)
+            parents = self.new_bones.parents.tolist()
+
+            # 再フィットのために、ヘッドとテールを求めた頂点とウェイトをボーンに保存する
+            stencils = self.new_bones.stencils
+            if stencils is not None:
+                stencil_offsets = stencils[0].tolist()
+                stencil_vertices = stencils[1].tolist()
+                stencil_weights = stencils[2].tolist()
+                offset = self._get_offset().tolist()
+            bones = []
+            bone_names = []
+            for i, (bone_name, head, tail) in enumerate(zip(self.new_bone_names, heads.tolist(), tails.tolist())):
+                bone = edit_bones.new(bone_name)  # type: bpy.types.EditBone
+                bone.head = head
+                bone.tail = tail
+                bone.roll = rolls[i]
+                bone.select = True
+                if stencils is not None:
+                    head_start, tail_start, tail_end = stencil_offsets[i * 2:i * 2 + 3]
+                    set_bone_stencil(bone, self.mesh_object.name, offset,
+                                     (stencil_vertices[head_start:tail_start], stencil_weights[head_start:tail_start]),
+                                     (stencil_vertices[tail_start:tail_end], stencil_weights[tail_start:tail_end]))
+
+                # チェーンの根元のボーンは、指定した親ボーンにつなげる
+                parent_index = parents[i] if self.is_parent else -1
+                if parent_index >= 0:
+                    bone.parent = bones[parent_index]
+                    bone.use_connect = self.use_connect
+                elif rootBone:
+                    # 既存のボーンには接続せず、親子関係だけを設定する
+                    bone.parent = rootBone
 
-                bpy.ops.view3d.snap_cursor_to_selected()
-                local_cursor_location = mwi * context.scene.cursor_location if bpy.app.version < (2, 80)\
-                    else mwi @ context.scene.cursor.location
+                bones.append(bone)
 
-                head = copy.copy(local_cursor_location)
+                # 既存のアーマチュアに同名のボーンがある場合は名前が変わる
+                bone_names.append(bone.name)
+            bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+            self.new_bone_names = bone_names
 
-            bpy.ops.mesh.select_all(action='DESELECT')
+        if self.uses_mesh and self.use_auto_bone_weight:
+            with profiler.phase("vertex_groups"):
+                self._write_bone_weights()
 
-        if current_local:
-            bpy.ops.view3d.localview()
+            with profiler.phase("modifier"):
+                modifiers = self._get_armature_modifier(armature_object, target_armature is not None)
+                modifiers.object = armature_object
 
-        if bpy.app.version < (2, 80):
-            context.scene.cursor_location = current_cursor
-        else:
-            context.scene.cursor.location = current_cursor
+                set_active_object(context, self.mesh_object)
 
-        for edge in selected_edges:
-            edge.select = True
-        self.mesh_object.update_from_editmode()
+        if profiler.running:
+            profiler.extra["bones"] = len(self.new_bones)
+            self._stop_profiler()
+            self.report({'INFO'}, profiler.summary())
 
-        return new_bones
 
-    def __init__(self):
-        super(PAT_OT_MidpointOfSelectedEdgeLoopOder, self).__init__()
+@make_annotations
+class PAT_OT_MeshBase(PAT_OT_Base):
+    """
+    メッシュの辺からボーンを作成するオペレーターの共通の設定
+    """
 
-    def invoke(self, context, event):
-        super(PAT_OT_MidpointOfSelectedEdgeLoopOder, self).invoke(context, event)
+    uses_mesh = True
+
+    use_offset = bpy.props.BoolProperty(
+        name="Offset",
+        description="Enable Bone location offset",
+        default=False,
+        options={'HIDDEN'}
+    )
+    offset = bpy.props.FloatProperty(
+        name="Offset",
+        description="Offset value",
+        default=0.0,
+        unit='LENGTH',
+        options={'HIDDEN'}
+    )
+    use_auto_bone_weight = bpy.props.BoolProperty(
+        name="Auto Bone Weight",
+        description="Enable Auto bone weights",
+        default=True,
+        options={'HIDDEN'}
+    )
+    weight_mode = bpy.props.EnumProperty(
+        name="Weight Mode",
+        description="How to assign the auto bone weights",
+        items=WEIGHT_MODE_ITEMS,
+        default='SELECTED',
+        options={'HIDDEN'}
+    )
+    weight_bone_count = bpy.props.IntProperty(
+        name="Bones per Vertex",
+        description="Maximum number of nearest bones weighted to each vertex",
+        default=2,
+        min=1,
+        max=8,
+        options={'HIDDEN'}
+    )
+    weight_falloff = bpy.props.FloatProperty(
+        name="Falloff",
+        description="Exponent of the weight falloff by distance to the bone",
+        default=2.0,
+        min=0.0,
+        max=8.0,
+        options={'HIDDEN'}
+    )
+    use_x_mirror = bpy.props.BoolProperty(
+        name="X-Mirror",
+        description="Also create the chains mirrored across the local X axis, named with .L and .R",
+        default=False,
+        options={'HIDDEN'}
+    )
+    mirror_tolerance = bpy.props.FloatProperty(
+        name="Mirror Tolerance",
+        description="Maximum distance of a vertex from the mirrored position of its counterpart",
+        default=0.001,
+        min=0.0,
+        unit='LENGTH',
+        options={'HIDDEN'}
+    )
+    use_modal = bpy.props.BoolProperty(
+        name="Modal",
+        description="Extract the bones over several timer steps, showing progress and allowing Esc to cancel",
+        default=False,
+        options={'HIDDEN'}
+    )
+
+
+@make_annotations
+class PAT_OT_SelectedEdgeOrder(PAT_OT_MeshBase, bpy.types.Operator):
+    bl_idname = "armature.pat_selected_edge_order"
+    bl_label = "Create Bone:Selected Edge Order"
+    bl_description = "Creates bones from selected edge order"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    edge_order_mode = bpy.props.EnumProperty(
+        name="Edge Order",
+        description="How to order the selected edges",
+        items=EDGE_ORDER_MODE_ITEMS,
+        default='HISTORY',
+        options={'HIDDEN'}
+    )
+
+    topology_options = ('edge_order_mode', 'use_connect')
+    no_bones_message = "Select at least one edge"
+
+    def _get_bone_topology(self, context):
+        return run_steps(self._iter_bone_topology(context))
+
+    def _iter_bone_topology(self, context):
+        return self._iter_select_edge_location(context)
+
+    def _get_bones_from_topology(self, topology):
+        mesh = self.mesh_object.data
+        return pat_bone_spec.BoneChainSpec.from_vertex_pairs(
+            pat_geometry.get_vertex_coordinates(mesh), topology.head_vertices, topology.tail_vertices,
+            topology.chains, pat_geometry.get_vertex_normals(mesh))
+
+    def _iter_select_edge_location(self, context):
+        """
+        選択した辺からボーンのトポロジーを求め、経路または辺を1つ並べるごとに進み具合を返します
+        """
+
+        bm = bmesh.from_edit_mesh(self.mesh_object.data)
+        if bpy.app.version[0] >= 2 and bpy.app.version[1] >= 73:
+            bm.verts.ensure_lookup_table()
+            bm.edges.ensure_lookup_table()
+            bm.faces.ensure_lookup_table()
+
+        if self.edge_order_mode == 'HISTORY':
+            topology = yield from self._iter_select_history_location(bm)
+            return topology
+
+        # 選択した辺を分岐の無い経路に分け、根元から順に並べる
+        edges = [e for e in bm.edges if e.select]
+        paths = pat_topology.get_edge_paths(edges)
+        yield 0.5
+        get_root_score = self._get_root_score_function(context, self.edge_order_mode)
+
+        head_vertices = []
+        tail_vertices = []
+        chains = []
+        for chain, path in enumerate(paths):
+            verts = pat_topology.orient_edge_paths([path], lambda vert: get_root_score(vert.co))[0]
+            indexes = [v.index for v in verts]
+            head_vertices += indexes[:-1]
+            tail_vertices += indexes[1:]
+            chains += [chain] * (len(indexes) - 1)
+            yield 0.5 + 0.5 * (chain + 1) / len(paths)
+
+        return pat_bone_spec.BoneChainTopology.from_vertex_pairs(head_vertices, tail_vertices, chains)
+
+    def _iter_select_history_location(self, bm):
+        selected_edges = [e for e in bm.select_history if isinstance(e, bmesh.types.BMEdge) and e.select]
+        head_vertices = []
+        tail_vertices = []
+        head = None
+        tail = None
+
+        for i, e in enumerate(selected_edges):  # type: (int, bmesh.types.BMEdge)
+            v0 = e.verts[0]
+            v1 = e.verts[1]
+            if head:
+                if self._get_distance(head.co, v0.co) > self._get_distance(head.co, v1.co):
+                    v0, v1 = v1, v0
+                if not self.use_connect:
+                    head = v0
+                tail = v1
+            else:
+                if len(selected_edges) > 1:
+                    next_verts = selected_edges[i + 1].verts
+                    if v0 in next_verts:
+                        # 次の辺と共有する頂点をテールにする
+                        v0, v1 = v1, v0
+                    elif v1 not in next_verts:
+                        v2 = min(next_verts, key=lambda v: min(self._get_distance(v.co, v0.co),
+                                                               self._get_distance(v.co, v1.co)))
+                        if self._get_distance(v0.co, v2.co) < self._get_distance(v1.co, v2.co):
+                            v0, v1 = v1, v0
+                head = v0
+                tail = v1
+
+            head_vertices.append(head.index)
+            tail_vertices.append(tail.index)
+            head = tail
+            yield (i + 1) / len(selected_edges)
+
+        return pat_bone_spec.BoneChainTopology.from_vertex_pairs(head_vertices, tail_vertices)
+
+    def __init__(self):
+        super(PAT_OT_SelectedEdgeOrder, self).__init__()
+
+    def invoke(self, context, event):
+        super(PAT_OT_SelectedEdgeOrder, self).invoke(context, event)
+
+        # 辺が一つも無い場合は終了
+        if len(self.mesh_object.data.edges) < 1:
+            return self._cancel("This mesh does not have edges")
+
+        return self._extract(context)
+
+    def execute(self, context):
+        super(PAT_OT_SelectedEdgeOrder, self).execute(context)
+        return {'FINISHED'}
+
+
+@make_annotations
+class PAT_OT_MidpointOfSelectedEdgeLoopOder(PAT_OT_MeshBase, bpy.types.Operator):
+    bl_idname = "armature.pat_midpoint_of_selected_edge_loop_order"
+    bl_label = "Create Bone:Midpoint of selected Edge Loop Oder"
+    bl_description = "Creates bones at the midpoint of selected edge loop order"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    loop_center_mode = bpy.props.EnumProperty(
+        name="Loop Center",
+        description="How to calculate the center of each edge loop",
+        items=LOOP_CENTER_MODE_ITEMS,
+        default='MEDIAN',
+        options={'HIDDEN'}
+    )
+    loop_selection_mode = bpy.props.EnumProperty(
+        name="Loop Selection",
+        description="How the edge loops to create the bones from are selected",
+        items=LOOP_SELECTION_MODE_ITEMS,
+        default='HISTORY',
+        options={'HIDDEN'}
+    )
+    loop_stride = bpy.props.IntProperty(
+        name="Stride",
+        description="Create a joint at every n-th loop of the edge ring. The end loops are always used",
+        default=1,
+        min=1,
+        options={'HIDDEN'}
+    )
+    chain_root = bpy.props.EnumProperty(
+        name="Chain Root",
+        description="Where each chain of edge loops starts",
+        items=CHAIN_ROOT_ITEMS,
+        default='LOWEST',
+        options={'HIDDEN'}
+    )
+
+    topology_options = ('use_multi_chain', 'chain_root', 'loop_selection_mode', 'loop_stride')
+    no_bones_message = "Select at least two edge loops"
+
+    def _get_bone_topology(self, context):
+        return run_steps(self._iter_bone_topology(context))
+
+    def _iter_bone_topology(self, context):
+        return self._iter_select_edge_loops_location(context)
+
+    def _topology_uses_positions(self):
+        # 選択履歴の順にループをたどる場合だけ、根元を頂点座標から決めない
+        return self.use_multi_chain or self.loop_selection_mode == 'RING'
+
+    def _get_loop_centers(self, coords, loop_offsets, loop_vertices):
+        """
+        ループごとの辺の頂点インデックスから、ループの中心をまとめて計算します
+        :param loop_offsets: ループごとの頂点インデックスの範囲。長さはループの数+1
+        :type loop_offsets: numpy.ndarray
+        :param loop_vertices: ループごとに辺の頂点インデックスを順に並べ、全てのループをつなげた配列
+        :type loop_vertices: numpy.ndarray
+        :return: (ループの数, 3)のループの中心の配列
+        :rtype: numpy.ndarray
+        """
+
+        return pat_geometry.get_loop_centers(coords, loop_vertices.reshape(-1, 2), loop_offsets // 2,
+                                             self.loop_center_mode)
+
+    def _get_loop_center_stencils(self, coords, loop_offsets, loop_vertices):
+        """
+        ループの中心を、頂点座標の重み付き和として表します
+        :return: ループごとの(offsets, vertices, weights)のCSR
+        :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+
+        return pat_geometry.get_loop_center_stencils(coords, loop_vertices.reshape(-1, 2), loop_offsets // 2,
+                                                     self.loop_center_mode)
+
+    def _get_bones_from_topology(self, topology):
+        """
+        ループの中心をつなぐボーンデータを作成し、ヘッドのループの平面からロールの基準ベクトルを設定します
+        :type topology: pat_bone_spec.BoneChainTopology
+        :rtype: pat_bone_spec.BoneChainSpec
+        """
+
+        # 頂点座標を一度だけ読み込み、ループの中心をまとめて計算する
+        coords = pat_geometry.get_vertex_coordinates(self.mesh_object.data)
+        stencils = self._get_loop_center_stencils(coords, topology.joint_offsets, topology.joint_vertices)
+        centers = pat_geometry.get_stencil_positions(coords, *stencils)
+        new_bones = pat_bone_spec.BoneChainSpec.from_topology(topology, centers, stencils)
+
+        # 全てのループの平面をまとめて当てはめ、ロールの基準にする
+        axes, references = pat_geometry.get_loop_frames(coords, topology.joint_offsets, topology.joint_vertices)
+        head_loops = topology.head_joints
+        new_bones.roll_vectors = pat_bone_spec.get_chain_reference_vectors(axes[head_loops], references[head_loops],
+                                                                           new_bones.chain_starts)
+        return new_bones
+
+    def _iter_select_edge_loops_location(self, context):
+        """
+        選択履歴の辺ごとに辺ループをたどり、ループを1つたどるごとに進み具合を返します
+        """
+
+        bm = bmesh.from_edit_mesh(self.mesh_object.data)
+        if bpy.app.version[0] >= 2 and bpy.app.version[1] >= 73:
+            bm.verts.ensure_lookup_table()
+            bm.edges.ensure_lookup_table()
+            bm.faces.ensure_lookup_table()
+
+        if self.use_multi_chain:
+            topology = yield from self._iter_selected_loop_chains_location(context, bm)
+            return topology
+        if self.loop_selection_mode == 'RING':
+            topology = yield from self._iter_edge_ring_location(context, bm)
+            return topology
+
+        select_history = []
+        select_history_append = select_history.append
+        for history_edge in bm.select_history:
+            if isinstance(history_edge, bmesh.types.BMEdge):
+                select_history_append(history_edge)
+
+        # 選択した辺が2つ以上無い場合は終了
+        if len(select_history) < 2:
+            return
+
+        loops = []
+        for loop_edges in pat_topology.iter_edge_loops(select_history):
+            # すでに選択した辺と同じループの辺のときは終了
+            if loop_edges is None:
+                return
+            loops.append(loop_edges)
+            yield len(loops) / len(select_history)
+
+        loop_indexes = [[v.index for e in loop_edges for v in e.verts] for loop_edges in loops]
+        return pat_bone_spec.BoneChainTopology.from_index_lists(loop_indexes, np.arange(len(loops) - 1),
+                                                                np.arange(1, len(loops)))
+
+    def _iter_edge_ring_location(self, context, bm):
+        """
+        選択した辺リング、または両端の辺ループから辺リングをたどり、リングが横切るループを1本のチェーンにします
+        ループはloop_strideごとに使い、ループを1つたどるごとに進み具合を返します
+        """
+
+        history = [e for e in bm.select_history if isinstance(e, bmesh.types.BMEdge)]
+        ring = pat_topology.get_selected_ring([e for e in bm.edges if e.select], history[0] if history else None)
+        if not ring or len(ring) < 2:
+            return
+
+        # 間引いても両端のループは必ず使う
+        ring_indexes = list(range(0, len(ring), self.loop_stride))
+        if ring_indexes[-1] != len(ring) - 1:
+            ring_indexes.append(len(ring) - 1)
+
+        loop_indexes = []
+        for i, ring_index in enumerate(ring_indexes):
+            loop_edges, _ = pat_topology.walk_edge_loop(ring[ring_index])
+            loop_indexes.append([v.index for e in loop_edges for v in e.verts])
+            yield (i + 1) / len(ring_indexes)
+
+        # 根元になるループから始まるように向きを揃える
+        coords = pat_geometry.get_vertex_coordinates(self.mesh_object.data)
+        get_root_score = self._get_root_score_function(context, self.chain_root)
+        if get_root_score(mathutils.Vector(coords[loop_indexes[-1]].mean(axis=0))) < \
+                get_root_score(mathutils.Vector(coords[loop_indexes[0]].mean(axis=0))):
+            loop_indexes.reverse()
+
+        return pat_bone_spec.BoneChainTopology.from_index_lists(loop_indexes, np.arange(len(loop_indexes) - 1),
+                                                                np.arange(1, len(loop_indexes)))
+
+    def _iter_selected_loop_chains_location(self, context, bm):
+        """
+        選択した全ての辺ループを、メッシュの島ごとのチェーンに分けてボーンデータを作成します
+        ループを分けた後は、チェーンを1つ並べるごとに進み具合を返します
+        """
+
+        # 選択した辺をループに分ける
+        paths = pat_topology.get_edge_paths([e for e in bm.edges if e.select])
+        if len(paths) < 2:
+            return
+        yield 0.25
+
+        loop_indexes = [[v.index for pair in pat_topology.get_path_edge_verts(verts, is_closed) for v in pair]
+                        for verts, is_closed in paths]
+        topology = pat_bone_spec.BoneChainTopology.from_index_lists(loop_indexes, [], [])
+        centers = self._get_loop_centers(pat_geometry.get_vertex_coordinates(self.mesh_object.data),
+                                         topology.joint_offsets, topology.joint_vertices)
+
+        # 同じ島にあるループを1つのチェーンにまとめる
+        chains = {}
+        for i, island_id in enumerate(pat_topology.get_island_ids([verts[0] for verts, _ in paths])):
+            chains.setdefault(island_id, []).append(i)
+        yield 0.5
+
+        get_root_score = self._get_root_score_function(context, self.chain_root)
+        head_loops = []
+        tail_loops = []
+        bone_chains = []
+        chain = 0
+        for island_number, island_id in enumerate(sorted(chains)):
+            yield 0.5 + 0.5 * island_number / len(chains)
+            loops = chains[island_id]
+            if len(loops) < 2:
+                continue
+
+            # 根元のループから、近いループを順にたどる
+            start = min(range(len(loops)), key=lambda i: get_root_score(mathutils.Vector(centers[loops[i]])))
+            order = pat_geometry.get_nearest_neighbor_order(centers[loops], start)
+            loops = [loops[i] for i in order]
+
+            head_loops += loops[:-1]
+            tail_loops += loops[1:]
+            bone_chains += [chain] * (len(loops) - 1)
+            chain += 1
+
+        return pat_bone_spec.BoneChainTopology(topology.joint_offsets, topology.joint_vertices, head_loops,
+                                               tail_loops, bone_chains)
+
+    def __init__(self):
+        super(PAT_OT_MidpointOfSelectedEdgeLoopOder, self).__init__()
+
+    def invoke(self, context, event):
+        super(PAT_OT_MidpointOfSelectedEdgeLoopOder, self).invoke(context, event)
 
         # 辺が2つ以上無い場合は終了
         if len(self.mesh_object.data.edges) < 2:
-            self.report({'ERROR'}, "This mesh does not have multiple edges")
-            return {'FINISHED'}
+            return self._cancel("This mesh does not have multiple edges")
 
-        self.new_bones = self._get_new_bones(context)
+        return self._extract(context)
 
-        # 作成するボーンデータが一つも無い場合は終了
-        if not self.new_bones:
-            self.report({'ERROR'}, "Select at least two edge loops")
-            return {'FINISHED'}
+    def execute(self, context):
+        super(PAT_OT_MidpointOfSelectedEdgeLoopOder, self).execute(context)
+        return {'FINISHED'}
 
-        self.new_bone_names = self._get_new_bone_names()
 
-        # 開始番号にボーンの数を足す
-        if self.pat_tool_settings.use_auto_increment:
-            self.pat_tool_settings.start_number += len(self.new_bones)
+@make_annotations
+class PAT_OT_HairCardIslands(PAT_OT_MeshBase, bpy.types.Operator):
+    bl_idname = "armature.pat_hair_card_islands"
+    bl_label = "Create Bone:Hair Card Islands"
+    bl_description = "Creates a chain of bones along every hair card island of the mesh"
+    bl_options = {'REGISTER', 'UNDO'}
 
-        # ボーンネームが空の場合は終了
-        for bone_name in self.new_bone_names:
-            if bone_name == '':
-                self.report({'ERROR'}, "No blank names are allowed")
-                return {'FINISHED'}
+    chain_root = bpy.props.EnumProperty(
+        name="Chain Root",
+        description="Where each chain of edge loops starts",
+        items=CHAIN_ROOT_ITEMS,
+        default='LOWEST',
+        options={'HIDDEN'}
+    )
+    use_threads = bpy.props.BoolProperty(
+        name="Use Threads",
+        description="Process the islands in parallel threads",
+        default=True,
+        options={'HIDDEN'}
+    )
 
-        # オートウェイトが有効で、作成するボーンと同名の頂点グループがある場合は終了
-        if self.use_auto_bone_weight:
-            for vg in self.mesh_object.vertex_groups:  # type: bpy.types.VertexGroup
-                if vg.name in self.new_bone_names:
-                    self.report({'ERROR'}, "The vertex group has already been created")
-                    return {'FINISHED'}
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj and obj.type == 'MESH' and obj.mode == 'EDIT'
+
+    topology_options = ('chain_root',)
+    no_bones_message = "No hair card islands were found"
+
+    def _get_selection_arrays(self):
+        return [np.flatnonzero(pat_geometry.get_vertex_selection(self.mesh_object.data))]
+
+    def _get_bone_topology(self, context):
+        return run_steps(self._iter_bone_topology(context))
 
-        return self.execute(context)
+    def _iter_bone_topology(self, context):
+        return self._iter_hair_card_islands_location(context)
+
+    def _get_bones_from_topology(self, topology):
+        coords = pat_geometry.get_vertex_coordinates(self.mesh_object.data)
+        row_centers = pat_geometry.get_joint_means(coords, topology.joint_offsets, topology.joint_vertices)
+        return pat_bone_spec.BoneChainSpec.from_topology(topology, row_centers)
+
+    def _iter_hair_card_islands_location(self, context):
+        """
+        選択した頂点を含む島、選択が無い場合は全ての島を、島ごとに1本のチェーンにします
+        島のまとまりを1つ処理するごとに進み具合を返します
+        """
+
+        mesh = self.mesh_object.data
+        coords = pat_geometry.get_vertex_coordinates(mesh)
+        edges = pat_geometry.get_edge_vertices(mesh)
+        selected = pat_geometry.get_vertex_selection(mesh)
+
+        chain_offsets, row_offsets, row_vertices, row_centers = yield from pat_geometry.iter_hair_card_chains(
+            coords, edges, selected, workers=None if self.use_threads else 1)
+
+        get_root_score = self._get_root_score_function(context, self.chain_root)
+
+        head_rows = []
+        tail_rows = []
+        chains = []
+        for chain, (start, end) in enumerate(zip(chain_offsets[:-1].tolist(), chain_offsets[1:].tolist())):
+            rows = list(range(start, end))
+            if get_root_score(mathutils.Vector(row_centers[rows[-1]])) < \
+                    get_root_score(mathutils.Vector(row_centers[rows[0]])):
+                rows.reverse()
+
+            head_rows += rows[:-1]
+            tail_rows += rows[1:]
+            chains += [chain] * (len(rows) - 1)
+
+        return pat_bone_spec.BoneChainTopology(row_offsets, row_vertices, head_rows, tail_rows, chains)
+
+    def __init__(self):
+        super(PAT_OT_HairCardIslands, self).__init__()
+
+    def invoke(self, context, event):
+        super(PAT_OT_HairCardIslands, self).invoke(context, event)
+        self.use_multi_chain = True
+
+        # 辺が2つ以上無い場合は終了
+        if len(self.mesh_object.data.edges) < 2:
+            return self._cancel("This mesh does not have multiple edges")
+
+        return self._extract(context)
 
     def execute(self, context):
-        super(PAT_OT_MidpointOfSelectedEdgeLoopOder, self).execute(context)
+        super(PAT_OT_HairCardIslands, self).execute(context)
+        return {'FINISHED'}
+
+
+@make_annotations
+class PAT_OT_ShortestPath(PAT_OT_MeshBase, bpy.types.Operator):
+    bl_idname = "armature.pat_shortest_path"
+    bl_label = "Create Bone:Shortest Path"
+    bl_description = "Creates bones along the shortest edge path between two selected vertices"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    chain_root = bpy.props.EnumProperty(
+        name="Chain Root",
+        description="Which of the two vertices the chain starts from when the selection order is unknown",
+        items=CHAIN_ROOT_ITEMS,
+        default='LOWEST',
+        options={'HIDDEN'}
+    )
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj and obj.type == 'MESH' and obj.mode == 'EDIT'
+
+    topology_options = ('chain_root',)
+    no_bones_message = "Select two vertices connected by edges"
+
+    def _get_selection_arrays(self):
+        bm = bmesh.from_edit_mesh(self.mesh_object.data)
+        history = [v.index for v in bm.select_history if isinstance(v, bmesh.types.BMVert)]
+        return [np.flatnonzero(pat_geometry.get_vertex_selection(self.mesh_object.data)), np.array(history)]
+
+    def _get_bone_topology(self, context):
+        return run_steps(self._iter_bone_topology(context))
+
+    def _iter_bone_topology(self, context):
+        return self._iter_shortest_path_location(context)
+
+    def _get_bones_from_topology(self, topology):
+        mesh = self.mesh_object.data
+        return pat_bone_spec.BoneChainSpec.from_vertex_pairs(
+            pat_geometry.get_vertex_coordinates(mesh), topology.head_vertices, topology.tail_vertices,
+            topology.chains, pat_geometry.get_vertex_normals(mesh))
+
+    def _get_path_ends(self, context, coords, selected):
+        """
+        選択した2つの頂点を、始点と終点の順に並べます
+        2つとも選択履歴にある場合は先に選択した頂点、無い場合はchain_rootで根元になる頂点を始点にします
+        :rtype: (int, int)
+        """
+
+        bm = bmesh.from_edit_mesh(self.mesh_object.data)
+        history = [v.index for v in bm.select_history if isinstance(v, bmesh.types.BMVert) and v.index in selected]
+        if len(set(history)) == 2:
+            return history[0], next(index for index in history if index != history[0])
+
+        get_root_score = self._get_root_score_function(context, self.chain_root)
+        start, end = selected
+        if get_root_score(mathutils.Vector(coords[end])) < get_root_score(mathutils.Vector(coords[start])):
+            start, end = end, start
+        return start, end
+
+    def _iter_shortest_path_location(self, context):
+        """
+        選択した2つの頂点の間の最短経路をたどり、一定の数の頂点をたどるごとに進み具合を返します
+        """
+
+        mesh = self.mesh_object.data
+        selected = np.flatnonzero(pat_geometry.get_vertex_selection(mesh)).tolist()
+        if len(selected) != 2:
+            return None
+
+        coords = pat_geometry.get_vertex_coordinates(mesh)
+        start, end = self._get_path_ends(context, coords, selected)
+
+        # 隣接頂点は配列で一度だけ作成し、終点に届くまで最短経路を探す
+        adjacency_offsets, adjacency_vertices = pat_geometry.get_vertex_adjacency(
+            len(coords), pat_geometry.get_edge_vertices(mesh))
+        path = yield from pat_geometry.iter_shortest_path(coords, adjacency_offsets, adjacency_vertices, start, end)
+        if len(path) < 2:
+            return None
+
+        return pat_bone_spec.BoneChainTopology.from_vertex_pairs(path[:-1], path[1:])
+
+    def __init__(self):
+        super(PAT_OT_ShortestPath, self).__init__()
+
+    def invoke(self, context, event):
+        super(PAT_OT_ShortestPath, self).invoke(context, event)
+
+        # 辺が一つも無い場合は終了
+        if len(self.mesh_object.data.edges) < 1:
+            return self._cancel("This mesh does not have edges")
+
+        return self._extract(context)
+
+    def execute(self, context):
+        super(PAT_OT_ShortestPath, self).execute(context)
+        return {'FINISHED'}
+
+
+@make_annotations
+class PAT_OT_CurveChains(PAT_OT_Base, bpy.types.Operator):
+    bl_idname = "armature.pat_curve_chains"
+    bl_label = "Create Bone:Curve Chains"
+    bl_description = "Creates a chain of bones along every spline of the selected curve objects"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    max_angle = bpy.props.FloatProperty(
+        name="Max Angle",
+        description="Maximum angle the curve may turn within one bone. Straight spans get a single bone",
+        default=math.radians(15.0),
+        min=math.radians(0.5),
+        max=math.radians(90.0),
+        subtype='ANGLE',
+        options={'HIDDEN'}
+    )
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        if obj is None or obj.mode != 'OBJECT':
+            return False
+        return any(selected.type == 'CURVE' for selected in context.selected_objects)
+
+    no_bones_message = "Select curve objects with splines of at least two points"
+    # ボーンの長さがこれより短い場合は作成しない
+    EPSILON = 1e-6
+
+    def _setup_source(self, context):
+        # カーブはワールド座標で評価するため、メッシュは使わない
+        self.mesh_object = None
+        self.matrix_world = mathutils.Matrix.Identity(4)
+
+    def _iter_new_bones(self, context):
+        """
+        選択した全てのカーブオブジェクトのスプラインをまとめて評価し、スプラインごとに1つのチェーンを作成します
+        ロールの基準はワールドの上方向を、カーブの傾きの分だけボーンの軸の周りに回転したものです
+        """
+
+        curve_objects = [obj for obj in context.selected_objects if obj.type == 'CURVE']
+        segment_points, segment_tilts, spline_offsets = pat_curve.get_curve_segments(curve_objects)
+        yield 0.5
+        if len(spline_offsets) < 2:
+            return None
+
+        heads, tails, head_tilts, tail_tilts, chains = pat_curve.get_spline_chains(
+            segment_points, segment_tilts, spline_offsets, self.max_angle)
+
+        # 重なった制御点からできる長さが0のボーンは、Blenderが削除するため除く
+        keep = np.linalg.norm(tails - heads, axis=1) > self.EPSILON
+        heads, tails, chains = heads[keep], tails[keep], chains[keep]
+        roll_vectors = pat_curve.get_tilt_normals(heads, tails, (head_tilts[keep] + tail_tilts[keep]) / 2.0)
+        self.profiler.extra["splines"] = len(spline_offsets) - 1
+        yield 1.0
+        return pat_bone_spec.BoneChainSpec(heads=heads, tails=tails, chains=chains, roll_vectors=roll_vectors)
+
+    def __init__(self):
+        super(PAT_OT_CurveChains, self).__init__()
+
+    def invoke(self, context, event):
+        super(PAT_OT_CurveChains, self).invoke(context, event)
+        return self._extract(context)
+
+    def execute(self, context):
+        super(PAT_OT_CurveChains, self).execute(context)
+        return {'FINISHED'}
+
+
+@make_annotations
+class PAT_OT_RefitBones(bpy.types.Operator):
+    bl_idname = "armature.pat_refit_bones"
+    bl_label = "Refit Bones"
+    bl_description = "Moves the heads and tails of the created bones to the current shape of the mesh"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    # これより小さい移動は無視し、ボーンを変更しない
+    EPSILON = 1e-6
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj and obj.type in ('ARMATURE', 'MESH')
+
+    @staticmethod
+    def _get_armature_objects(obj):
+        """
+        アクティブなアーマチュア、またはメッシュのアーマチュアモディファイアーのアーマチュアを返します
+        :rtype: list[bpy.types.Object]
+        """
+
+        if obj.type == 'ARMATURE':
+            return [obj]
+        armature_objects = []
+        for modifier in obj.modifiers:
+            if modifier.type == 'ARMATURE' and modifier.object and modifier.object not in armature_objects:
+                armature_objects.append(modifier.object)
+        return armature_objects
+
+    def _get_bone_positions(self, armature_object):
+        """
+        保存した頂点とウェイトから、ボーンの新しいヘッドとテールをメッシュごとにまとめて計算します
+        メッシュが見つからないボーンや、頂点が足りないボーンは含みません
+        :return: ボーンの名前のリストと、アーマチュアの座標での(ボーンの数, 3)のヘッドとテールの配列
+        :rtype: (list[str], numpy.ndarray, numpy.ndarray)
+        """
+
+        groups = {}
+        for bone in armature_object.data.bones:
+            stencil = get_bone_stencil(bone)
+            if stencil:
+                groups.setdefault(stencil[0], []).append((bone.name, stencil))
+
+        names = []
+        heads = []
+        tails = []
+        armature_matrix = armature_object.matrix_world.inverted()
+        for mesh_name, items in groups.items():
+            mesh_object = bpy.data.objects.get(mesh_name)
+            if mesh_object is None or mesh_object.type != 'MESH':
+                self.skipped_count += len(items)
+                continue
+
+            coords = pat_geometry.get_vertex_coordinates(mesh_object.data)
+            vertex_count = len(coords)
+            lengths = []
+            vertices = []
+            weights = []
+            offsets = []
+            for name, (_, offset, head_vertices, head_weights, tail_vertices, tail_weights) in items:
+                # トポロジーが変わって頂点が無くなった場合は動かさない
+                if max(head_vertices + tail_vertices) >= vertex_count:
+                    self.skipped_count += 1
+                    continue
+                names.append(name)
+                lengths += [len(head_vertices), len(tail_vertices)]
+                vertices += head_vertices + tail_vertices
+                weights += head_weights + tail_weights
+                offsets.append(offset)
+            if not offsets:
+                continue
+
+            # 全てのボーンのヘッドとテールを1回で計算し、アーマチュアの座標へ変換する
+            stencil_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=stencil_offsets[1:])
+            positions = pat_geometry.get_stencil_positions(coords, stencil_offsets, np.array(vertices, dtype=np.int64),
+                                                           np.array(weights))
+            positions += np.repeat(np.array(offsets, dtype=np.float64), 2, axis=0)
+            matrix = np.array(mul_matrix(armature_matrix, mesh_object.matrix_world), dtype=np.float64)
+            positions = positions.dot(matrix[:3, :3].T) + matrix[:3, 3]
+            heads.append(positions[0::2])
+            tails.append(positions[1::2])
+
+        if not names:
+            return [], np.zeros((0, 3)), np.zeros((0, 3))
+        return names, np.concatenate(heads), np.concatenate(tails)
+
+    def execute(self, context):
+        active_object = context.active_object
+        mode = active_object.mode
+        self.skipped_count = 0
+        refit_count = 0
+
+        # オブジェクトモードに戻し、編集中のメッシュの頂点座標を反映する
+        if mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+
+        for armature_object in self._get_armature_objects(active_object):
+            names, heads, tails = self._get_bone_positions(armature_object)
+            if not names:
+                continue
+
+            # 位置が変わったボーンだけを編集する。名前、親子関係、コンストレイントとウェイトは変更しない
+            bones = armature_object.data.bones
+            current_heads = np.array([bones[name].head_local for name in names])
+            current_tails = np.array([bones[name].tail_local for name in names])
+            moved = (np.abs(heads - current_heads).max(axis=1) > self.EPSILON) | \
+                    (np.abs(tails - current_tails).max(axis=1) > self.EPSILON)
+            moved_indices = np.flatnonzero(moved).tolist()
+            if not moved_indices:
+                continue
+
+            set_active_object(context, armature_object)
+            bpy.ops.object.mode_set(mode='EDIT', toggle=False)
+            edit_bones = armature_object.data.edit_bones
+            heads = heads.tolist()
+            tails = tails.tolist()
+            for i in moved_indices:
+                edit_bone = edit_bones[names[i]]
+                edit_bone.head = heads[i]
+                edit_bone.tail = tails[i]
+            bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+            refit_count += len(moved_indices)
+
+        set_active_object(context, active_object)
+        if mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode=mode, toggle=False)
+
+        if self.skipped_count:
+            self.report({'WARNING'}, "Skipped {} bones whose mesh or vertices were not found".format(
+                self.skipped_count))
+        self.report({'INFO'}, "Refit {} bones".format(refit_count))
         return {'FINISHED'}
 
 
@@ -650,6 +2078,47 @@ class VIEW3D_PT_edit_petit_armature_tools(bpy.types.Panel):
     def poll(cls, context):
         return True
 
+    @staticmethod
+    def _draw_chain_settings(layout, pat_tool_settings, show_chain_root):
+        layout.prop(pat_tool_settings, "use_multi_chain")
+        if show_chain_root:
+            # リングモードは複数チェーンが無効なときに使われ、根元の設定も使う
+            row = layout.row(align=True)
+            row.active = pat_tool_settings.use_multi_chain or pat_tool_settings.loop_selection_mode == 'RING'
+            row.prop(pat_tool_settings, "chain_root", text="")
+        col = layout.column(align=True)
+        col.active = pat_tool_settings.use_multi_chain
+        col.prop(pat_tool_settings, "chain_start_number")
+        col.prop(pat_tool_settings, "chain_zero_padding")
+
+    @staticmethod
+    def _draw_weight_settings(layout, pat_tool_settings):
+        col = layout.column(align=True)
+        col.active = pat_tool_settings.use_auto_bone_weight
+        col.prop(pat_tool_settings, "weight_mode", text="")
+        if pat_tool_settings.weight_mode == 'NEAREST':
+            col.prop(pat_tool_settings, "weight_bone_count")
+            col.prop(pat_tool_settings, "weight_falloff")
+
+    @staticmethod
+    def _draw_mirror_settings(layout, pat_tool_settings):
+        row = layout.row(align=True)
+        row.prop(pat_tool_settings, "use_x_mirror")
+        row = row.row(align=True)
+        row.prop(pat_tool_settings, "mirror_tolerance", text="")
+        row.active = pat_tool_settings.use_x_mirror
+
+    @staticmethod
+    def _draw_resample_settings(layout, pat_tool_settings):
+        col = layout.column(align=True)
+        col.prop(pat_tool_settings, "resample_mode")
+        if pat_tool_settings.resample_mode == 'COUNT':
+            col.prop(pat_tool_settings, "resample_bone_count")
+        elif pat_tool_settings.resample_mode == 'LENGTH':
+            col.prop(pat_tool_settings, "resample_bone_length")
+        elif pat_tool_settings.resample_mode == 'SIMPLIFY':
+            col.prop(pat_tool_settings, "simplify_tolerance")
+
     def draw(self, context):
         pat_tool_settings = context.scene.PAT_ToolSettings  # type: PAT_ToolSettings
 
@@ -668,14 +2137,33 @@ class VIEW3D_PT_edit_petit_armature_tools(bpy.types.Panel):
         split.operator_context = 'INVOKE_DEFAULT'
         op = split.operator(PAT_OT_SelectedEdgeOrder.bl_idname,
                             text="Selected Edge Order")  # type: PAT_OT_SelectedEdgeOrder
+        op.edge_order_mode = pat_tool_settings.edge_order_mode
         op.use_auto_bone_roll = pat_tool_settings.use_auto_bone_roll
         op.use_auto_bone_weight = pat_tool_settings.use_auto_bone_weight
+        op.weight_mode = pat_tool_settings.weight_mode
+        op.weight_bone_count = pat_tool_settings.weight_bone_count
+        op.weight_falloff = pat_tool_settings.weight_falloff
+        op.resample_mode = pat_tool_settings.resample_mode
+        op.resample_bone_count = pat_tool_settings.resample_bone_count
+        op.resample_bone_length = pat_tool_settings.resample_bone_length
+        op.simplify_tolerance = pat_tool_settings.simplify_tolerance
+        op.use_modal = pat_tool_settings.use_modal
+        op.use_x_mirror = pat_tool_settings.use_x_mirror
+        op.mirror_tolerance = pat_tool_settings.mirror_tolerance
         op.use_offset = pat_tool_settings.use_offset
         op.offset = pat_tool_settings.edge_offset
         op.is_parent = pat_tool_settings.is_parent
+        op.target_armature = pat_tool_settings.target_armature.name if pat_tool_settings.target_armature else ""
+        op.target_bone = pat_tool_settings.target_bone
         op.use_connect = pat_tool_settings.use_connect
-
-        bone_name = create_name(pat_tool_settings.bone_name_base, pat_tool_settings.bone_name_junction,
+        op.use_multi_chain = pat_tool_settings.use_multi_chain
+
+        bone_name_base = pat_tool_settings.bone_name_base
+        if pat_tool_settings.use_multi_chain:
+            bone_name_base = create_chain_name(bone_name_base, pat_tool_settings.bone_name_junction,
+                                               pat_tool_settings.chain_start_number, 0,
+                                               pat_tool_settings.chain_zero_padding)
+        bone_name = create_name(bone_name_base, pat_tool_settings.bone_name_junction,
                                 pat_tool_settings.bone_name_prefix, pat_tool_settings.bone_name_suffix,
                                 pat_tool_settings.start_number, 0, pat_tool_settings.zero_padding)
         # SelectedEdgeOrder - settings
@@ -686,18 +2174,25 @@ class VIEW3D_PT_edit_petit_armature_tools(bpy.types.Panel):
             row = row.row(align=True)
             row.label(text=bone_name)
             box.separator()
-            # box.prop(pat_tool_settings, "target_armature", text="Armature")
-            # if pat_tool_settings.target_armature:
-            #     box.prop_search(pat_tool_settings, "target_bone", pat_tool_settings.target_armature.data, "bones", text="Bone")
+            box.prop(pat_tool_settings, "target_armature", text="Armature")
+            if pat_tool_settings.target_armature:
+                box.prop_search(pat_tool_settings, "target_bone", pat_tool_settings.target_armature.data, "bones",
+                                text="Bone")
             box.prop(pat_tool_settings, "bone_name_base")
             box.prop(pat_tool_settings, "bone_name_junction")
             box.prop(pat_tool_settings, "bone_name_prefix")
             box.prop(pat_tool_settings, "bone_name_suffix")
             box.prop(pat_tool_settings, "start_number")
             box.prop(pat_tool_settings, "zero_padding")
+            box.prop(pat_tool_settings, "edge_order_mode")
+            self._draw_chain_settings(box, pat_tool_settings, False)
             box.prop(pat_tool_settings, "use_auto_bone_roll")
             box.prop(pat_tool_settings, "use_auto_bone_weight")
+            self._draw_weight_settings(box, pat_tool_settings)
+            self._draw_resample_settings(box, pat_tool_settings)
             box.prop(pat_tool_settings, "use_auto_increment")
+            box.prop(pat_tool_settings, "use_modal")
+            self._draw_mirror_settings(box, pat_tool_settings)
             box.prop(pat_tool_settings, "is_parent")
             # box.prop(pat_tool_settings, "is_reverse")
             box_col = box.column(align=True)
@@ -719,12 +2214,29 @@ class VIEW3D_PT_edit_petit_armature_tools(bpy.types.Panel):
         split.operator_context = 'INVOKE_DEFAULT'
         op = split.operator(PAT_OT_MidpointOfSelectedEdgeLoopOder.bl_idname,
                             text="Midpoint of Selected Edge Loop Oder")  # type: PAT_OT_MidpointOfSelectedEdgeLoopOder
-        op.use_auto_bone_roll = False
+        op.use_auto_bone_roll = pat_tool_settings.use_auto_bone_roll
         op.use_auto_bone_weight = pat_tool_settings.use_auto_bone_weight
+        op.weight_mode = pat_tool_settings.weight_mode
+        op.weight_bone_count = pat_tool_settings.weight_bone_count
+        op.weight_falloff = pat_tool_settings.weight_falloff
+        op.resample_mode = pat_tool_settings.resample_mode
+        op.resample_bone_count = pat_tool_settings.resample_bone_count
+        op.resample_bone_length = pat_tool_settings.resample_bone_length
+        op.simplify_tolerance = pat_tool_settings.simplify_tolerance
+        op.use_modal = pat_tool_settings.use_modal
+        op.use_x_mirror = pat_tool_settings.use_x_mirror
+        op.mirror_tolerance = pat_tool_settings.mirror_tolerance
         op.use_offset = False
         op.offset = 0.0
         op.is_parent = pat_tool_settings.is_parent
+        op.target_armature = pat_tool_settings.target_armature.name if pat_tool_settings.target_armature else ""
+        op.target_bone = pat_tool_settings.target_bone
         op.use_connect = pat_tool_settings.use_connect
+        op.use_multi_chain = pat_tool_settings.use_multi_chain
+        op.loop_center_mode = pat_tool_settings.loop_center_mode
+        op.loop_selection_mode = pat_tool_settings.loop_selection_mode
+        op.loop_stride = pat_tool_settings.loop_stride
+        op.chain_root = pat_tool_settings.chain_root
 
         # MidpointOfSelectedEdgeLoopOder - settings
         if pat_tool_settings.display_edge_loop_order:
@@ -734,19 +2246,247 @@ class VIEW3D_PT_edit_petit_armature_tools(bpy.types.Panel):
             row = row.row(align=True)
             row.label(text=bone_name)
             box.separator()
-            # box.prop(pat_tool_settings, "target_armature", text="Armature")
-            # if pat_tool_settings.target_armature:
-            #     box.prop_search(pat_tool_settings, "target_bone", pat_tool_settings.target_armature.data, "bones", text="Bone")
+            box.prop(pat_tool_settings, "target_armature", text="Armature")
+            if pat_tool_settings.target_armature:
+                box.prop_search(pat_tool_settings, "target_bone", pat_tool_settings.target_armature.data, "bones",
+                                text="Bone")
             box.prop(pat_tool_settings, "bone_name_base")
             box.prop(pat_tool_settings, "bone_name_junction")
             box.prop(pat_tool_settings, "bone_name_prefix")
             box.prop(pat_tool_settings, "bone_name_suffix")
             box.prop(pat_tool_settings, "start_number")
             box.prop(pat_tool_settings, "zero_padding")
+            box.prop(pat_tool_settings, "loop_center_mode")
+            col_ring = box.column(align=True)
+            col_ring.active = not pat_tool_settings.use_multi_chain
+            col_ring.prop(pat_tool_settings, "loop_selection_mode", text="")
+            if pat_tool_settings.loop_selection_mode == 'RING':
+                col_ring.prop(pat_tool_settings, "loop_stride")
+            self._draw_chain_settings(box, pat_tool_settings, True)
+            box.prop(pat_tool_settings, "use_auto_bone_roll")
             box.prop(pat_tool_settings, "use_auto_bone_weight")
+            self._draw_weight_settings(box, pat_tool_settings)
+            self._draw_resample_settings(box, pat_tool_settings)
             box.prop(pat_tool_settings, "use_auto_increment")
+            box.prop(pat_tool_settings, "use_modal")
+            self._draw_mirror_settings(box, pat_tool_settings)
             box.prop(pat_tool_settings, "is_parent")
             # box.prop(pat_tool_settings, "is_reverse")
             box_col = box.column(align=True)
             box_col.prop(pat_tool_settings, "use_connect")
             box_col.active = pat_tool_settings.is_parent
+
+        split = col.split(percentage=0.15, align=True) if bpy.app.version < (2, 80) else col.split(factor=0.15,
+                                                                                                   align=True)
+        if pat_tool_settings.display_hair_card_islands:
+            split.prop(pat_tool_settings, "display_hair_card_islands", text="", icon='DOWNARROW_HLT')
+        else:
+            split.prop(pat_tool_settings, "display_hair_card_islands", text="", icon='RIGHTARROW')
+
+        split.operator_context = 'INVOKE_DEFAULT'
+        op = split.operator(PAT_OT_HairCardIslands.bl_idname,
+                            text="Hair Card Islands")  # type: PAT_OT_HairCardIslands
+        op.use_auto_bone_roll = False
+        op.use_auto_bone_weight = pat_tool_settings.use_auto_bone_weight
+        op.weight_mode = pat_tool_settings.weight_mode
+        op.weight_bone_count = pat_tool_settings.weight_bone_count
+        op.weight_falloff = pat_tool_settings.weight_falloff
+        op.resample_mode = pat_tool_settings.resample_mode
+        op.resample_bone_count = pat_tool_settings.resample_bone_count
+        op.resample_bone_length = pat_tool_settings.resample_bone_length
+        op.simplify_tolerance = pat_tool_settings.simplify_tolerance
+        op.use_modal = pat_tool_settings.use_modal
+        op.use_x_mirror = pat_tool_settings.use_x_mirror
+        op.mirror_tolerance = pat_tool_settings.mirror_tolerance
+        op.use_offset = False
+        op.offset = 0.0
+        op.is_parent = pat_tool_settings.is_parent
+        op.target_armature = pat_tool_settings.target_armature.name if pat_tool_settings.target_armature else ""
+        op.target_bone = pat_tool_settings.target_bone
+        op.use_connect = pat_tool_settings.use_connect
+        op.chain_root = pat_tool_settings.chain_root
+
+        # HairCardIslands - settings
+        if pat_tool_settings.display_hair_card_islands:
+            chain_bone_name = create_name(
+                create_chain_name(pat_tool_settings.bone_name_base, pat_tool_settings.bone_name_junction,
+                                  pat_tool_settings.chain_start_number, 0, pat_tool_settings.chain_zero_padding),
+                pat_tool_settings.bone_name_junction, pat_tool_settings.bone_name_prefix,
+                pat_tool_settings.bone_name_suffix, pat_tool_settings.start_number, 0, pat_tool_settings.zero_padding)
+            box = col.column(align=True).box().column()
+            row = box.row(align=True)
+            row.label(text="Example of name display:")
+            row = row.row(align=True)
+            row.label(text=chain_bone_name)
+            box.separator()
+            box.prop(pat_tool_settings, "target_armature", text="Armature")
+            if pat_tool_settings.target_armature:
+                box.prop_search(pat_tool_settings, "target_bone", pat_tool_settings.target_armature.data, "bones",
+                                text="Bone")
+            box.prop(pat_tool_settings, "bone_name_base")
+            box.prop(pat_tool_settings, "bone_name_junction")
+            box.prop(pat_tool_settings, "bone_name_prefix")
+            box.prop(pat_tool_settings, "bone_name_suffix")
+            box.prop(pat_tool_settings, "start_number")
+            box.prop(pat_tool_settings, "zero_padding")
+            box.prop(pat_tool_settings, "chain_root")
+            box.prop(pat_tool_settings, "chain_start_number")
+            box.prop(pat_tool_settings, "chain_zero_padding")
+            box.prop(pat_tool_settings, "use_auto_bone_weight")
+            self._draw_weight_settings(box, pat_tool_settings)
+            self._draw_resample_settings(box, pat_tool_settings)
+            box.prop(pat_tool_settings, "use_auto_increment")
+            box.prop(pat_tool_settings, "use_modal")
+            self._draw_mirror_settings(box, pat_tool_settings)
+            box.prop(pat_tool_settings, "is_parent")
+            box_col = box.column(align=True)
+            box_col.prop(pat_tool_settings, "use_connect")
+            box_col.active = pat_tool_settings.is_parent
+
+        split = col.split(percentage=0.15, align=True) if bpy.app.version < (2, 80) else col.split(factor=0.15,
+                                                                                                   align=True)
+        if pat_tool_settings.display_shortest_path:
+            split.prop(pat_tool_settings, "display_shortest_path", text="", icon='DOWNARROW_HLT')
+        else:
+            split.prop(pat_tool_settings, "display_shortest_path", text="", icon='RIGHTARROW')
+
+        split.operator_context = 'INVOKE_DEFAULT'
+        op = split.operator(PAT_OT_ShortestPath.bl_idname,
+                            text="Shortest Path")  # type: PAT_OT_ShortestPath
+        op.use_auto_bone_roll = pat_tool_settings.use_auto_bone_roll
+        op.use_auto_bone_weight = pat_tool_settings.use_auto_bone_weight
+        op.weight_mode = pat_tool_settings.weight_mode
+        op.weight_bone_count = pat_tool_settings.weight_bone_count
+        op.weight_falloff = pat_tool_settings.weight_falloff
+        op.resample_mode = pat_tool_settings.resample_mode
+        op.resample_bone_count = pat_tool_settings.resample_bone_count
+        op.resample_bone_length = pat_tool_settings.resample_bone_length
+        op.simplify_tolerance = pat_tool_settings.simplify_tolerance
+        op.use_modal = pat_tool_settings.use_modal
+        op.use_x_mirror = pat_tool_settings.use_x_mirror
+        op.mirror_tolerance = pat_tool_settings.mirror_tolerance
+        op.use_offset = pat_tool_settings.use_offset
+        op.offset = pat_tool_settings.edge_offset
+        op.is_parent = pat_tool_settings.is_parent
+        op.target_armature = pat_tool_settings.target_armature.name if pat_tool_settings.target_armature else ""
+        op.target_bone = pat_tool_settings.target_bone
+        op.use_connect = pat_tool_settings.use_connect
+        op.chain_root = pat_tool_settings.chain_root
+
+        # ShortestPath - settings
+        if pat_tool_settings.display_shortest_path:
+            box = col.column(align=True).box().column()
+            row = box.row(align=True)
+            row.label(text="Example of name display:")
+            row = row.row(align=True)
+            row.label(text=create_name(pat_tool_settings.bone_name_base, pat_tool_settings.bone_name_junction,
+                                       pat_tool_settings.bone_name_prefix, pat_tool_settings.bone_name_suffix,
+                                       pat_tool_settings.start_number, 0, pat_tool_settings.zero_padding))
+            box.separator()
+            box.prop(pat_tool_settings, "target_armature", text="Armature")
+            if pat_tool_settings.target_armature:
+                box.prop_search(pat_tool_settings, "target_bone", pat_tool_settings.target_armature.data, "bones",
+                                text="Bone")
+            box.prop(pat_tool_settings, "bone_name_base")
+            box.prop(pat_tool_settings, "bone_name_junction")
+            box.prop(pat_tool_settings, "bone_name_prefix")
+            box.prop(pat_tool_settings, "bone_name_suffix")
+            box.prop(pat_tool_settings, "start_number")
+            box.prop(pat_tool_settings, "zero_padding")
+            box.prop(pat_tool_settings, "chain_root")
+            box.prop(pat_tool_settings, "use_auto_bone_roll")
+            box.prop(pat_tool_settings, "use_auto_bone_weight")
+            self._draw_weight_settings(box, pat_tool_settings)
+            self._draw_resample_settings(box, pat_tool_settings)
+            box.prop(pat_tool_settings, "use_auto_increment")
+            box.prop(pat_tool_settings, "use_modal")
+            self._draw_mirror_settings(box, pat_tool_settings)
+            box.prop(pat_tool_settings, "is_parent")
+            box_col = box.column(align=True)
+            box_col.prop(pat_tool_settings, "use_connect")
+            box_col.active = pat_tool_settings.is_parent
+            row = box.row(align=True)
+            row.prop(pat_tool_settings, "use_offset")
+            row = row.row(align=True)
+            row.prop(pat_tool_settings, "edge_offset", text="")
+            row.active = pat_tool_settings.use_offset
+
+        layout.separator()
+        layout.operator(PAT_OT_RefitBones.bl_idname, text="Refit Bones")
+
+
+@make_annotations
+class VIEW3D_PT_object_petit_armature_tools(bpy.types.Panel):
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS' if bpy.app.version < (2, 80) else 'UI'
+    bl_category = 'Tools' if bpy.app.version < (2, 80) else 'Edit'
+    bl_context = 'objectmode'
+    bl_label = 'Petit Armature Tools'
+
+    @classmethod
+    def poll(cls, context):
+        return True
+
+    def draw(self, context):
+        pat_tool_settings = context.scene.PAT_ToolSettings  # type: PAT_ToolSettings
+
+        layout = self.layout
+        layout.label(text="Create Bone:")
+        col = layout.column(align=True)
+
+        split = col.split(percentage=0.15, align=True) if bpy.app.version < (2, 80) else col.split(factor=0.15,
+                                                                                                   align=True)
+        if pat_tool_settings.display_curve_chains:
+            split.prop(pat_tool_settings, "display_curve_chains", text="", icon='DOWNARROW_HLT')
+        else:
+            split.prop(pat_tool_settings, "display_curve_chains", text="", icon='RIGHTARROW')
+
+        split.operator_context = 'INVOKE_DEFAULT'
+        op = split.operator(PAT_OT_CurveChains.bl_idname,
+                            text="Curve Chains")  # type: PAT_OT_CurveChains
+        op.max_angle = pat_tool_settings.curve_max_angle
+        op.use_auto_bone_roll = pat_tool_settings.use_auto_bone_roll
+        op.resample_mode = pat_tool_settings.resample_mode
+        op.resample_bone_count = pat_tool_settings.resample_bone_count
+        op.resample_bone_length = pat_tool_settings.resample_bone_length
+        op.simplify_tolerance = pat_tool_settings.simplify_tolerance
+        op.is_parent = pat_tool_settings.is_parent
+        op.target_armature = pat_tool_settings.target_armature.name if pat_tool_settings.target_armature else ""
+        op.target_bone = pat_tool_settings.target_bone
+        op.use_connect = pat_tool_settings.use_connect
+        op.use_multi_chain = pat_tool_settings.use_multi_chain
+
+        # CurveChains - settings
+        if pat_tool_settings.display_curve_chains:
+            bone_name_base = pat_tool_settings.bone_name_base
+            if pat_tool_settings.use_multi_chain:
+                bone_name_base = create_chain_name(bone_name_base, pat_tool_settings.bone_name_junction,
+                                                   pat_tool_settings.chain_start_number, 0,
+                                                   pat_tool_settings.chain_zero_padding)
+            box = col.column(align=True).box().column()
+            row = box.row(align=True)
+            row.label(text="Example of name display:")
+            row = row.row(align=True)
+            row.label(text=create_name(bone_name_base, pat_tool_settings.bone_name_junction,
+                                       pat_tool_settings.bone_name_prefix, pat_tool_settings.bone_name_suffix,
+                                       pat_tool_settings.start_number, 0, pat_tool_settings.zero_padding))
+            box.separator()
+            box.prop(pat_tool_settings, "target_armature", text="Armature")
+            if pat_tool_settings.target_armature:
+                box.prop_search(pat_tool_settings, "target_bone", pat_tool_settings.target_armature.data, "bones",
+                                text="Bone")
+            box.prop(pat_tool_settings, "bone_name_base")
+            box.prop(pat_tool_settings, "bone_name_junction")
+            box.prop(pat_tool_settings, "bone_name_prefix")
+            box.prop(pat_tool_settings, "bone_name_suffix")
+            box.prop(pat_tool_settings, "start_number")
+            box.prop(pat_tool_settings, "zero_padding")
+            box.prop(pat_tool_settings, "curve_max_angle")
+            VIEW3D_PT_edit_petit_armature_tools._draw_chain_settings(box, pat_tool_settings, False)
+            box.prop(pat_tool_settings, "use_auto_bone_roll")
+            VIEW3D_PT_edit_petit_armature_tools._draw_resample_settings(box, pat_tool_settings)
+            box.prop(pat_tool_settings, "use_auto_increment")
+            box.prop(pat_tool_settings, "is_parent")
+            box_col = box.column(align=True)
+            box_col.prop(pat_tool_settings, "use_connect")
+            box_col.active = pat_tool_settings.is_parent
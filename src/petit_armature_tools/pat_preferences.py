@@ -72,6 +72,48 @@ class PAT_AddonPreferences(bpy.types.AddonPreferences):
         items=get_update_candidate_branches
     )
 
+    # for profiling
+    use_profiling = bpy.props.BoolProperty(
+        name="Profiling",
+        description="Record the time of each phase of the bone creation operators",
+        default=False
+    )
+    use_profiling_cprofile = bpy.props.BoolProperty(
+        name="cProfile",
+        description="Record the cProfile statistics of each operator run",
+        default=False
+    )
+    use_profiling_tracemalloc = bpy.props.BoolProperty(
+        name="tracemalloc",
+        description="Record the tracemalloc snapshot of each operator run",
+        default=False
+    )
+    profiling_log_path = bpy.props.StringProperty(
+        name="Log File",
+        description="JSON lines file to write the profile results (empty for the temporary directory)",
+        default="",
+        subtype='FILE_PATH'
+    )
+
+    # for topology cache
+    use_topology_cache = bpy.props.BoolProperty(
+        name="Topology Cache",
+        description="Reuse the extracted chains for meshes with the same topology and selection",
+        default=False
+    )
+    topology_cache_path = bpy.props.StringProperty(
+        name="Cache Folder",
+        description="Folder to store the topology cache (empty for the temporary directory)",
+        default="",
+        subtype='DIR_PATH'
+    )
+    topology_cache_size = bpy.props.IntProperty(
+        name="Cache Entries",
+        description="Maximum number of cached chains kept on disk",
+        default=256,
+        min=1
+    )
+
     def __init__(self):
         super(bpy.types.AddonPreferences, self).__init__()
 
@@ -82,3 +124,22 @@ class PAT_AddonPreferences(bpy.types.AddonPreferences):
         # col.label(text="Tab Category:")
         # col.prop(self, "category", text="")
         updater.draw_updater_ui(self)
+
+        layout.separator()
+        layout.label(text="Profiling:")
+        col = layout.column()
+        col.prop(self, "use_profiling")
+        sub = col.column()
+        sub.active = self.use_profiling
+        sub.prop(self, "use_profiling_cprofile")
+        sub.prop(self, "use_profiling_tracemalloc")
+        sub.prop(self, "profiling_log_path")
+
+        layout.separator()
+        layout.label(text="Topology Cache:")
+        col = layout.column()
+        col.prop(self, "use_topology_cache")
+        sub = col.column()
+        sub.active = self.use_topology_cache
+        sub.prop(self, "topology_cache_path")
+        sub.prop(self, "topology_cache_size")
@@ -0,0 +1,244 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import contextlib
+import cProfile
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+
+import bpy
+
+# 環境変数で計測を有効にします。"1"で時間のみ、"cprofile"や"tracemalloc"をカンマ区切りで追加できます
+ENV_VAR = "PAT_PROFILE"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+TOP_STATS = 20
+
+_logger = logging.getLogger(__name__)
+_logger.propagate = False
+_logger.setLevel(logging.INFO)
+
+
+def get_default_log_path():
+    return os.path.join(tempfile.gettempdir(), "petit_armature_tools", "profile.jsonl")
+
+
+def _get_addon_preferences(context):
+    addons = context.user_preferences.addons if bpy.app.version < (2, 80) else context.preferences.addons
+    addon = addons.get(__package__)
+    return addon.preferences if addon else None
+
+
+def _get_log_handler(path):
+    for handler in list(_logger.handlers):
+        if handler.baseFilename == os.path.abspath(path):
+            return handler
+        _logger.removeHandler(handler)
+        handler.close()
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                                   encoding='utf-8')
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    return handler
+
+
+class OperatorProfiler(object):
+    """
+    オペレーターの処理ごとの時間と、必要に応じてcProfileやtracemallocの結果を記録します
+    無効なときはphaseが何もしないため、常に呼び出して構いません
+    """
+
+    def __init__(self, name='', enabled=False, use_cprofile=False, use_tracemalloc=False, log_path=''):
+        self.name = name
+        self.enabled = enabled
+        self.use_cprofile = enabled and use_cprofile
+        self.use_tracemalloc = enabled and use_tracemalloc
+        self.log_path = log_path or get_default_log_path()
+        self.phases = []
+        self.extra = {}
+        self._profile = None
+        self._started_tracemalloc = False
+        self._start_time = None
+        # ログを書き込めなかったときのメッセージ。オペレーターが警告として表示します
+        self.log_error = None
+
+    @property
+    def running(self):
+        return self._start_time is not None
+
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.use_cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._start_time = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        with文の中の処理時間を、nameの処理として記録します
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    @contextlib.contextmanager
+    def guard(self):
+        """
+        with文の中で例外が起きた場合に計測を終了し、cProfileとtracemallocが後の実行に残らないようにします
+        """
+
+        try:
+            yield
+        except BaseException:
+            self.stop()
+            raise
+
+    def record(self, name, seconds):
+        """
+        モーダルオペレーターのように、with文で囲めない処理の時間を記録します
+        """
+
+        if self.enabled:
+            self.phases.append((name, seconds))
+
+    def stop(self):
+        """
+        計測を終了してログに書き込み、記録した内容を返します
+        :rtype: dict | None
+        """
+
+        if not self.running:
+            return None
+
+        record = {
+            "operator": self.name,
+            "time": datetime.datetime.now().isoformat(),
+            "total": time.perf_counter() - self._start_time,
+            "phases": [{"name": name, "time": seconds} for name, seconds in self.phases],
+        }
+        record.update(self.extra)
+        self._start_time = None
+
+        # 集計に失敗しても、cProfileとtracemallocは必ず止める
+        try:
+            if self._profile:
+                self._profile.disable()
+                record["cprofile"] = self._get_cprofile_stats()
+            if self.use_tracemalloc and tracemalloc.is_tracing():
+                record["tracemalloc"] = self._get_tracemalloc_stats()
+        finally:
+            if self._profile:
+                self._profile.disable()
+                self._profile = None
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+        try:
+            _get_log_handler(self.log_path)
+            _logger.info(json.dumps(record))
+        except (IOError, OSError) as e:
+            self.log_error = "Failed to write the profile log: {}".format(e)
+
+        return record
+
+    def summary(self):
+        """
+        オペレーターのレポートに表示する、処理ごとの時間の要約を返します
+        """
+
+        total = sum(seconds for _, seconds in self.phases)
+        return "{}: {:.1f}ms ({})".format(
+            self.name, total * 1000.0,
+            ", ".join("{} {:.1f}ms".format(name, seconds * 1000.0) for name, seconds in self.phases))
+
+    def _get_cprofile_stats(self):
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, function), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({"function": "{}:{}({})".format(os.path.basename(filename), line, function),
+                         "ncalls": ncalls, "tottime": tottime, "cumtime": cumtime})
+        rows.sort(key=lambda row: row["cumtime"], reverse=True)
+        return rows[:TOP_STATS]
+
+    def _get_tracemalloc_stats(self):
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        return {
+            "current": current,
+            "peak": peak,
+            "top": [{"location": str(stat.traceback), "size": stat.size, "count": stat.count}
+                    for stat in snapshot.statistics('lineno')[:TOP_STATS]],
+        }
+
+
+def get_profiler(context, name):
+    """
+    アドオンの設定と環境変数から、オペレーター用の計測オブジェクトを作成します
+    :param context: コンテキスト
+    :type context: bpy.types.Context
+    :param name: ログに記録するオペレーターの名前
+    :type name: str
+    :rtype: OperatorProfiler
+    """
+
+    enabled = False
+    use_cprofile = False
+    use_tracemalloc = False
+    log_path = ''
+
+    preferences = _get_addon_preferences(context)
+    if preferences:
+        enabled = preferences.use_profiling
+        use_cprofile = preferences.use_profiling_cprofile
+        use_tracemalloc = preferences.use_profiling_tracemalloc
+        log_path = bpy.path.abspath(preferences.profiling_log_path)
+
+    env_value = os.environ.get(ENV_VAR, '').lower()
+    if env_value and env_value not in ('0', 'false', 'off'):
+        options = {option.strip() for option in env_value.split(',')}
+        enabled = True
+        use_cprofile = use_cprofile or 'cprofile' in options
+        use_tracemalloc = use_tracemalloc or 'tracemalloc' in options
+
+    return OperatorProfiler(name, enabled, use_cprofile, use_tracemalloc, log_path)
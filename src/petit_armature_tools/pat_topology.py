@@ -0,0 +1,371 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+def _get_next_loop_edge(edge, vert):
+    """
+    辺ループで、頂点の先に続く辺を返します
+    :param edge: 現在の辺
+    :type edge: bmesh.types.BMEdge
+    :param vert: 次の辺を探す側の頂点
+    :type vert: bmesh.types.BMVert
+    :return: 次の辺。ループが途切れる場合はNone
+    :rtype: bmesh.types.BMEdge | None
+    """
+
+    link_edges = vert.link_edges
+
+    # 面を持たない辺は、分岐の無い頂点だけをたどる
+    if edge.is_wire:
+        if len(link_edges) != 2:
+            return None
+        for link_edge in link_edges:
+            if link_edge != edge and link_edge.is_wire:
+                return link_edge
+        return None
+
+    # 境界辺は、頂点にもう一つだけある境界辺をたどる
+    if edge.is_boundary:
+        boundary_edges = [link_edge for link_edge in link_edges if link_edge != edge and link_edge.is_boundary]
+        if len(boundary_edges) != 1:
+            return None
+        return boundary_edges[0]
+
+    # 四角形の多様体では、価数4の頂点で現在の辺と面を共有しない辺が次の辺になる
+    if len(link_edges) != 4 or len(vert.link_faces) != 4:
+        return None
+
+    edge_faces = edge.link_faces
+    for link_edge in link_edges:
+        if link_edge == edge or not link_edge.is_manifold:
+            continue
+        if not any(face in edge_faces for face in link_edge.link_faces):
+            return link_edge
+    return None
+
+
+def walk_edge_loop(edge):
+    """
+    選択やオペレーターを使わずに、BMeshのトポロジーから辺ループをたどります
+    計算量はループの長さに比例します
+    :param edge: ループの開始となる辺
+    :type edge: bmesh.types.BMEdge
+    :return: 順番に並んだループの辺と、ループが閉じているかどうか
+    :rtype: (list[bmesh.types.BMEdge], bool)
+    """
+
+    forward = [edge]
+    visited = {edge}
+
+    # 1つめの頂点側へたどる
+    current_edge = edge
+    current_vert = edge.verts[1]
+    while True:
+        next_edge = _get_next_loop_edge(current_edge, current_vert)
+        if next_edge is None:
+            break
+        if next_edge == edge:
+            return forward, True
+        if next_edge in visited:
+            break
+        visited.add(next_edge)
+        forward.append(next_edge)
+        current_vert = next_edge.other_vert(current_vert)
+        current_edge = next_edge
+
+    # 閉じていない場合は反対側の頂点側へもたどる
+    backward = []
+    current_edge = edge
+    current_vert = edge.verts[0]
+    while True:
+        next_edge = _get_next_loop_edge(current_edge, current_vert)
+        if next_edge is None or next_edge in visited:
+            break
+        visited.add(next_edge)
+        backward.append(next_edge)
+        current_vert = next_edge.other_vert(current_vert)
+        current_edge = next_edge
+
+    backward.reverse()
+    return backward + forward, False
+
+
+def _get_opposite_ring_edge(edge, face):
+    """
+    四角形の面で、辺の向かい側の辺を返します
+    :return: 向かい側の辺。四角形ではない場合はNone
+    :rtype: bmesh.types.BMEdge | None
+    """
+
+    if len(face.loops) != 4:
+        return None
+    for loop in face.loops:
+        if loop.edge == edge:
+            return loop.link_loop_next.link_loop_next.edge
+    return None
+
+
+def walk_edge_ring(edge):
+    """
+    選択やオペレーターを使わずに、四角形の面を横切って辺リングをたどります
+    計算量はリングの長さに比例します
+    :param edge: リングの開始となる辺
+    :type edge: bmesh.types.BMEdge
+    :return: 順番に並んだリングの辺と、リングが閉じているかどうか
+    :rtype: (list[bmesh.types.BMEdge], bool)
+    """
+
+    link_faces = list(edge.link_faces)
+    if len(link_faces) not in (1, 2):
+        return [edge], False
+
+    visited = {edge}
+
+    def walk(face):
+        edges = []
+        current_edge = edge
+        while True:
+            next_edge = _get_opposite_ring_edge(current_edge, face)
+            if next_edge is None:
+                return edges, False
+            if next_edge == edge:
+                return edges, True
+            if next_edge in visited:
+                return edges, False
+            visited.add(next_edge)
+            edges.append(next_edge)
+
+            # 多様体の辺だけ、反対側の面へ進む
+            next_faces = next_edge.link_faces
+            if len(next_faces) != 2:
+                return edges, False
+            face = next_faces[1] if next_faces[0] == face else next_faces[0]
+            current_edge = next_edge
+
+    forward, is_closed = walk(link_faces[0])
+    if is_closed:
+        return [edge] + forward, True
+
+    # 閉じていない場合は反対側の面へもたどる
+    backward = []
+    if len(link_faces) == 2:
+        backward, _ = walk(link_faces[1])
+    backward.reverse()
+    return backward + [edge] + forward, False
+
+
+def get_selected_ring(edges, start_edge=None):
+    """
+    選択した辺から、ボーンにするループを横切る辺リングの辺を順に返します
+    1つの辺リングを選択した場合は、リングのうち選択した最初の辺から最後の辺まで
+    両端の2つの辺ループを選択した場合は、片方のループからもう片方のループまでをたどります
+    :param edges: 選択した辺のリスト
+    :type edges: list[bmesh.types.BMEdge]
+    :param start_edge: 辺リングをたどり始める辺。選択に含まれない場合は最初の辺を使います
+    :type start_edge: bmesh.types.BMEdge | None
+    :return: 順番に並んだ辺リングの辺。選択がどちらの形でもない場合はNone
+    :rtype: list[bmesh.types.BMEdge] | None
+    """
+
+    if not edges:
+        return None
+    edge_set = set(edges)
+    paths = get_edge_paths(edges)
+
+    # 頂点を共有しない辺だけの場合は、1つの辺リングの選択として扱う
+    if all(len(verts) == 2 and not is_closed for verts, is_closed in paths):
+        ring, _ = walk_edge_ring(start_edge if start_edge in edge_set else edges[0])
+        positions = [i for i, edge in enumerate(ring) if edge in edge_set]
+        return ring[positions[0]:positions[-1] + 1]
+
+    if len(paths) != 2:
+        return None
+
+    first_verts = set(paths[0][0])
+    first_edges = [edge for edge in edges if edge.verts[0] in first_verts and edge.verts[1] in first_verts]
+    last_edges = edge_set.difference(first_edges)
+    for edge in first_edges:
+        ring, _ = walk_edge_ring(edge)
+        position = ring.index(edge)
+
+        # 開始の辺から両方向に、もう片方のループの辺を探す
+        for i in range(position + 1, len(ring)):
+            if ring[i] in last_edges:
+                return ring[position:i + 1]
+        for i in range(position - 1, -1, -1):
+            if ring[i] in last_edges:
+                return ring[i:position + 1][::-1]
+    return None
+
+
+def iter_edge_loops(edges):
+    """
+    辺ごとに辺ループをたどり、ループを1つずつ返します
+    :param edges: ループの開始となる辺のリスト
+    :type edges: list[bmesh.types.BMEdge]
+    :return: ループごとの辺のリスト。すでにたどったループの辺が含まれる場合は、Noneを返して終了します
+    :rtype: collections.Iterator[list[bmesh.types.BMEdge] | None]
+    """
+
+    walked_edges = set()
+    for edge in edges:
+        # すでにたどったループと同じ辺のときは終了
+        if edge in walked_edges:
+            yield None
+            return
+
+        loop_edges, _ = walk_edge_loop(edge)
+        walked_edges.update(loop_edges)
+        yield loop_edges
+
+
+def get_edge_loops(edges):
+    """
+    辺ごとに辺ループをたどり、ループのリストを返します
+    :param edges: ループの開始となる辺のリスト
+    :type edges: list[bmesh.types.BMEdge]
+    :return: ループごとの辺のリスト。すでにたどったループの辺が含まれる場合はNone
+    :rtype: list[list[bmesh.types.BMEdge]] | None
+    """
+
+    loops = []
+    for loop_edges in iter_edge_loops(edges):
+        if loop_edges is None:
+            return None
+        loops.append(loop_edges)
+    return loops
+
+
+def get_edge_paths(edges):
+    """
+    選択した辺を頂点の次数で分割し、分岐の無い経路のリストを返します
+    次数が2以外の頂点を端点とし、全ての辺を一度だけたどります
+    :param edges: 選択した辺のリスト
+    :type edges: list[bmesh.types.BMEdge]
+    :return: 経路ごとの頂点のリストと、経路が閉じているかどうか
+    :rtype: list[(list[bmesh.types.BMVert], bool)]
+    """
+
+    vert_edges = {}
+    for edge in edges:
+        for vert in edge.verts:
+            vert_edges.setdefault(vert, []).append(edge)
+
+    visited = set()
+    paths = []
+
+    def walk(start_vert, start_edge):
+        verts = [start_vert]
+        vert = start_vert
+        edge = start_edge
+        while True:
+            visited.add(edge)
+            vert = edge.other_vert(vert)
+            verts.append(vert)
+            if len(vert_edges[vert]) != 2:
+                return verts
+            edge = next((e for e in vert_edges[vert] if e not in visited), None)
+            if edge is None:
+                return verts
+
+    # 端点や分岐点から、分岐の無い経路をたどる
+    for vert, link_edges in vert_edges.items():
+        if len(link_edges) == 2:
+            continue
+        for edge in link_edges:
+            if edge not in visited:
+                paths.append((walk(vert, edge), False))
+
+    # 残った辺は全て閉じたループになる
+    for edge in edges:
+        if edge not in visited:
+            verts = walk(edge.verts[0], edge)
+            paths.append((verts[:-1], True))
+
+    return paths
+
+
+def orient_edge_paths(paths, get_root_score):
+    """
+    経路ごとに、スコアが最も小さい端点が先頭になるように向きを揃えます
+    閉じた経路は、スコアが最も小さい頂点から始まるように回転します
+    :param paths: get_edge_pathsが返した経路のリスト
+    :type paths: list[(list[bmesh.types.BMVert], bool)]
+    :param get_root_score: 頂点を受け取り、根元としてのスコアを返す関数
+    :type get_root_score: (bmesh.types.BMVert) -> float
+    :return: 向きを揃えた経路の頂点のリスト
+    :rtype: list[list[bmesh.types.BMVert]]
+    """
+
+    oriented_paths = []
+    for verts, is_closed in paths:
+        if is_closed:
+            root = min(range(len(verts)), key=lambda i: get_root_score(verts[i]))
+            verts = verts[root:] + verts[:root + 1]
+        elif get_root_score(verts[-1]) < get_root_score(verts[0]):
+            verts = verts[::-1]
+        oriented_paths.append(verts)
+    return oriented_paths
+
+
+def get_island_ids(verts):
+    """
+    頂点ごとに、その頂点が属するメッシュの島の番号を返します
+    たどるのは、指定した頂点から辺でつながる範囲だけです
+    :param verts: 島の番号を調べる頂点のリスト
+    :type verts: list[bmesh.types.BMVert]
+    :return: 頂点ごとの島の番号
+    :rtype: list[int]
+    """
+
+    island_of = {}
+    island_ids = []
+    island_count = 0
+    for start_vert in verts:
+        if start_vert not in island_of:
+            island_id = island_count
+            island_count += 1
+            island_of[start_vert] = island_id
+            stack = [start_vert]
+            while stack:
+                vert = stack.pop()
+                for edge in vert.link_edges:
+                    other_vert = edge.other_vert(vert)
+                    if other_vert not in island_of:
+                        island_of[other_vert] = island_id
+                        stack.append(other_vert)
+        island_ids.append(island_of[start_vert])
+    return island_ids
+
+
+def get_path_edge_verts(verts, is_closed):
+    """
+    経路の頂点のリストから、辺ごとの頂点の組のリストを返します
+    :param verts: 経路の頂点のリスト
+    :type verts: list[bmesh.types.BMVert]
+    :param is_closed: 経路が閉じているかどうか
+    :type is_closed: bool
+    :rtype: list[(bmesh.types.BMVert, bmesh.types.BMVert)]
+    """
+
+    pairs = list(zip(verts, verts[1:]))
+    if is_closed and len(verts) > 2:
+        pairs.append((verts[-1], verts[0]))
+    return pairs
@@ -0,0 +1,271 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import json
+import os
+import time
+import traceback
+from multiprocessing.connection import Listener
+
+import bpy
+import bmesh
+
+from . import pat_operator
+
+# 認証キーは環境変数で指定します。ワーカーはファイルを開いて保存するため、キーが無い場合は起動しません
+AUTHKEY_ENV_VAR = "PAT_WORKER_AUTHKEY"
+DEFAULT_ADDRESS = "localhost:47820"
+
+OPERATORS = {
+    'SELECTED_EDGE_ORDER': pat_operator.PAT_OT_SelectedEdgeOrder,
+    'EDGE_LOOP_MIDPOINT': pat_operator.PAT_OT_MidpointOfSelectedEdgeLoopOder,
+    'HAIR_CARD_ISLANDS': pat_operator.PAT_OT_HairCardIslands,
+    'SHORTEST_PATH': pat_operator.PAT_OT_ShortestPath,
+}
+
+
+class JobError(Exception):
+    pass
+
+
+def parse_address(address):
+    """
+    "host:port"の形式はTCPのアドレスに、それ以外はUnixソケットや名前付きパイプのパスとして扱います
+    :type address: str
+    :rtype: (str, int) | str
+    """
+
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit() and not address.startswith("\\\\"):
+        return host or "localhost", int(port)
+    return address
+
+
+def get_authkey():
+    authkey = os.environ.get(AUTHKEY_ENV_VAR, "")
+    return authkey.encode("utf-8") if authkey else None
+
+
+def _set_properties(data, properties):
+    for name, value in properties.items():
+        if not hasattr(data, name):
+            raise JobError("Unknown setting: {}".format(name))
+        setattr(data, name, value)
+
+
+def _get_operator_properties(operator_class, settings, properties):
+    """
+    パネルと同じように、ツール設定からオペレーターのプロパティを作成します
+    ジョブで指定したプロパティはツール設定より優先されます
+    """
+
+    result = {}
+    for prop in operator_class.bl_rna.properties:
+        name = prop.identifier
+        if name in ('rna_type', 'target_armature') or prop.type == 'POINTER':
+            continue
+        if hasattr(settings, name):
+            result[name] = getattr(settings, name)
+
+    result["offset"] = settings.edge_offset
+    # ワーカーはオペレーターの終了を待つため、モーダルでは実行しない
+    result["use_modal"] = False
+    result["target_armature"] = settings.target_armature.name if settings.target_armature else ""
+    result.update(properties)
+    return result
+
+
+def _select_elements(mesh_object, job):
+    """
+    ジョブで指定した辺や頂点を、指定した順序で選択します
+    頂点グループ(vertex_group)や辺のマーク(edge_mark: 'SEAM'または'SHARP')で選択する場合、選択履歴は作成しません
+    """
+
+    mesh = mesh_object.data
+    bm = bmesh.from_edit_mesh(mesh)
+    bm.verts.ensure_lookup_table()
+    bm.edges.ensure_lookup_table()
+    for element in bm.verts[:] + bm.edges[:] + bm.faces[:]:
+        element.select = False
+    bm.select_history.clear()
+
+    try:
+        for index in job.get("edges", []):
+            edge = bm.edges[index]
+            edge.select = True
+            bm.select_history.add(edge)
+        for index in job.get("vertices", []):
+            bm.verts[index].select = True
+    except IndexError:
+        raise JobError("Selection index out of range")
+
+    vertex_group_name = job.get("vertex_group")
+    if vertex_group_name:
+        vertex_group = mesh_object.vertex_groups.get(vertex_group_name)
+        deform_layer = bm.verts.layers.deform.active
+        if vertex_group is None or deform_layer is None:
+            raise JobError("Vertex group not found: {}".format(vertex_group_name))
+        for edge in bm.edges:
+            if all(vertex_group.index in vert[deform_layer] for vert in edge.verts):
+                edge.select = True
+
+    edge_mark = job.get("edge_mark")
+    if edge_mark:
+        if edge_mark not in ('SEAM', 'SHARP'):
+            raise JobError("Unknown edge mark: {}".format(edge_mark))
+        for edge in bm.edges:
+            if edge.seam if edge_mark == 'SEAM' else not edge.smooth:
+                edge.select = True
+
+    bm.select_flush(True)
+    bmesh.update_edit_mesh(mesh)
+
+
+def run_job(job):
+    """
+    1つのジョブを、パネルと同じオペレーターで実行します
+    :param job: file, object, operator, edges, vertices, vertex_group, edge_mark, settings, properties, saveを持つ辞書
+    :type job: dict
+    :return: 実行結果
+    :rtype: dict
+    """
+
+    context = bpy.context
+    start = time.perf_counter()
+
+    filepath = job.get("file")
+    if filepath and (job.get("reload", True) or bpy.data.filepath != os.path.abspath(filepath)):
+        if not os.path.isfile(filepath):
+            raise JobError("File not found: {}".format(filepath))
+        bpy.ops.wm.open_mainfile(filepath=filepath)
+
+    operator_class = OPERATORS.get(job.get("operator", 'SELECTED_EDGE_ORDER'))
+    if operator_class is None:
+        raise JobError("Unknown operator: {}".format(job.get("operator")))
+
+    mesh_object = bpy.data.objects.get(job.get("object", ""))
+    if mesh_object is None or mesh_object.type != 'MESH':
+        raise JobError("Mesh object not found: {}".format(job.get("object")))
+
+    if context.active_object and context.active_object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+    pat_operator.set_active_object(context, mesh_object)
+
+    settings = context.scene.PAT_ToolSettings
+    job_settings = dict(job.get("settings", {}))
+    target_armature = job_settings.pop("target_armature", None)
+    if target_armature is not None:
+        settings.target_armature = bpy.data.objects.get(target_armature) if target_armature else None
+    _set_properties(settings, job_settings)
+
+    bpy.ops.object.mode_set(mode='EDIT', toggle=False)
+    context.scene.tool_settings.mesh_select_mode = (bool(job.get("vertices")), True, False)
+    _select_elements(mesh_object, job)
+
+    # 作成されたアーマチュアとボーンを、実行前との差分で調べる
+    objects_before = set(bpy.data.objects.keys())
+    bones_before = set(settings.target_armature.data.bones.keys()) if settings.target_armature else set()
+
+    operator = getattr(bpy.ops.armature, operator_class.bl_idname.split(".", 1)[1])
+    result = operator('INVOKE_DEFAULT', **_get_operator_properties(operator_class, settings,
+                                                                   job.get("properties", {})))
+
+    if context.active_object and context.active_object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+
+    armature_object = settings.target_armature
+    if armature_object is None:
+        new_objects = [bpy.data.objects[name] for name in set(bpy.data.objects.keys()) - objects_before]
+        armature_object = next((obj for obj in new_objects if obj.type == 'ARMATURE'), None)
+
+    bone_names = []
+    if armature_object:
+        bone_names = [bone.name for bone in armature_object.data.bones if bone.name not in bones_before]
+    if not bone_names:
+        raise JobError("No bones were created")
+
+    save = job.get("save")
+    if save:
+        bpy.ops.wm.save_as_mainfile(filepath=save if isinstance(save, str) else bpy.data.filepath)
+
+    return {
+        "status": "ok",
+        "operator_result": sorted(result),
+        "armature": armature_object.name,
+        "bones": bone_names,
+        "time": time.perf_counter() - start,
+    }
+
+
+def _handle_message(message):
+    command = message.get("command", "run")
+    if command == "ping":
+        return {"status": "ok", "blender_version": list(bpy.app.version)}
+    if command == "run":
+        return run_job(message.get("job", message))
+    raise JobError("Unknown command: {}".format(command))
+
+
+def serve(address=DEFAULT_ADDRESS, authkey=None):
+    """
+    ジョブを受け付けるワーカーを起動します。"shutdown"コマンドを受け取るまで終了しません
+    メッセージは1件ごとにUTF-8のJSONで送受信します
+    :param address: "host:port"、Unixソケットのパス、または名前付きパイプのパス
+    :type address: str
+    :param authkey: 接続の認証キー。空の場合はValueErrorを送出します
+    :type authkey: bytes
+    """
+
+    if not authkey:
+        raise ValueError("The worker requires an authentication key in {}".format(AUTHKEY_ENV_VAR))
+
+    listener = Listener(parse_address(address), authkey=authkey)
+    print("[{}] Worker listening on {}".format(__package__, listener.address))
+
+    running = True
+    try:
+        while running:
+            conn = listener.accept()
+            try:
+                while True:
+                    try:
+                        data = conn.recv_bytes()
+                    except EOFError:
+                        break
+
+                    try:
+                        message = json.loads(data.decode("utf-8"))
+                        if message.get("command") == "shutdown":
+                            reply = {"status": "ok"}
+                            running = False
+                        else:
+                            reply = _handle_message(message)
+                    except JobError as e:
+                        reply = {"status": "error", "message": str(e)}
+                    except Exception as e:
+                        reply = {"status": "error", "message": str(e), "traceback": traceback.format_exc()}
+
+                    conn.send_bytes(json.dumps(reply).encode("utf-8"))
+                    if not running:
+                        break
+            finally:
+                conn.close()
+    finally:
+        listener.close()
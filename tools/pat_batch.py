@@ -0,0 +1,230 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+複数の.blendファイルにまとめてボーンを作成するバッチ処理
+
+--jobsの数だけ常駐するBlenderワーカー(tools/pat_worker.py)を起動し、ファイルを順に振り分けます
+ワーカーが異常終了したりタイムアウトした場合はそのファイルを失敗として記録し、ワーカーを起動し直して続けます
+
+使い方:
+    python tools/pat_batch.py --spec job.json --blender /path/to/blender \\
+        [--jobs 8] [--output report.json] [--timeout 600] [--suffix _rigged] "assets/**/*.blend"
+
+job.jsonはtools/pat_client.pyのジョブから"file"と"save"を除いたものです。選択は次のいずれかで指定します
+    "edges": [辺のインデックス, ...]        選択した順序で選択します
+    "vertex_group": "頂点グループ名"        頂点グループの頂点同士を結ぶ辺を選択します
+    "edge_mark": "SEAM" | "SHARP"          シームやシャープのマークが付いた辺を選択します
+"settings"の文字列に含まれる{stem}は、ファイル名(拡張子を除く)に置き換えます
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from pat_client import WorkerClient
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pat_worker.py")
+CONNECT_TIMEOUT = 60.0
+
+
+class WorkerProcess(object):
+    """
+    1つのBlenderワーカーのプロセスと接続を管理します
+    """
+
+    def __init__(self, blender, port, authkey, log_path):
+        self.blender = blender
+        self.address = "localhost:{}".format(port)
+        self.authkey = authkey
+        self.log_path = log_path
+        self.process = None
+        self.client = None
+
+    def start(self):
+        env = dict(os.environ)
+        env["PAT_WORKER_AUTHKEY"] = self.authkey.decode("utf-8")
+        log = open(self.log_path, 'a')
+        self.process = subprocess.Popen(
+            [self.blender, "--background", "--factory-startup", "--python", WORKER_SCRIPT, "--",
+             "--address", self.address], stdout=log, stderr=subprocess.STDOUT, env=env)
+        log.close()
+
+        # ワーカーが接続を受け付けるまで待つ
+        deadline = time.time() + CONNECT_TIMEOUT
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError("Worker exited with code {}".format(self.process.returncode))
+            try:
+                self.client = WorkerClient(self.address, self.authkey)
+                return
+            except OSError:
+                if time.time() > deadline:
+                    self.stop()
+                    raise RuntimeError("Worker did not start within {}s".format(CONNECT_TIMEOUT))
+                time.sleep(0.5)
+
+    def stop(self):
+        if self.client:
+            try:
+                self.client.shutdown()
+            except (EOFError, OSError):
+                pass
+            self.client.close()
+            self.client = None
+        if self.process:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+    def kill(self):
+        if self.client:
+            self.client.close()
+            self.client = None
+        if self.process:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def run(self, job, timeout):
+        if self.client is None:
+            self.start()
+        return self.client.run(job, timeout)
+
+
+def expand_files(patterns):
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        files += matches if matches else [pattern]
+    return [os.path.abspath(path) for path in files]
+
+
+def create_job(spec, path, suffix):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    job = dict(spec)
+    job["settings"] = {name: value.replace("{stem}", stem) if isinstance(value, str) else value
+                       for name, value in spec.get("settings", {}).items()}
+    job["file"] = path
+    job["save"] = os.path.join(os.path.dirname(path), stem + suffix + ".blend") if suffix else path
+    return job
+
+
+def run_worker(index, worker, files, spec, args, results):
+    while True:
+        try:
+            path = files.get_nowait()
+        except queue.Empty:
+            break
+
+        start = time.perf_counter()
+        report = {"file": path, "worker": index}
+        try:
+            reply = worker.run(create_job(spec, path, args.suffix), args.timeout)
+            if not isinstance(reply, dict) or "status" not in reply:
+                raise ValueError("Malformed reply: {!r}".format(reply))
+            report.update(reply)
+        except TimeoutError:
+            report.update({"status": "error", "message": "Timed out after {}s".format(args.timeout)})
+            worker.kill()
+        except Exception as e:
+            # ワーカーが異常終了した場合や応答が壊れている場合は、失敗として記録し次のファイルで起動し直す
+            report.update({"status": "error", "message": "Worker failed: {}".format(e)})
+            worker.kill()
+        report["elapsed"] = time.perf_counter() - start
+        results.append(report)
+        print("[{}/{}] {} {} {:.2f}s".format(len(results), args.file_count, report["status"], path,
+                                             report["elapsed"]))
+
+    worker.stop()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create bones in many .blend files")
+    parser.add_argument("files", nargs="+", help=".blend files or glob patterns")
+    parser.add_argument("--spec", required=True, help="JSON job spec applied to every file")
+    parser.add_argument("--blender", default="blender", help="Path of the Blender executable")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Number of parallel workers")
+    parser.add_argument("--output", default="pat_batch_report.json", help="Path of the JSON report")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Timeout per file in seconds")
+    parser.add_argument("--suffix", default="_rigged",
+                        help="Suffix of the saved files. An empty suffix overwrites the original files")
+    parser.add_argument("--port-base", type=int, default=47900, help="First TCP port used by the workers")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.spec, 'r') as f:
+        spec = json.load(f)
+
+    paths = expand_files(args.files)
+    args.file_count = len(paths)
+    files = queue.Queue()
+    for path in paths:
+        files.put(path)
+
+    authkey = os.urandom(16).hex().encode("utf-8")
+    log_dir = os.path.splitext(os.path.abspath(args.output))[0] + "_logs"
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    start = time.perf_counter()
+    results = []
+    threads = []
+    for index in range(max(1, min(args.jobs, len(paths)))):
+        worker = WorkerProcess(args.blender, args.port_base + index, authkey,
+                               os.path.join(log_dir, "worker_{}.log".format(index)))
+        thread = threading.Thread(target=run_worker, args=(index, worker, files, spec, args, results))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    results.sort(key=lambda report: report["file"])
+    failed = [report for report in results if report.get("status") != "ok"]
+    report = {
+        "date": datetime.datetime.now().isoformat(),
+        "spec": spec,
+        "elapsed": time.perf_counter() - start,
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "files": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("{} succeeded, {} failed. Report written to {}".format(report["succeeded"], report["failed"],
+                                                                 args.output))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+常駐するワーカー(tools/pat_worker.py)へジョブを送るクライアント
+
+Blenderを使わずに、通常のPythonで実行できます
+環境変数PAT_WORKER_AUTHKEYには、ワーカーと同じ認証キーを設定します
+
+使い方:
+    python tools/pat_client.py [--address localhost:47820] jobs.json
+    python tools/pat_client.py --ping
+    python tools/pat_client.py --shutdown
+
+jobs.jsonにはジョブを1つ、またはジョブのリストを書きます。ジョブの例:
+    {
+        "file": "/path/to/hair.blend",
+        "object": "Hair",
+        "operator": "EDGE_LOOP_MIDPOINT",
+        "edges": [12, 40, 68],
+        "settings": {"bone_name_base": "Hair", "use_auto_bone_weight": true},
+        "properties": {"resample_mode": "COUNT", "resample_bone_count": 4},
+        "save": "/path/to/hair_rigged.blend"
+    }
+"""
+
+import argparse
+import json
+import os
+import sys
+from multiprocessing.connection import Client
+
+AUTHKEY_ENV_VAR = "PAT_WORKER_AUTHKEY"
+DEFAULT_ADDRESS = "localhost:47820"
+
+
+def parse_address(address):
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit() and not address.startswith("\\\\"):
+        return host or "localhost", int(port)
+    return address
+
+
+class WorkerClient(object):
+    """
+    ワーカーへの接続を保ったまま、メッセージを順に送受信します
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None):
+        if authkey is None and os.environ.get(AUTHKEY_ENV_VAR):
+            authkey = os.environ[AUTHKEY_ENV_VAR].encode("utf-8")
+        self._conn = Client(parse_address(address), authkey=authkey)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def send(self, message, timeout=None):
+        """
+        メッセージを送り、返信を待ちます
+        :param timeout: 返信を待つ秒数。Noneの場合は返信が来るまで待ちます
+        :raises TimeoutError: 時間内に返信が無い場合
+        """
+
+        self._conn.send_bytes(json.dumps(message).encode("utf-8"))
+        if timeout is not None and not self._conn.poll(timeout):
+            raise TimeoutError("No reply within {}s".format(timeout))
+        return json.loads(self._conn.recv_bytes().decode("utf-8"))
+
+    def run(self, job, timeout=None):
+        return self.send({"command": "run", "job": job}, timeout)
+
+    def ping(self):
+        return self.send({"command": "ping"})
+
+    def shutdown(self):
+        return self.send({"command": "shutdown"})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Send jobs to a Petit Armature Tools worker")
+    parser.add_argument("jobs", nargs="?", help="JSON file with a job or a list of jobs")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Address of the worker")
+    parser.add_argument("--ping", action="store_true", help="Check that the worker is running")
+    parser.add_argument("--shutdown", action="store_true", help="Stop the worker")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    failures = 0
+    with WorkerClient(args.address) as client:
+        if args.ping:
+            print(json.dumps(client.ping()))
+        if args.jobs:
+            with open(args.jobs, 'r') as f:
+                jobs = json.load(f)
+            for job in jobs if isinstance(jobs, list) else [jobs]:
+                reply = client.run(job)
+                failures += reply.get("status") != "ok"
+                print(json.dumps(reply))
+        if args.shutdown:
+            print(json.dumps(client.shutdown()))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
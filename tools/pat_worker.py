@@ -0,0 +1,69 @@
+# Copyright (c) 2021 Samia
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+Petit Armature Toolsのジョブを受け付ける、常駐するBlenderワーカー
+
+アドオンの登録は起動時に一度だけ行い、ジョブごとにファイルを開いてボーンを作成します
+
+使い方:
+    blender --background --factory-startup --python tools/pat_worker.py -- [--address localhost:47820]
+
+--addressには"host:port"のほか、Unixソケットのパスや名前付きパイプ(\\\\.\\pipe\\name)を指定できます
+環境変数PAT_WORKER_AUTHKEYに認証キーを設定し、同じキーを持つクライアントからの接続だけを受け付けます
+キーが無い場合は、任意のプロセスからファイルを開いて保存できてしまうため起動しません
+ジョブの送信にはtools/pat_client.pyを使います
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import petit_armature_tools  # noqa: E402
+from petit_armature_tools import pat_worker  # noqa: E402
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Petit Armature Tools worker")
+    parser.add_argument("--address", default=pat_worker.DEFAULT_ADDRESS,
+                        help="host:port, Unix socket path or named pipe to listen on")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    authkey = pat_worker.get_authkey()
+    if not authkey:
+        sys.stderr.write("Set {} to start the worker\n".format(pat_worker.AUTHKEY_ENV_VAR))
+        sys.exit(1)
+
+    petit_armature_tools.register()
+    try:
+        pat_worker.serve(args.address, authkey)
+    finally:
+        petit_armature_tools.unregister()
+
+
+if __name__ == "__main__":
+    main()